@@ -0,0 +1,587 @@
+import asyncio
+import collections
+import hashlib
+import hmac
+import json
+import logging
+import random
+import threading
+import time
+import typing
+
+from urllib.parse import urlencode
+
+import aiohttp
+import yarl
+
+from Exchange_Data import *
+from Strategy_Registry import StrategyRegistry
+from Rate_Limiter import RateLimiter, ORDER_ENDPOINTS, get_request_priority, get_request_weight
+from Message_Decoder import MessageDecoder
+from Market_Data import MarketData
+from Order_Book import OrderBookManager
+from Order_Executor import OrderExecutor
+from Scheduler import Scheduler
+from User_Stream import AccountState, UserDataStream
+from Client_Base import ClientBase, BATCH_ORDERS_SIZE, BATCH_CANCEL_SIZE, KLINES_PAGE_SIZE, MAX_KLINES_REQUESTS, \
+    get_order_parameters, parse_batch_response
+from Candle_Store import CandleStore
+
+
+logger = logging.getLogger()
+
+
+class AsyncBinanceClient:
+    def __init__(self, public_key: str, secret_key: str, main_url: str = "https://testnet.binancefuture.com",
+                 ws_url: str = "wss://stream.binancefuture.com/ws", max_connections: int = 20, timeout: float = 5,
+                 max_retries: int = 3, on_message: typing.Optional[typing.Callable] = None):
+
+        """
+        asyncio transport of SyncBinanceClient: the REST requests and the market data websocket share one event loop,
+        so many requests can be in flight at the same time without any thread. The messages are only received here,
+        their processing is left to the on_message callback.
+        The URLs can point to a local stand-in server for testing.
+        https://binance-docs.github.io/apidocs/futures/en
+        :param public_key:
+        :param secret_key:
+        :param main_url: REST API base URL
+        :param ws_url: Websocket base URL
+        :param max_connections: Maximum number of simultaneous HTTP connections
+        :param timeout: Timeout in seconds of each REST request
+        :param max_retries: Maximum number of retries of a GET request after a network error, a 5xx or a 429 response
+        :param on_message: Called on the event loop with (ws, msg) for every market data message
+        """
+
+        self._main_url = main_url
+        self.ws_url = ws_url
+
+        self._public_key = public_key
+        self._hmac = hmac.new(secret_key.encode(), digestmod=hashlib.sha256)
+
+        self._headers = {'X-MBX-APIKEY': self._public_key}
+        self._max_connections = max_connections
+        self._timeout = timeout
+        self._max_retries = max_retries
+
+        self._session: typing.Optional[aiohttp.ClientSession] = None
+        self._rate_limiter = RateLimiter()
+
+        self.contracts: typing.Dict[str, ContractData] = dict()
+        self.prices = dict()
+
+        self._on_message = on_message
+
+        self._ws_id = 1
+        self._ws: typing.Optional[aiohttp.ClientWebSocketResponse] = None
+        self._ws_task: typing.Optional[asyncio.Task] = None
+        self.reconnected = True
+        self.ws_connected = False
+        self.ws_subscriptions = {"bookTicker": [], "aggTrade": []}
+
+    async def start(self):
+
+        """
+        Open the HTTP connection pool, load the contracts and connect the websocket. Must be awaited before using
+        the client.
+        :return:
+        """
+
+        connector = aiohttp.TCPConnector(limit=self._max_connections)
+        self._session = aiohttp.ClientSession(connector=connector, headers=self._headers,
+                                              timeout=aiohttp.ClientTimeout(total=self._timeout))
+
+        self.contracts = await self.get_contracts()
+
+        self._ws_task = asyncio.create_task(self._run_ws())
+
+        logger.info("Binance Futures Testnet asyncio client successfully started")
+
+    async def close(self):
+
+        self.reconnected = False
+
+        if self._ws is not None:
+            await self._ws.close()
+        if self._ws_task is not None:
+            self._ws_task.cancel()  # Also stops a connection still being opened, that _ws.close() would miss
+            await asyncio.gather(self._ws_task, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def _generate_signature(self, data: typing.Dict) -> str:
+
+        signature = self._hmac.copy()
+        signature.update(urlencode(data).encode())
+        return signature.hexdigest()
+
+    async def _do_request(self, method: str, endpoint: str, data: typing.Dict, order_count: int = 1,
+                          signed: bool = False):
+
+        """
+        :param method: GET, POST, PUT or DELETE
+        :param endpoint:
+        :param data: The request parameters, the timestamp and signature are added by signed requests
+        :param order_count: Number of orders placed by the request, for the ORDER-COUNT rate limits
+        :param signed: Add the timestamp and the signature, once the rate limiter lets the request go so a throttled
+        request is not rejected for being outside of the recvWindow
+        :return: The decoded response, None in case of error
+        """
+
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise ValueError()
+
+        weight = get_request_weight(endpoint, data)
+        # Only the new orders count towards the ORDER-COUNT limits, not the cancellations
+        is_order = endpoint in ORDER_ENDPOINTS and method == "POST"
+        # The cancellations are still served before the informational requests
+        priority = get_request_priority(method, endpoint)
+
+        # Only the GET requests are idempotent, an order request is never sent twice
+        retries = self._max_retries if method == "GET" else 0
+
+        for attempt in range(retries + 1):
+
+            if attempt > 0:
+                delay = 0.2 * 2 ** (attempt - 1)
+                await asyncio.sleep(random.uniform(delay / 2, delay * 1.5))  # Jitter avoids synchronized retries
+                logger.warning("Retrying %s request to %s (attempt %s/%s)", method, endpoint, attempt, retries)
+
+            wait = self._rate_limiter.try_acquire(weight, is_order, order_count, priority)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._rate_limiter.try_acquire(weight, is_order, order_count, priority)
+
+            params = data
+
+            if signed:
+                params = dict(data)
+                params['timestamp'] = int(time.time() * 1000)
+                params['signature'] = self._generate_signature(params)
+
+            # The query string is encoded here so that it matches exactly the string that was signed
+            url = self._main_url + endpoint
+            if len(params) > 0:
+                url += "?" + urlencode(params)
+
+            try:
+                # encoded=True keeps aiohttp from requoting the query string (e.g: %3A -> :) after it was signed
+                async with self._session.request(method, yarl.URL(url, encoded=True)) as response:
+                    self._rate_limiter.update_from_headers(response.headers)
+
+                    if response.status in [418, 429]:  # Too many requests / IP banned
+                        retry_after = float(response.headers.get("Retry-After", 60))
+                        logger.error("Rate limit exceeded on %s request to %s, pausing requests for %s seconds",
+                                     method, endpoint, retry_after)
+                        self._rate_limiter.block(retry_after)
+                        if attempt < retries:
+                            continue  # Waits in try_acquire() until the end of the block
+                        return None
+
+                    if response.status >= 500 and attempt < retries:
+                        logger.error("Server error while making %s request to %s (error code %s)",
+                                     method, endpoint, response.status)
+                        continue
+
+                    if response.status == 200:
+                        return await response.json()
+                    else:
+                        logger.error("Error while making %s request to %s: %s (error code %s)",
+                                     method, endpoint, await response.text(), response.status)
+                        return None
+
+            except Exception as e:  # Takes into account any possible error, most likely network errors
+                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+
+        return None
+
+    async def get_contracts(self) -> typing.Dict[str, ContractData]:
+
+        exchange_info = await self._do_request("GET", "/fapi/v1/exchangeInfo", dict())
+
+        contracts = dict()
+
+        if exchange_info is not None:
+            self._rate_limiter.update_limits(exchange_info['rateLimits'])
+
+            for contract_data in exchange_info['symbols']:
+                contracts[contract_data['symbol']] = ContractData(contract_data)
+
+        return collections.OrderedDict(sorted(contracts.items()))
+
+    async def get_klines_page(self, contract: ContractData, interval: str, start_time: int,
+                              end_time: int) -> typing.Optional[typing.List]:
+
+        params_data = dict()
+        params_data['symbol'] = contract.symbol
+        params_data['interval'] = interval
+        params_data['startTime'] = start_time
+        params_data['endTime'] = end_time
+        params_data['limit'] = KLINES_PAGE_SIZE
+
+        return await self._do_request("GET", "/fapi/v1/klines", params_data)
+
+    async def get_klines_pages(self, contract: ContractData, interval: str,
+                               pages: typing.List[typing.Tuple[int, int]]) -> typing.List[typing.Optional[typing.List]]:
+
+        """
+        Download the pages of a backfill, at most MAX_KLINES_REQUESTS at the same time.
+        :param pages: (start time, end time) of each page
+        :return: The raw klines of each page, in the same order, None for the pages that could not be downloaded
+        """
+
+        semaphore = asyncio.Semaphore(MAX_KLINES_REQUESTS)
+
+        async def get_page(start_time: int, end_time: int):
+            async with semaphore:
+                return await self.get_klines_page(contract, interval, start_time, end_time)
+
+        return list(await asyncio.gather(*(get_page(*page) for page in pages)))
+
+    async def get_depth_snapshot(self, contract: ContractData, limit: int = 1000) -> typing.Optional[typing.Dict]:
+
+        """
+        Order book snapshot used to initialize the local OrderBook.
+        :param contract:
+        :param limit: Number of levels on each side: 5, 10, 20, 50, 100, 500 or 1000
+        :return: {"lastUpdateId": ..., "bids": [["price", "qty"], ...], "asks": [...]}
+        """
+
+        params_data = dict()
+        params_data['symbol'] = contract.symbol
+        params_data['limit'] = limit
+
+        return await self._do_request("GET", "/fapi/v1/depth", params_data)
+
+    async def get_bid_ask(self, contract: ContractData) -> typing.Dict[str, float]:
+
+        params_data = dict()
+        params_data['symbol'] = contract.symbol
+
+        ob_data = await self._do_request("GET", "/fapi/v1/ticker/bookTicker", params_data)
+
+        if ob_data is not None:
+            self.prices[contract.symbol] = {'bid': float(ob_data['bidPrice']), 'ask': float(ob_data['askPrice'])}
+
+            return self.prices[contract.symbol]
+
+    async def get_balances(self) -> typing.Dict[str, BalanceData]:
+
+        balances = dict()
+
+        account_data = await self._do_request("GET", "/fapi/v1/account", dict(), signed=True)
+
+        if account_data is not None:
+            for a in account_data['assets']:
+                balances[a['asset']] = BalanceData(a)
+
+        return balances
+
+    async def place_order(self, contract: ContractData, order_type: str, quantity: float, side: str, price=None,
+                          tif=None, stop_price=None, reduce_only=False) -> OrderStatusData:
+
+        data = get_order_parameters(contract, order_type, quantity, side, price, tif, stop_price, reduce_only)
+
+        order_status = await self._do_request("POST", "/fapi/v1/order", data, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatusData(order_status)
+
+        return order_status
+
+    async def place_batch_orders(self, orders: typing.List[typing.Dict]) \
+            -> typing.List[typing.Optional[OrderStatusData]]:
+
+        """
+        Place several orders, possibly on different symbols, with one request per group of BATCH_ORDERS_SIZE orders.
+        The groups are sent at the same time.
+        :param orders: Keyword arguments of place_order() for each order
+        :return: The OrderStatusData of each order, in the same order, None for the orders that failed
+        """
+
+        groups = [orders[i:i + BATCH_ORDERS_SIZE] for i in range(0, len(orders), BATCH_ORDERS_SIZE)]
+
+        results = await asyncio.gather(*(self._place_batch(group) for group in groups))
+
+        return [result for group_results in results for result in group_results]
+
+    async def _place_batch(self, orders: typing.List[typing.Dict]) -> typing.List[typing.Optional[OrderStatusData]]:
+
+        data = dict()
+        data['batchOrders'] = json.dumps([get_order_parameters(**order) for order in orders], separators=(",", ":"))
+
+        response = await self._do_request("POST", "/fapi/v1/batchOrders", data, order_count=len(orders), signed=True)
+
+        return parse_batch_response(response, len(orders))
+
+    async def cancel_order(self, contract: ContractData, order_id: int) -> OrderStatusData:
+
+        data = dict()
+        data['orderId'] = order_id
+        data['symbol'] = contract.symbol
+
+        order_status = await self._do_request("DELETE", "/fapi/v1/order", data, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatusData(order_status)
+
+        return order_status
+
+    async def cancel_batch_orders(self, contract: ContractData, order_ids: typing.List[int]) \
+            -> typing.List[typing.Optional[OrderStatusData]]:
+
+        """
+        Cancel several orders of a symbol, with one request per group of BATCH_CANCEL_SIZE orders sent at the same time.
+        :param contract:
+        :param order_ids:
+        :return: The OrderStatusData of each cancelled order, in the same order, None for the ones that failed
+        """
+
+        results = await asyncio.gather(*(self._cancel_batch(contract, order_ids[i:i + BATCH_CANCEL_SIZE])
+                                         for i in range(0, len(order_ids), BATCH_CANCEL_SIZE)))
+
+        return [result for group_results in results for result in group_results]
+
+    async def _cancel_batch(self, contract: ContractData, order_ids: typing.List[int]) \
+            -> typing.List[typing.Optional[OrderStatusData]]:
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['orderIdList'] = json.dumps(order_ids, separators=(",", ":"))
+
+        response = await self._do_request("DELETE", "/fapi/v1/batchOrders", data, order_count=len(order_ids),
+                                          signed=True)
+
+        return parse_batch_response(response, len(order_ids))
+
+    async def get_order_status(self, contract: ContractData, order_id: int) -> OrderStatusData:
+
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['orderId'] = order_id
+
+        order_status = await self._do_request("GET", "/fapi/v1/order", data, signed=True)
+
+        if order_status is not None:
+            order_status = OrderStatusData(order_status)
+
+        return order_status
+
+    async def create_listen_key(self) -> typing.Optional[str]:
+
+        response = await self._do_request("POST", "/fapi/v1/listenKey", dict())
+
+        if response is not None:
+            return response['listenKey']
+
+    async def keepalive_listen_key(self) -> bool:
+        return await self._do_request("PUT", "/fapi/v1/listenKey", dict()) is not None
+
+    async def _run_ws(self):
+
+        while self.reconnected:  # Reconnect unless the client is closed
+            try:
+                async with self._session.ws_connect(self.ws_url, timeout=self._timeout) as ws:
+                    self._ws = ws
+                    await self._on_open()
+
+                    async for msg in ws:
+                        if msg.type == aiohttp.WSMsgType.TEXT:
+                            if self._on_message is not None:
+                                self._on_message(ws, msg.data)
+                        elif msg.type == aiohttp.WSMsgType.ERROR:
+                            logger.error("Binance connection error: %s", ws.exception())
+                            break
+
+            except Exception as e:
+                logger.error("Binance error in the websocket loop: %s", e)
+
+            self.ws_connected = False
+            logger.warning("Binance Websocket connection closed")
+
+            if self.reconnected:
+                await asyncio.sleep(2)
+
+    async def _on_open(self):
+
+        logger.info("Binance connection opened")
+
+        self.ws_connected = True
+
+        for channel in list(self.ws_subscriptions.keys()):
+            symbols = [self.contracts[symbol] for symbol in self.ws_subscriptions[channel]]
+            if len(symbols) > 0:
+                await self.subscribe_channel(symbols, channel, reconnection=True)
+
+    async def subscribe_channel(self, contracts: typing.List[ContractData], channel: str, reconnection=False):
+
+        data = dict()
+        data['method'] = "SUBSCRIBE"
+        data['params'] = []
+
+        if len(contracts) == 0:
+            data['params'].append(channel)
+        else:
+            self.ws_subscriptions.setdefault(channel, [])
+
+            for contract in contracts:
+                if contract.symbol not in self.ws_subscriptions[channel] or reconnection:
+                    data['params'].append(contract.symbol.lower() + "@" + channel)
+                    if contract.symbol not in self.ws_subscriptions[channel]:
+                        self.ws_subscriptions[channel].append(contract.symbol)
+
+            if len(data['params']) == 0:
+                return
+
+        data['id'] = self._ws_id
+        self._ws_id += 1
+
+        if not self.ws_connected:  # The subscription is sent by _on_open() once connected
+            return
+
+        try:
+            await self._ws.send_str(json.dumps(data))
+            logger.info("Binance: subscribing to: %s", ','.join(data['params']))
+        except Exception as e:
+            logger.error("Websocket error while subscribing to %s: %s", channel, e)
+
+    async def unsubscribe_channel(self, contracts: typing.List[ContractData], channel: str):
+
+        data = dict()
+        data['method'] = "UNSUBSCRIBE"
+        data['params'] = []
+
+        for contract in contracts:
+            if contract.symbol in self.ws_subscriptions.get(channel, []):
+                data['params'].append(contract.symbol.lower() + "@" + channel)
+                self.ws_subscriptions[channel].remove(contract.symbol)
+
+        if len(data['params']) == 0:
+            return
+
+        data['id'] = self._ws_id
+        self._ws_id += 1
+
+        if not self.ws_connected:  # Not subscribed again by _on_open()
+            return
+
+        try:
+            await self._ws.send_str(json.dumps(data))
+            logger.info("Binance: unsubscribing from: %s", ','.join(data['params']))
+        except Exception as e:
+            logger.error("Websocket error while unsubscribing from %s: %s", channel, e)
+
+
+class SyncBinanceClient(ClientBase):
+    def __init__(self, public_key: str, secret_key: str, **kwargs):
+
+        """
+        Blocking facade over AsyncBinanceClient for the Tkinter interface, with the same attributes as BinanceClient
+        so it can be passed to Root() and to the strategies.
+        The event loop runs in its own thread, each method submits a coroutine to it and waits for the result. The
+        market data messages are processed on the event loop, the orders are sent from the OrderExecutor threads.
+        :param public_key:
+        :param secret_key:
+        :param kwargs: Passed to AsyncBinanceClient (main_url, ws_url, max_connections, timeout, max_retries)
+        """
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="binance-asyncio", daemon=True)
+        self._thread.start()
+
+        self._registry = StrategyRegistry()
+        self.logs = []
+
+        # The messages are already processed one by one on the event loop
+        self.trade_batcher = None
+
+        self.order_books = OrderBookManager(self)
+
+        self._decoder = MessageDecoder()
+        self._handlers = {"bookTicker": self._on_book_ticker, "aggTrade": self._on_agg_trade,
+                          "kline": self._on_kline, "depthUpdate": self.order_books.on_depth_update}
+
+        self.client = AsyncBinanceClient(public_key, secret_key, on_message=self._on_message, **kwargs)
+
+        self.scheduler = Scheduler()
+        self.candle_store = CandleStore()
+        self.market_data = MarketData(self)
+        self.order_executor = OrderExecutor(self)
+
+        self._run(self.client.start())
+
+        self.account = AccountState()
+        self.account.set_balances(self.get_balances())
+        self.user_stream = UserDataStream(self, self.client.ws_url, self.account)
+        self.user_stream.start()
+
+    def _run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    @property
+    def contracts(self) -> typing.Dict[str, ContractData]:
+        return self.client.contracts
+
+    @property
+    def prices(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        return self.client.prices
+
+    @property
+    def ws_connected(self) -> bool:
+        return self.client.ws_connected
+
+    @property
+    def ws_subscriptions(self) -> typing.Dict[str, typing.List[str]]:
+        return self.client.ws_subscriptions
+
+    def close(self):
+        self.user_stream.close()
+        self.scheduler.stop()
+        self.order_executor.stop()
+        self._run(self.client.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def get_contracts(self) -> typing.Dict[str, ContractData]:
+        return self._run(self.client.get_contracts())
+
+    def _get_klines_pages(self, contract: ContractData, interval: str, pages: typing.List[typing.Tuple[int, int]]) \
+            -> typing.List[typing.Optional[typing.List]]:
+        return self._run(self.client.get_klines_pages(contract, interval, pages))
+
+    def get_depth_snapshot(self, contract: ContractData, limit: int = 1000) -> typing.Optional[typing.Dict]:
+        return self._run(self.client.get_depth_snapshot(contract, limit))
+
+    def get_bid_ask(self, contract: ContractData) -> typing.Dict[str, float]:
+        return self._run(self.client.get_bid_ask(contract))
+
+    def get_balances(self) -> typing.Dict[str, BalanceData]:
+        return self._run(self.client.get_balances())
+
+    def place_order(self, contract: ContractData, order_type: str, quantity: float, side: str, price=None,
+                    tif=None, stop_price=None, reduce_only=False) -> OrderStatusData:
+        return self._run(self.client.place_order(contract, order_type, quantity, side, price, tif, stop_price,
+                                                 reduce_only))
+
+    def place_batch_orders(self, orders: typing.List[typing.Dict]) -> typing.List[typing.Optional[OrderStatusData]]:
+        return self._run(self.client.place_batch_orders(orders))
+
+    def cancel_order(self, contract: ContractData, order_id: int) -> OrderStatusData:
+        return self._run(self.client.cancel_order(contract, order_id))
+
+    def cancel_batch_orders(self, contract: ContractData, order_ids: typing.List[int]) \
+            -> typing.List[typing.Optional[OrderStatusData]]:
+        return self._run(self.client.cancel_batch_orders(contract, order_ids))
+
+    def get_order_status(self, contract: ContractData, order_id: int) -> OrderStatusData:
+        return self._run(self.client.get_order_status(contract, order_id))
+
+    def create_listen_key(self) -> typing.Optional[str]:
+        return self._run(self.client.create_listen_key())
+
+    def keepalive_listen_key(self) -> bool:
+        return self._run(self.client.keepalive_listen_key())
+
+    def subscribe_channel(self, contracts: typing.List[ContractData], channel: str, reconnection=False):
+        return self._run(self.client.subscribe_channel(contracts, channel, reconnection))
+
+    def unsubscribe_channel(self, contracts: typing.List[ContractData], channel: str):
+        return self._run(self.client.unsubscribe_channel(contracts, channel))
@@ -1,33 +1,53 @@
 import logging
 import requests
+import requests.adapters
 import time
+import random
 import typing
 import collections
 
+from concurrent.futures import ThreadPoolExecutor
+
 from urllib.parse import urlencode
 
 import hmac
 import hashlib
 
-import websocket
 import json
 
-import threading
-
 from Exchange_Data import *
-from Strategies import TechnicalStrategy, BreakoutStrategy
+from Strategy_Registry import StrategyRegistry
+from Rate_Limiter import RateLimiter, ORDER_ENDPOINTS, get_request_priority, get_request_weight
+from User_Stream import AccountState, UserDataStream
+from Scheduler import Scheduler
+from Order_Executor import OrderExecutor
+from Ws_Manager import WsManager
+from Candle_Store import CandleStore
+from Market_Data import MarketData
+from Trade_Batcher import TradeBatcher
+from Ticker_Conflator import TickerConflator
+from Message_Decoder import MessageDecoder
+from Order_Book import OrderBookManager
+from Client_Base import ClientBase, BATCH_ORDERS_SIZE, BATCH_CANCEL_SIZE, KLINES_PAGE_SIZE, MAX_KLINES_REQUESTS, \
+    get_order_parameters, parse_batch_response
 
 
 logger = logging.getLogger()
 
 
-class BinanceClient:
-    def __init__(self, public_key: str, secret_key: str):
+class BinanceClient(ClientBase):
+    def __init__(self, public_key: str, secret_key: str, pool_size: int = 10, timeout: float = 5,
+                 max_retries: int = 3, batch_trades: bool = True):
 
         """
         https://binance-docs.github.io/apidocs/futures/en
         :param public_key:
         :param secret_key:
+        :param pool_size: Number of keep-alive HTTP connections kept open to the REST API
+        :param timeout: Timeout in seconds of each REST request (connection and read)
+        :param max_retries: Maximum number of retries of a GET request after a network error or a 5xx response
+        :param batch_trades: Process the aggTrade messages in micro-batches on a dedicated thread instead of one by
+        one on the websocket threads
         """
 
         
@@ -40,65 +60,177 @@ class BinanceClient:
 
         self._headers = {'X-MBX-APIKEY': self._public_key}
 
+        # The HMAC object is keyed once and copied for each signature instead of being rebuilt from the secret key
+        self._hmac = hmac.new(self._secret_key.encode(), digestmod=hashlib.sha256)
+
+        # A single Session reuses its TCP/TLS connections (keep-alive) instead of paying a handshake per request
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._session = requests.Session()
+        self._session.headers.update(self._headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+
+        # Every REST request waits for capacity in the rate limiter instead of risking a ban from the exchange
+        self._rate_limiter = RateLimiter()
+
         self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+
+        # Local cache of the closed candles, get_historical_candles() only downloads what is missing
+        self.candle_store = CandleStore()
+
+        # Candles and indicators shared by the strategies running on the same symbol and timeframe
+        self.market_data = MarketData(self)
+
+        # Shared timer thread and worker pool for all the delayed and recurring work (order polling, keepalive...)
+        self.scheduler = Scheduler()
+
+        # Orders are sent from a dedicated thread pool so that the websocket thread never waits for a REST request
+        self.order_executor = OrderExecutor(self)
+
+        # Balances, positions and order statuses are kept up to date by the user data stream instead of REST polling
+        self.account = AccountState()
+        self.account.set_balances(self.get_balances())
+        self.user_stream = UserDataStream(self, self._ws_url, self.account)
 
         self.prices = dict()
-        self.strategies: typing.Dict[int, typing.Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        # Copy-on-write registry of the running strategies, also holds the symbol -> strategies/open trades routing
+        # table used by _on_message() so that a websocket message only touches the consumers of its own symbol
+        self._registry = StrategyRegistry()
 
         self.logs = []
 
-        self._ws_id = 1
-        self.ws: websocket.WebSocketApp
-        self.reconnected = True
-        self.ws_connected = False
+        self.trade_batcher = TradeBatcher(self._on_trades) if batch_trades else None
+
+        # Local order books (snapshot + diff-depth stream) of the symbols traded by the strategies
+        self.order_books = OrderBookManager(self)
+
+        # Only the latest top of book of each symbol matters, the intermediate updates are dropped under load
+        self.ticker_conflator = TickerConflator(self._on_book_ticker,
+                                                lambda: self.trade_batcher.backlog if self.trade_batcher else 0,
+                                                lambda: self.trade_batcher.lag if self.trade_batcher else 0)
+
+        # Event type -> handler of the market data messages, the prices are already converted to float by the decoder
+        self._decoder = MessageDecoder()
+        self._handlers = {"bookTicker": self.ticker_conflator.put, "aggTrade": self._on_agg_trade,
+                          "kline": self._on_kline, "depthUpdate": self.order_books.on_depth_update}
+
+        # The market data streams are spread over as many websocket connections as needed
+        self.ws_manager = WsManager(self._ws_url, self._on_message)
         self.ws_subscriptions = {"bookTicker": [], "aggTrade": []}
 
-        thr = threading.Thread(target=self._start_ws)
-        thr.start()
+        if "XRPUSDT" in self.contracts:
+            self.subscribe_channel([self.contracts["XRPUSDT"]], "bookTicker")
+
+        self.user_stream.start()
 
         logger.info("Binance Futures Testnet Client successfully started")
 
-    def _add_log(self, msg: str):
+    def close(self):
 
-        logger.info("%s", msg)
-        self.logs.append({"log": msg, "displayed": False})
+        """
+        Stop the websocket connections and the scheduler, called when the interface is closed.
+        :return:
+        """
+
+        self.ws_manager.close()
+        self.user_stream.close()
+        self.scheduler.stop()
+        self.order_executor.stop()
+
+        self.ticker_conflator.stop()
+
+        if self.trade_batcher is not None:
+            self.trade_batcher.stop()
 
     def _generate_signature(self, data: typing.Dict) -> str:
 
-        return hmac.new(self._secret_key.encode(), urlencode(data).encode(), hashlib.sha256).hexdigest()
+        signature = self._hmac.copy()
+        signature.update(urlencode(data).encode())
+        return signature.hexdigest()
+
+    def _do_request(self, method: str, endpoint: str, data: typing.Dict, order_count: int = 1, signed: bool = False):
+
+        """
+        :param method: GET, POST, PUT or DELETE
+        :param endpoint:
+        :param data: The request parameters, the timestamp and signature are added by signed requests
+        :param order_count: Number of orders placed by the request, for the ORDER-COUNT rate limits
+        :param signed: Add the timestamp and the signature, again for each attempt so a retry is not rejected for
+        being outside of the recvWindow
+        :return: The decoded response, None in case of error
+        """
+
+        if method not in ["GET", "POST", "PUT", "DELETE"]:
+            raise ValueError()
+
+        # Only the GET requests are idempotent, an order request is never sent twice
+
+        retries = self._max_retries if method == "GET" else 0
+
+        weight = get_request_weight(endpoint, data)
+        # Only the new orders count towards the ORDER-COUNT limits, not the cancellations
+        is_order = endpoint in ORDER_ENDPOINTS and method == "POST"
+        # The cancellations are still served before the informational requests
+        priority = get_request_priority(method, endpoint)
+
+        for attempt in range(retries + 1):
+
+            if attempt > 0:
+                delay = 0.2 * 2 ** (attempt - 1)
+                time.sleep(random.uniform(delay / 2, delay * 1.5))  # Jitter avoids synchronized retries
+                logger.warning("Retrying %s request to %s (attempt %s/%s)", method, endpoint, attempt, retries)
 
-    def _do_request(self, method: str, endpoint: str, data: typing.Dict):
+            self._rate_limiter.acquire(weight, is_order, order_count, priority)
+
+            if signed:  # Stamped after waiting for the rate limiter
+                params = dict(data)
+                params['timestamp'] = int(time.time() * 1000)
+                params['signature'] = self._generate_signature(params)
+            else:
+                params = data
 
-        if method == "GET":
             try:
-                response = requests.get(self._main_url + endpoint, params=data, headers=self._headers)
+                response = self._session.request(method, self._main_url + endpoint, params=params,
+                                                 timeout=self._timeout)
             except Exception as e:  # Takes into account any possible error, most likely network errors
                 logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
-                return None
+                continue
 
-        elif method == "POST":
-            try:
-                response = requests.post(self._main_url + endpoint, params=data, headers=self._headers)
-            except Exception as e:
-                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+            self._rate_limiter.update_from_headers(response.headers)
+
+            if response.status_code in [418, 429]:  # Too many requests / IP banned
+                retry_after = float(response.headers.get("Retry-After", 60))
+                logger.error("Rate limit exceeded on %s request to %s, pausing requests for %s seconds",
+                             method, endpoint, retry_after)
+                self._rate_limiter.block(retry_after)
+                if attempt < retries:
+                    continue  # The request is queued again by the rate limiter
                 return None
 
-        elif method == "DELETE":
-            try:
-                response = requests.delete(self._main_url + endpoint, params=data, headers=self._headers)
-            except Exception as e:
-                logger.error("Connection error while making %s request to %s: %s", method, endpoint, e)
+            if response.status_code >= 500 and attempt < retries:
+                logger.error("Server error while making %s request to %s (error code %s)",
+                             method, endpoint, response.status_code)
+                continue
+
+            if response.status_code == 200:  # 200 is the response code of successful requests
+                return response.json()
+            else:
+                logger.error("Error while making %s request to %s: %s (error code %s)",
+                             method, endpoint, response.text, response.status_code)
                 return None
-        else:
-            raise ValueError()
 
-        if response.status_code == 200:  # 200 is the response code of successful requests
-            return response.json()
-        else:
-            logger.error("Error while making %s request to %s: %s (error code %s)",
-                         method, endpoint, response.json(), response.status_code)
-            return None
+        return None
+
+    def get_rate_limit_usage(self) -> typing.Dict[str, typing.Dict[str, float]]:
+
+        """
+        Current usage of the exchange rate limits, to monitor the headroom left under load.
+        :return: e.g: {"USED-WEIGHT-1M": {"used": 120, "limit": 2160}, "ORDER-COUNT-10S": {...}, ...}
+        """
+
+        return self._rate_limiter.usage()
 
     def get_contracts(self) -> typing.Dict[str, ContractData]:
 
@@ -107,27 +239,36 @@ class BinanceClient:
         contracts = dict()
 
         if exchange_info is not None:
+            self._rate_limiter.update_limits(exchange_info['rateLimits'])
+
             for contract_data in exchange_info['symbols']:
                 contracts[contract_data['symbol']] = ContractData(contract_data)
 
         return collections.OrderedDict(sorted(contracts.items()))  # Sort keys of the dictionary alphabetically
 
-    def get_historical_candles(self, contract: ContractData, interval: str) -> typing.List[CandleData]:
+    def _get_klines_pages(self, contract: ContractData, interval: str, pages: typing.List[typing.Tuple[int, int]]) \
+            -> typing.List[typing.Optional[typing.List]]:
 
-        params_data = dict()
-        params_data['symbol'] = contract.symbol
-        params_data['interval'] = interval
-        params_data['limit'] = 1000  
+        """
+        Download the pages of a backfill, several at the same time (the rate limiter still applies).
+        """
 
-        raw_candles = self._do_request("GET", "/fapi/v1/klines", params_data)
+        if len(pages) == 1:
+            return [self._get_klines_page(contract, interval, *pages[0])]
 
-        candles = []
+        with ThreadPoolExecutor(max_workers=min(len(pages), MAX_KLINES_REQUESTS)) as executor:
+            return list(executor.map(lambda page: self._get_klines_page(contract, interval, *page), pages))
 
-        if raw_candles is not None:
-            for c in raw_candles:
-                candles.append(CandleData(c, interval))
+    def _get_klines_page(self, contract: ContractData, interval: str, start_time: int, end_time: int):
+
+        params_data = dict()
+        params_data['symbol'] = contract.symbol
+        params_data['interval'] = interval
+        params_data['startTime'] = start_time
+        params_data['endTime'] = end_time
+        params_data['limit'] = KLINES_PAGE_SIZE
 
-        return candles
+        return self._do_request("GET", "/fapi/v1/klines", params_data)
 
     def get_bid_ask(self, contract: ContractData) -> typing.Dict[str, float]:
 
@@ -146,15 +287,26 @@ class BinanceClient:
 
             return self.prices[contract.symbol]
 
-    def get_balances(self) -> typing.Dict[str, BalanceData]:
+    def get_depth_snapshot(self, contract: ContractData, limit: int = 1000) -> typing.Optional[typing.Dict]:
 
-        data = dict()
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
+        """
+        Order book snapshot used to initialize the local OrderBook.
+        :param contract:
+        :param limit: Number of levels on each side: 5, 10, 20, 50, 100, 500 or 1000
+        :return: {"lastUpdateId": ..., "bids": [["price", "qty"], ...], "asks": [...]}
+        """
+
+        params_data = dict()
+        params_data['symbol'] = contract.symbol
+        params_data['limit'] = limit
+
+        return self._do_request("GET", "/fapi/v1/depth", params_data)
+
+    def get_balances(self) -> typing.Dict[str, BalanceData]:
 
         balances = dict()
 
-        account_data = self._do_request("GET", "/fapi/v1/account", data)
+        account_data = self._do_request("GET", "/fapi/v1/account", dict(), signed=True)
 
         if account_data is not None:
             
@@ -163,201 +315,173 @@ class BinanceClient:
 
         return balances
 
-    def place_order(self, contract: ContractData, order_type: str, quantity: float, side: str, price=None, tif=None) -> OrderStatusData:
-
-        data = dict()
-        data['symbol'] = contract.symbol
-        data['side'] = side.upper()
-        data['quantity'] = round(int(quantity / contract.lot_size) * contract.lot_size, 8)  # int() to round down
-        data['type'] = order_type.upper()  # Makes sure the order type is in uppercase
-
-        if price is not None:
-            data['price'] = round(round(price / contract.tick_size) * contract.tick_size, 8)
-            data['price'] = '%.*f' % (contract.price_decimals, data['price'])  # Avoids scientific notation
+    def place_order(self, contract: ContractData, order_type: str, quantity: float, side: str, price=None, tif=None,
+                    stop_price=None, reduce_only=False) -> OrderStatusData:
 
-        if tif is not None:
-            data['timeInForce'] = tif
+        data = get_order_parameters(contract, order_type, quantity, side, price, tif, stop_price, reduce_only)
 
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
-
-        
-        order_status = self._do_request("POST", "/fapi/v1/order", data)
+        order_status = self._do_request("POST", "/fapi/v1/order", data, signed=True)
 
         if order_status is not None:
             order_status = OrderStatusData(order_status)
 
         return order_status
 
-    def cancel_order(self, contract: ContractData, order_id: int) -> OrderStatusData:
-
-        data = dict()
-        data['orderId'] = order_id
-        data['symbol'] = contract.symbol
-
-        data['timestamp'] = int(time.time() * 1000)
-        data['signature'] = self._generate_signature(data)
+    def place_batch_orders(self, orders: typing.List[typing.Dict]) -> typing.List[typing.Optional[OrderStatusData]]:
 
-        
-        order_status = self._do_request("DELETE", "/fapi/v1/order", data)
-
-        if order_status is not None:
-            order_status = OrderStatusData(order_status)
-
-        return order_status
+        """
+        Place several orders, possibly on different symbols, with one request per group of BATCH_ORDERS_SIZE orders.
+        The groups are sent at the same time.
+        :param orders: Keyword arguments of place_order() for each order, e.g:
+        {"contract": contract, "order_type": "MARKET", "quantity": 0.01, "side": "buy"}
+        :return: The OrderStatusData of each order, in the same order, None for the orders that failed
+        """
 
-    def get_order_status(self, contract: ContractData, order_id: int) -> OrderStatusData:
+        groups = [orders[i:i + BATCH_ORDERS_SIZE] for i in range(0, len(orders), BATCH_ORDERS_SIZE)]
 
-        data = dict()
-        data['timestamp'] = int(time.time() * 1000)
-        data['symbol'] = contract.symbol
-        data['orderId'] = order_id
-        data['signature'] = self._generate_signature(data)
+        if len(groups) <= 1:
+            return [result for group in groups for result in self._place_batch(group)]
 
-        order_status = self._do_request("GET", "/fapi/v1/order", data)
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            results = list(executor.map(self._place_batch, groups))
 
-        if order_status is not None:
-            order_status = OrderStatusData(order_status)
+        return [result for group_results in results for result in group_results]
 
-        return order_status
+    def _place_batch(self, orders: typing.List[typing.Dict]) -> typing.List[typing.Optional[OrderStatusData]]:
 
-    def _start_ws(self):
+        batch = []
 
-        self.ws = websocket.WebSocketApp(self._ws_url, on_open=self._on_open, on_close=self._on_close,
-                                         on_error=self._on_error, on_message=self._on_message)
+        for order in orders:
+            batch.append(get_order_parameters(**order))  # All the values are already strings, as required
 
-        while True:
-            try:
-                if self.reconnected:  # Reconnect unless the interface is closed by the user
-                    self.ws.run_forever()  # Blocking method that ends only if the websocket connection drops
-                else:
-                    break
-            except Exception as e:
-                logger.error("Binance error in run_forever() method: %s", e)
-            time.sleep(2)
-
-    def _on_open(self, ws):
-        
-        logger.info("Binance connection opened")
+        data = dict()
+        data['batchOrders'] = json.dumps(batch, separators=(",", ":"))
 
-        self.ws_connected = True
+        response = self._do_request("POST", "/fapi/v1/batchOrders", data, order_count=len(orders), signed=True)
 
-        # The aggTrade channel is subscribed to in the _switch_strategy() method of strategy_component.py
+        return parse_batch_response(response, len(orders))
 
-        for channel in ["bookTicker", "aggTrade"]:
-            for symbol in self.ws_subscriptions[channel]:
-                self.subscribe_channel([self.contracts[symbol]], channel, reconnection=True)
+    def cancel_order(self, contract: ContractData, order_id: int) -> OrderStatusData:
 
-        if "XRPUSDT" not in self.ws_subscriptions["bookTicker"]:
-            self.subscribe_channel([self.contracts["XRPUSDT"]], "bookTicker")
+        data = dict()
+        data['orderId'] = order_id
+        data['symbol'] = contract.symbol
 
-    def _on_close(self, ws):
+        order_status = self._do_request("DELETE", "/fapi/v1/order", data, signed=True)
 
-        logger.warning("Binance Websocket connection closed")
-        self.ws_connected = False
+        if order_status is not None:
+            order_status = OrderStatusData(order_status)
 
-    def _on_error(self, ws, msg: str):
+        return order_status
 
-        logger.error("Binance connection error: %s", msg)
+    def cancel_batch_orders(self, contract: ContractData, order_ids: typing.List[int]) \
+            -> typing.List[typing.Optional[OrderStatusData]]:
 
-    def _on_message(self, ws, msg: str):
+        """
+        Cancel several orders of a symbol, with one request per group of BATCH_CANCEL_SIZE orders.
+        :param contract:
+        :param order_ids:
+        :return: The OrderStatusData of each cancelled order, in the same order, None for the ones that failed
+        """
 
-        data = json.loads(msg)
+        results = []
 
-        if "e" in data:
-            if data['e'] == "bookTicker":
+        for i in range(0, len(order_ids), BATCH_CANCEL_SIZE):
+            ids = order_ids[i:i + BATCH_CANCEL_SIZE]
 
-                symbol = data['s']
+            data = dict()
+            data['symbol'] = contract.symbol
+            data['orderIdList'] = json.dumps(ids, separators=(",", ":"))
 
-                if symbol not in self.prices:
-                    self.prices[symbol] = {'bid': float(data['b']), 'ask': float(data['a'])}
-                else:
-                    self.prices[symbol]['bid'] = float(data['b'])
-                    self.prices[symbol]['ask'] = float(data['a'])
+            response = self._do_request("DELETE", "/fapi/v1/batchOrders", data, order_count=len(ids), signed=True)
 
-                # PNL Calculation
+            results.extend(parse_batch_response(response, len(ids)))
 
-                try:
-                    for b_index, strat in self.strategies.items():
-                        if strat.contract.symbol == symbol:
-                            for trade in strat.trades:
-                                if trade.status == "open" and trade.entry_price is not None:
-                                    if trade.side == "long":
-                                        trade.pnl = (self.prices[symbol]['bid'] - trade.entry_price) * trade.quantity
-                                    elif trade.side == "short":
-                                        trade.pnl = (trade.entry_price - self.prices[symbol]['ask']) * trade.quantity
-                except RuntimeError as e:  # Handles the case  the dictionary is modified while loop through it
-                    logger.error("Error while looping through the Binance strategies: %s", e)
+        return results
 
-            if data['e'] == "aggTrade":
+    def get_order_status(self, contract: ContractData, order_id: int) -> OrderStatusData:
 
-                symbol = data['s']
+        data = dict()
+        data['symbol'] = contract.symbol
+        data['orderId'] = order_id
 
-                for key, strat in self.strategies.items():
-                    if strat.contract.symbol == symbol:
-                        res = strat.parse_trades(float(data['p']), float(data['q']), data['T'])  # Updates candlesticks
-                        strat.check_trade(res)
+        order_status = self._do_request("GET", "/fapi/v1/order", data, signed=True)
 
-    def subscribe_channel(self, contracts: typing.List[ContractData], channel: str, reconnection=False):
+        if order_status is not None:
+            order_status = OrderStatusData(order_status)
 
-        if len(contracts) > 200:
-            logger.warning("Subscribing to more than 200 symbols will most likely fail. "
-                           "Consider subscribing only when adding a symbol to your Watchlist or when starting a "
-                           "strategy for a symbol.")
+        return order_status
 
-        data = dict()
-        data['method'] = "SUBSCRIBE"
-        data['params'] = []
+    def create_listen_key(self) -> typing.Optional[str]:
 
-        if len(contracts) == 0:
-            data['params'].append(channel)
-        else:
-            for contract in contracts:
-                if contract.symbol not in self.ws_subscriptions[channel] or reconnection:
-                    data['params'].append(contract.symbol.lower() + "@" + channel)
-                    if contract.symbol not in self.ws_subscriptions[channel]:
-                        self.ws_subscriptions[channel].append(contract.symbol)
+        """
+        Start a user data stream, or extend the validity of the current one if it is still open.
+        :return: The listenKey to connect to, None in case of error
+        """
 
-            if len(data['params']) == 0:
-                return
+        response = self._do_request("POST", "/fapi/v1/listenKey", dict())
 
-        data['id'] = self._ws_id
+        if response is not None:
+            return response['listenKey']
 
-        try:
-            self.ws.send(json.dumps(data))  # Converts the JSON object (dictionary) to a JSON string
-            logger.info("Binance: subscribing to: %s", ','.join(data['params']))
-        except Exception as e:
-            logger.error("Websocket error while subscribing to @bookTicker and @aggTrade: %s", e)
+    def keepalive_listen_key(self) -> bool:
 
-        self._ws_id += 1
+        """
+        Extend the validity of the listenKey by 60 minutes.
+        :return: False if the listenKey could not be extended, it has probably expired
+        """
 
-    def get_trade_size(self, contract: ContractData, price: float, balance_pct: float):
+        return self._do_request("PUT", "/fapi/v1/listenKey", dict()) is not None
 
-        logger.info("Getting Binance trade size...")
+    @property
+    def ingest_lag(self) -> float:
 
-        balance = self.get_balances()
+        """
+        :return: Milliseconds between the exchange event time and the processing of the latest market data messages
+        """
 
-        if balance is not None:
-            if contract.quote_asset in balance:               
-                balance = balance[contract.quote_asset].wallet_balance
-            else:
-                return None
-        else:
-            return None
+        trade_lag = self.trade_batcher.lag if self.trade_batcher is not None else 0
 
-        trade_size = (balance * balance_pct / 100) / price
+        return max(trade_lag, self.ticker_conflator.lag)
 
-        trade_size = round(round(trade_size / contract.lot_size) * contract.lot_size, 8)  # Removes extra decimals
+    @property
+    def ws_connected(self) -> bool:
+        return self.ws_manager.connected
 
-        logger.info("Binance current %s balance = %s, trade size = %s", contract.quote_asset, balance, trade_size)
+    def subscribe_channel(self, contracts: typing.List[ContractData], channel: str):
 
-        return trade_size
+        """
+        Subscribe to a channel for some symbols. The WsManager opens a new connection when the current ones carry
+        200 streams, and subscribes again by itself after a reconnection.
+        :param contracts: The symbols, or an empty list for a channel covering all the symbols (e.g: !bookTicker)
+        :param channel: aggTrade, bookTicker, kline_1m...
+        :return:
+        """
 
+        if len(contracts) == 0:
+            self.ws_manager.subscribe([channel])
+            return
 
+        streams = []
 
+        self.ws_subscriptions.setdefault(channel, [])
 
+        for contract in contracts:
+            if contract.symbol not in self.ws_subscriptions[channel]:
+                streams.append(contract.symbol.lower() + "@" + channel)
+                self.ws_subscriptions[channel].append(contract.symbol)
 
+        if len(streams) > 0:
+            self.ws_manager.subscribe(streams)
 
+    def unsubscribe_channel(self, contracts: typing.List[ContractData], channel: str):
 
+        streams = []
 
+        for contract in contracts:
+            if contract.symbol in self.ws_subscriptions.get(channel, []):
+                streams.append(contract.symbol.lower() + "@" + channel)
+                self.ws_subscriptions[channel].remove(contract.symbol)
 
+        if len(streams) > 0:
+            self.ws_manager.unsubscribe(streams)
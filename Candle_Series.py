@@ -0,0 +1,195 @@
+import typing
+
+import numpy as np
+
+from Exchange_Data import *
+
+
+class CandleView:
+    __slots__ = ("_series", "_index")
+
+    def __init__(self, series: "CandleSeries", index: int):
+
+        """
+        CandleData-compatible access to one candle of a CandleSeries, reads and writes go to the series arrays.
+        :param series:
+        :param index: Absolute index of the candle (0 for the first candle ever appended)
+        """
+
+        self._series = series
+        self._index = index
+
+    def _get(self, column: np.ndarray):
+        return column[self._index % self._series.capacity]
+
+    def _set(self, column: np.ndarray, value):
+        self._series.write(column, self._index, value)
+
+    timestamp = property(lambda self: int(self._get(self._series.timestamps_buffer)),
+                         lambda self, v: self._set(self._series.timestamps_buffer, v))
+    open = property(lambda self: float(self._get(self._series.opens_buffer)),
+                    lambda self, v: self._set(self._series.opens_buffer, v))
+    high = property(lambda self: float(self._get(self._series.highs_buffer)),
+                    lambda self, v: self._set(self._series.highs_buffer, v))
+    low = property(lambda self: float(self._get(self._series.lows_buffer)),
+                   lambda self, v: self._set(self._series.lows_buffer, v))
+    close = property(lambda self: float(self._get(self._series.closes_buffer)),
+                     lambda self, v: self._set(self._series.closes_buffer, v))
+    volume = property(lambda self: float(self._get(self._series.volumes_buffer)),
+                      lambda self, v: self._set(self._series.volumes_buffer, v))
+
+    @property
+    def timeframe(self) -> str:
+        return self._series.timeframe
+
+
+class CandleSeries:
+    def __init__(self, timeframe: str, capacity: int = 2000):
+
+        """
+        Fixed-capacity OHLCV ring buffer stored in NumPy columns, replaces the ever-growing List[CandleData].
+        Each value is written twice, at position i and i + capacity, so the last N candles are always a contiguous
+        slice of the buffer: the column getters return views, without any copy.
+        Supports the list operations used by the strategies: len(), [-1], [-2], append().
+        :param timeframe: 1m, 5m...
+        :param capacity: Maximum number of candles kept, the oldest ones are overwritten
+        """
+
+        self.timeframe = timeframe
+        self.capacity = capacity
+        self.count = 0  # Total number of candles appended since the creation of the series
+
+        self.timestamps_buffer = np.zeros(2 * capacity, dtype=np.int64)
+        self.opens_buffer = np.zeros(2 * capacity, dtype=np.float64)
+        self.highs_buffer = np.zeros(2 * capacity, dtype=np.float64)
+        self.lows_buffer = np.zeros(2 * capacity, dtype=np.float64)
+        self.closes_buffer = np.zeros(2 * capacity, dtype=np.float64)
+        self.volumes_buffer = np.zeros(2 * capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def __getitem__(self, item: int) -> CandleView:
+
+        length = len(self)
+
+        if item < 0:
+            item += length
+        if item < 0 or item >= length:
+            raise IndexError("CandleSeries index out of range")
+
+        return CandleView(self, self.count - length + item)
+
+    def __iter__(self) -> typing.Iterator[CandleView]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def write(self, column: np.ndarray, index: int, value):
+        position = index % self.capacity
+        column[position] = value
+        column[position + self.capacity] = value
+
+    def append_values(self, timestamp: int, open_price: float, high: float, low: float, close: float,
+                      volume: float):
+
+        index = self.count
+
+        self.write(self.timestamps_buffer, index, timestamp)
+        self.write(self.opens_buffer, index, open_price)
+        self.write(self.highs_buffer, index, high)
+        self.write(self.lows_buffer, index, low)
+        self.write(self.closes_buffer, index, close)
+        self.write(self.volumes_buffer, index, volume)
+
+        self.count += 1
+
+    def append(self, candle: typing.Union[CandleData, CandleView]):
+        self.append_values(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+
+    def extend(self, candles: typing.Iterable[typing.Union[CandleData, CandleView]]):
+        for candle in candles:
+            self.append(candle)
+
+    def update_last(self, price: float, size: float):
+
+        """
+        Update the current candle with a new trade, in place.
+        :param price: The trade price
+        :param size: The trade size
+        :return:
+        """
+
+        position = (self.count - 1) % self.capacity
+        mirror = position + self.capacity
+
+        self.closes_buffer[position] = self.closes_buffer[mirror] = price
+        volume = self.volumes_buffer[position] + size
+        self.volumes_buffer[position] = self.volumes_buffer[mirror] = volume
+
+        if price > self.highs_buffer[position]:
+            self.highs_buffer[position] = self.highs_buffer[mirror] = price
+        elif price < self.lows_buffer[position]:
+            self.lows_buffer[position] = self.lows_buffer[mirror] = price
+
+    def update_last_batch(self, high: float, low: float, close: float, volume: float):
+
+        """
+        Update the current candle with a batch of trades, summarized by their extremes, last price and total size.
+        """
+
+        position = (self.count - 1) % self.capacity
+        mirror = position + self.capacity
+
+        self.closes_buffer[position] = self.closes_buffer[mirror] = close
+        volume = self.volumes_buffer[position] + volume
+        self.volumes_buffer[position] = self.volumes_buffer[mirror] = volume
+
+        if high > self.highs_buffer[position]:
+            self.highs_buffer[position] = self.highs_buffer[mirror] = high
+        if low < self.lows_buffer[position]:
+            self.lows_buffer[position] = self.lows_buffer[mirror] = low
+
+    def set_last(self, high: float, low: float, close: float, volume: float):
+
+        """
+        Overwrite the current candle with the values sent by the exchange kline stream.
+        """
+
+        position = (self.count - 1) % self.capacity
+
+        for column, value in ((self.highs_buffer, high), (self.lows_buffer, low), (self.closes_buffer, close),
+                              (self.volumes_buffer, volume)):
+            column[position] = column[position + self.capacity] = value
+
+    def _window(self, column: np.ndarray, n: typing.Optional[int]) -> np.ndarray:
+
+        length = len(self)
+        if n is None or n > length:
+            n = length
+
+        start = (self.count - n) % self.capacity
+        return column[start:start + n]
+
+    def timestamps(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self._window(self.timestamps_buffer, n)
+
+    def opens(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self._window(self.opens_buffer, n)
+
+    def highs(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self._window(self.highs_buffer, n)
+
+    def lows(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self._window(self.lows_buffer, n)
+
+    def closes(self, n: typing.Optional[int] = None) -> np.ndarray:
+
+        """
+        Close prices of the last n candles (all the candles kept if n is None), oldest first.
+        This is a view of the buffer: it must not be modified and it changes when new trades are parsed.
+        """
+
+        return self._window(self.closes_buffer, n)
+
+    def volumes(self, n: typing.Optional[int] = None) -> np.ndarray:
+        return self._window(self.volumes_buffer, n)
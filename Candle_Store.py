@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+import typing
+
+from Exchange_Data import *
+
+
+class CandleStore:
+    def __init__(self, path: str = "candles.db"):
+
+        """
+        Local SQLite cache of the closed candlesticks, indexed by symbol, interval and open time.
+        Only closed candles are recorded, so a cached candle never needs to be downloaded again. The time ranges
+        already downloaded are recorded as well, so a range without any candle (before the listing of a symbol, or an
+        exchange outage) is not requested again either.
+        The connection is shared between threads, the lock serializes its use.
+        :param path: The database file, next to the workspace database.db by default
+        """
+
+        self._lock = threading.Lock()
+
+        self.cnt = sqlite3.connect(path, check_same_thread=False)
+        self.pointer = self.cnt.cursor()
+        self.pointer.execute("CREATE TABLE IF NOT EXISTS candles (symbol TEXT, interval TEXT, open_time INTEGER, "
+                             "open REAL, high REAL, low REAL, close REAL, volume REAL, "
+                             "PRIMARY KEY (symbol, interval, open_time)) WITHOUT ROWID")
+        # Downloaded time ranges [start_time, end_time), merged when they overlap or touch
+        self.pointer.execute("CREATE TABLE IF NOT EXISTS coverage (symbol TEXT, interval TEXT, start_time INTEGER, "
+                             "end_time INTEGER, PRIMARY KEY (symbol, interval, start_time)) WITHOUT ROWID")
+        self.cnt.commit()
+
+    def get(self, symbol: str, interval: str, start_time: int, end_time: int) -> typing.List[CandleData]:
+
+        """
+        Get the cached candles of a time range.
+        :param symbol:
+        :param interval:
+        :param start_time: Unix timestamp in milliseconds of the first candle
+        :param end_time: Unix timestamp in milliseconds of the last candle (included)
+        :return: The cached candles sorted by open time, possibly with gaps
+        """
+
+        with self._lock:
+            self.pointer.execute("SELECT open_time, open, high, low, close, volume FROM candles "
+                                 "WHERE symbol = ? AND interval = ? AND open_time BETWEEN ? AND ? "
+                                 "ORDER BY open_time", (symbol, interval, start_time, end_time))
+            rows = self.pointer.fetchall()
+
+        return [CandleData(row, interval, "binance") for row in rows]
+
+    def get_missing_ranges(self, symbol: str, interval: str, start_time: int, end_time: int,
+                           step: int) -> typing.List[typing.Tuple[int, int]]:
+
+        """
+        Time ranges that were never downloaded.
+        :param symbol:
+        :param interval:
+        :param start_time: Unix timestamp in milliseconds of the first candle
+        :param end_time: Unix timestamp in milliseconds of the last candle (included)
+        :param step: Duration of a candle in milliseconds
+        :return: (open time of the first candle, open time of the last candle) of each range, sorted
+        """
+
+        with self._lock:
+            self.pointer.execute("SELECT start_time, end_time FROM coverage "
+                                 "WHERE symbol = ? AND interval = ? AND end_time > ? AND start_time <= ? "
+                                 "ORDER BY start_time", (symbol, interval, start_time, end_time))
+            rows = self.pointer.fetchall()
+
+        missing_ranges = []
+        expected_ts = start_time
+
+        for covered_start, covered_end in rows:
+            if covered_start > expected_ts:
+                missing_ranges.append((expected_ts, covered_start - step))
+            expected_ts = max(expected_ts, covered_end)
+
+        if expected_ts <= end_time:
+            missing_ranges.append((expected_ts, end_time))
+
+        return missing_ranges
+
+    def save(self, symbol: str, interval: str, candles: typing.List[CandleData],
+             covered: typing.List[typing.Tuple[int, int]] = ()):
+
+        """
+        Record closed candles, replacing the ones already cached with the same open time.
+        :param symbol:
+        :param interval:
+        :param candles:
+        :param covered: Time ranges [start_time, end_time) downloaded entirely, candles and gaps alike
+        :return:
+        """
+
+        data = [(symbol, interval, c.timestamp, c.open, c.high, c.low, c.close, c.volume) for c in candles]
+
+        with self._lock:
+            self.pointer.executemany("INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", data)
+
+            for start_time, end_time in covered:
+                self._add_coverage(symbol, interval, start_time, end_time)
+
+            self.cnt.commit()  # The candles and their coverage are recorded together
+
+    def _add_coverage(self, symbol: str, interval: str, start_time: int, end_time: int):
+
+        self.pointer.execute("SELECT start_time, end_time FROM coverage "
+                             "WHERE symbol = ? AND interval = ? AND start_time <= ? AND end_time >= ?",
+                             (symbol, interval, end_time, start_time))
+
+        for covered_start, covered_end in self.pointer.fetchall():  # Merged into one range
+            start_time = min(start_time, covered_start)
+            end_time = max(end_time, covered_end)
+
+        self.pointer.execute("DELETE FROM coverage WHERE symbol = ? AND interval = ? AND start_time <= ? "
+                             "AND end_time >= ?", (symbol, interval, end_time, start_time))
+        self.pointer.execute("INSERT INTO coverage VALUES (?, ?, ?, ?)", (symbol, interval, start_time, end_time))
@@ -0,0 +1,494 @@
+import logging
+import time
+import typing
+
+import numpy as np
+
+from Exchange_Data import *
+from Strategy_Registry import SymbolRoute
+from Strategies import TIMEFRAME_EQUIVALENT
+
+if typing.TYPE_CHECKING:  # Import the class names only for typing purpose
+    from Strategies import TechnicalStrategy, BreakoutStrategy
+    from Strategy_Registry import StrategyRegistry
+    from Market_Data import MarketData
+    from Order_Book import OrderBookManager
+    from Trade_Batcher import TradeBatcher
+    from User_Stream import AccountState, UserDataStream
+    from Message_Decoder import MessageDecoder
+    from Candle_Store import CandleStore
+
+
+logger = logging.getLogger()
+
+KLINES_PAGE_SIZE = 1000  # Maximum number of candles returned by one /fapi/v1/klines request
+MAX_KLINES_REQUESTS = 5  # Maximum number of pages requested at the same time
+BATCH_ORDERS_SIZE = 5  # Maximum number of orders placed by one /fapi/v1/batchOrders request
+BATCH_CANCEL_SIZE = 10  # Maximum number of orders cancelled by one /fapi/v1/batchOrders request
+
+
+def get_order_parameters(contract: ContractData, order_type: str, quantity: float, side: str, price=None, tif=None,
+                         stop_price=None, reduce_only=False) -> typing.Dict:
+
+    """
+    Parameters of a new order, shared by place_order() and place_batch_orders() of both clients.
+    """
+
+    data = dict()
+    data['symbol'] = contract.symbol
+    data['side'] = side.upper()
+    data['quantity'] = contract.format_quantity(contract.quantity_to_lots(quantity))  # Rounded down to the lot
+    data['type'] = order_type.upper()  # Makes sure the order type is in uppercase
+
+    if price is not None:
+        data['price'] = contract.format_price(contract.price_to_ticks(price))  # Exact, no scientific notation
+
+    if tif is not None:
+        data['timeInForce'] = tif
+
+    if stop_price is not None:  # STOP_MARKET, TAKE_PROFIT_MARKET...
+        data['stopPrice'] = contract.format_price(contract.price_to_ticks(stop_price))
+
+    if reduce_only:
+        data['reduceOnly'] = "true"
+
+    return data
+
+
+def parse_batch_response(response, count: int) -> typing.List[typing.Optional[OrderStatusData]]:
+
+    """
+    The batch endpoints return one entry per order, either the order or an error ({"code": ..., "msg": ...}).
+    """
+
+    if response is None:
+        return [None] * count
+
+    results = []
+
+    for entry in response:
+        if "orderId" in entry:
+            results.append(OrderStatusData(entry))
+        else:
+            logger.error("Error in batch order request: %s", entry)
+            results.append(None)
+
+    return results
+
+
+class ClientBase:
+
+    """
+    Transport-independent part of the clients: strategy registry, market data dispatch, PNL, exit checks and trade
+    sizing. BinanceClient (requests + websocket threads) and SyncBinanceClient (asyncio) only differ by how the
+    requests are sent and the messages received.
+    The subclasses set the attributes below and implement get_balances(), _get_klines_pages() and
+    unsubscribe_channel().
+    """
+
+    _registry: "StrategyRegistry"
+    _decoder: "MessageDecoder"
+    _handlers: typing.Dict[str, typing.Callable]
+
+    prices: typing.Dict[str, typing.Dict[str, float]]
+    logs: typing.List[typing.Dict]
+    market_data: "MarketData"
+    candle_store: "CandleStore"
+    order_books: typing.Optional["OrderBookManager"]  # None when no local order book is kept
+    trade_batcher: typing.Optional["TradeBatcher"]  # None when the aggTrade messages are processed one by one
+    account: "AccountState"
+    user_stream: "UserDataStream"
+
+    def _add_log(self, msg: str):
+
+        logger.info("%s", msg)
+        self.logs.append({"log": msg, "displayed": False})
+
+    @property
+    def strategies(self) -> typing.Mapping[int, typing.Union["TechnicalStrategy", "BreakoutStrategy"]]:
+
+        """
+        Read-only snapshot of the running strategies (b_index -> strategy), safe to iterate from any thread.
+        """
+
+        return self._registry.snapshot.strategies
+
+    @property
+    def balances(self) -> typing.Dict[str, BalanceData]:
+        return self.account.balances
+
+    def get_balances(self) -> typing.Dict[str, BalanceData]:
+        raise NotImplementedError
+
+    def _get_klines_pages(self, contract: ContractData, interval: str, pages: typing.List[typing.Tuple[int, int]]) \
+            -> typing.List[typing.Optional[typing.List]]:
+
+        """
+        :param pages: (start time, end time) of each page, at most KLINES_PAGE_SIZE candles
+        :return: The raw klines of each page, in the same order, None for the pages that could not be downloaded
+        """
+
+        raise NotImplementedError
+
+    def unsubscribe_channel(self, contracts: typing.List[ContractData], channel: str):
+        raise NotImplementedError
+
+    def add_strategy(self, b_index: int, strategy: typing.Union["TechnicalStrategy", "BreakoutStrategy"]):
+
+        """
+        Register a strategy that has been switched ON and add it to the routing table of its symbol.
+        :param b_index: The row index of the strategy in the StrategyManager component
+        :param strategy:
+        :return:
+        """
+
+        self._registry.add_strategy(b_index, strategy)
+
+    def remove_strategy(self, b_index: int):
+
+        """
+        Unregister a strategy that has been switched OFF, its open trades stop being updated by the websocket.
+        :param b_index: The row index of the strategy in the StrategyManager component
+        :return:
+        """
+
+        strategy = self._registry.snapshot.strategies.get(b_index)
+
+        self._registry.remove_strategy(b_index)
+
+        if strategy is None:
+            return
+
+        strategy.detach()
+        self.market_data.release(strategy.series)
+
+        # Stops receiving the trades (or klines) of the symbol once no strategy needs them anymore
+        route = self._registry.snapshot.routes.get(strategy.contract.symbol)
+
+        if route is None and self.order_books is not None:
+            self.order_books.unsubscribe(strategy.contract)
+
+        if route is None or all(s.stream_channel != strategy.stream_channel for s in route.strategies):
+            self.unsubscribe_channel([strategy.contract], strategy.stream_channel)
+
+    def add_open_trade(self, trade: TradeData, strategy: typing.Union["TechnicalStrategy", "BreakoutStrategy"]):
+
+        """
+        Called by the strategies once the entry order of a trade is filled, so its PNL gets updated on bookTicker and
+        its take profit / stop loss prices are watched.
+        :param trade:
+        :param strategy: The strategy that opened the trade, notified when an exit price is reached
+        :return:
+        """
+
+        self._registry.add_open_trade(trade, strategy)
+
+    def remove_open_trade(self, trade: TradeData):
+
+        """
+        Called by the strategies when a trade is closed.
+        :param trade:
+        :return:
+        """
+
+        self._registry.remove_open_trade(trade)
+
+    def get_historical_candles(self, contract: ContractData, interval: str, start_time: typing.Optional[int] = None,
+                               end_time: typing.Optional[int] = None, count: int = 1000) -> typing.List[CandleData]:
+
+        """
+        Get the candlesticks of a time range, or the last 'count' candlesticks.
+        The time ranges already downloaded into the local CandleStore are not requested again, only the missing ones
+        (usually the tail since the last call) are. They are split in pages of 1000 candles downloaded concurrently by
+        _get_klines_pages(), then merged with the cached ones in one contiguous list.
+        :param contract:
+        :param interval: 1m, 5m, 15m, 30m, 1h, 4h
+        :param start_time: Unix timestamp in milliseconds of the first candle, if None 'count' candles are returned
+        :param end_time: Unix timestamp in milliseconds of the last candle, the current time if None
+        :param count: Number of candles, only used when start_time is None
+        :return: Candles sorted by timestamp, the last one is the current (unfinished) candle when end_time is None.
+        Empty if a page could not be downloaded.
+        """
+
+        tf_equiv = TIMEFRAME_EQUIVALENT[interval] * 1000
+        now = int(time.time() * 1000)
+
+        if end_time is None:
+            end_time = now
+        end_time = end_time - end_time % tf_equiv  # Open time of the last candle
+
+        if start_time is None:
+            start_time = end_time - (count - 1) * tf_equiv
+        start_time = start_time - start_time % tf_equiv
+
+        cached = self.candle_store.get(contract.symbol, interval, start_time, end_time)
+
+        # The ranges already downloaded are skipped even without any candle, e.g: before the listing of the symbol
+        missing_ranges = self.candle_store.get_missing_ranges(contract.symbol, interval, start_time, end_time,
+                                                              tf_equiv)
+
+        pages = []
+
+        for range_start, range_end in missing_ranges:
+            page_start = range_start
+            while page_start <= range_end:
+                page_end = min(page_start + (KLINES_PAGE_SIZE - 1) * tf_equiv, range_end)
+                pages.append((page_start, page_end))
+                page_start = page_end + tf_equiv
+
+        results = self._get_klines_pages(contract, interval, pages) if len(pages) > 0 else []
+
+        if len(pages) > 0:
+            logger.info("%s %s: %s cached candles, %s pages downloaded", contract.symbol, interval, len(cached),
+                        len(pages))
+
+        all_candles = {c.timestamp: c for c in cached}  # Open time -> candle, removes the duplicates
+        downloaded = set()
+
+        # A page that still fails after the retries of _do_request() would leave a hole in the series, no candle is
+        # returned rather than a series padded with made-up candles
+
+        if any(page is None for page in results):
+            logger.error("Could not download the historical data of %s %s", contract.symbol, interval)
+            return []
+
+        for page in results:
+            for c in page:
+                if start_time <= c[0] <= end_time:
+                    all_candles[c[0]] = CandleData(c, interval, "binance")
+                    downloaded.add(c[0])
+
+        candles = []
+
+        for ts in sorted(all_candles.keys()):
+            # Fills the gaps with flat candles like parse_trades() does, so that the list stays contiguous
+            while len(candles) > 0 and ts > candles[-1].timestamp + tf_equiv:
+                last_close = candles[-1].close
+                flat_candle = CandleData({'ts': candles[-1].timestamp + tf_equiv, 'open': last_close,
+                                          'high': last_close, 'low': last_close, 'close': last_close,
+                                          'volume': 0}, interval, "parse_trade")
+                candles.append(flat_candle)  # Not in 'downloaded', a filled gap is never cached
+
+            candles.append(all_candles[ts])
+
+        # Only the closed candles sent by the exchange are cached, the current one is still changing. The downloaded
+        # ranges are covered up to the last closed candle, with the gaps in between.
+
+        last_closed = now - now % tf_equiv - tf_equiv
+        covered = [(range_start, min(range_end, last_closed) + tf_equiv) for range_start, range_end in missing_ranges
+                   if range_start <= last_closed]
+
+        self.candle_store.save(contract.symbol, interval, [c for c in candles if c.timestamp in downloaded
+                                                           and c.timestamp + tf_equiv <= now], covered)
+
+        return candles
+
+    def _on_message(self, ws, msg: str):
+
+        # Only the event types with a handler are parsed, the others are dropped from the raw message
+        decoded = self._decoder.decode(msg, self._handlers)
+
+        if decoded is not None:
+            event, data = decoded
+            try:
+                self._handlers[event](data)
+            except Exception as e:  # A faulty strategy must not stop the websocket loop
+                logger.error("Error while processing a %s message: %s", event, e)
+
+    def _on_agg_trade(self, data: typing.Dict):
+
+        if self.trade_batcher is not None:
+            self.trade_batcher.put(data)
+            return
+
+        symbol = data['s']
+
+        route = self._registry.snapshot.routes.get(symbol)
+
+        aggregator = self.market_data.get_aggregator(symbol)
+
+        if route is not None and aggregator is not None:
+
+            # The candles of all the timeframes are updated once, then each strategy gets the event of its own
+            tick_types = aggregator.parse_trades(data['p'], data['q'], data['T'])
+
+            self._check_exits(route, data['p'], data['p'], "aggTrade")
+
+            for strat in route.strategies:
+                tick_type = tick_types.get(strat.tf)
+                if tick_type is not None and strat.candle_stream == "aggTrade":
+                    strat.on_trade(tick_type)
+
+    def _on_kline(self, data: typing.Dict):
+
+        symbol = data['s']
+        kline = data['k']
+
+        route = self._registry.snapshot.routes.get(symbol)
+
+        series = self.market_data.get_kline_series(symbol, kline['i'])
+
+        if route is not None and series is not None:
+
+            tick_type = series.parse_kline(kline)  # Updates candlesticks
+
+            if tick_type is not None:
+                self._check_exits(route, kline['c'], kline['c'], "kline")
+
+                for strat in route.strategies:
+                    if strat.tf == kline['i'] and strat.candle_stream == "kline":
+                        strat.on_trade(tick_type)
+
+    def _on_book_ticker(self, data: typing.Dict):
+
+        """
+        Called with the latest bookTicker message of a symbol.
+        :param data:
+        :return:
+        """
+
+        symbol = data['s']
+
+        if symbol not in self.prices:
+            self.prices[symbol] = {'bid': data['b'], 'ask': data['a']}
+        else:
+            self.prices[symbol]['bid'] = data['b']
+            self.prices[symbol]['ask'] = data['a']
+
+        # PNL Calculation
+
+        # Only the open trades are indexed by the route, the closed ones are never touched again
+
+        route = self._registry.snapshot.routes.get(symbol)
+
+        if route is not None and len(route.open_trades) > 0:
+            pnls = np.where(route.is_long, data['b'] - route.entry_prices, route.entry_prices - data['a']) \
+                * route.quantities
+
+            for trade, pnl in zip(route.open_trades, pnls.tolist()):
+                trade.pnl = pnl
+
+    def _on_trades(self, symbol: str, prices: np.ndarray, sizes: np.ndarray, timestamps: np.ndarray):
+
+        """
+        Called by the TradeBatcher thread with a batch of aggTrade messages of one symbol.
+        The TP/SL are checked once per group of trades, on the highest and lowest price of the group.
+        :param symbol:
+        :param prices:
+        :param sizes:
+        :param timestamps:
+        :return:
+        """
+
+        route = self._registry.snapshot.routes.get(symbol)
+
+        aggregator = self.market_data.get_aggregator(symbol)
+
+        if route is None or aggregator is None:
+            return
+
+        for tick_types, high, low in aggregator.parse_trade_batch(prices, sizes, timestamps):
+
+            self._check_exits(route, high, low, "aggTrade")
+
+            for strat in route.strategies:
+                tick_type = tick_types.get(strat.tf)
+                if tick_type is not None and strat.candle_stream == "aggTrade":
+                    strat.on_trade(tick_type)
+
+    @staticmethod
+    def _check_exits(route: SymbolRoute, high: float, low: float, candle_stream: str):
+
+        """
+        Notify the strategies whose open trades reached their take profit or stop loss price.
+        Only the triggered exits are visited, found by binary search in the TriggerIndex of the symbol.
+        :param route:
+        :param high: Highest price since the last check
+        :param low: Lowest price since the last check
+        :param candle_stream: The stream of the prices, only the strategies fed by this stream are checked
+        :return:
+        """
+
+        for trade, strategy, is_stop_loss, price in route.triggers.triggered(high, low):
+            if strategy.candle_stream == candle_stream:
+                strategy.on_exit_triggered(trade, is_stop_loss, price)
+
+    def on_order_update(self, order_status: OrderStatusData):
+
+        """
+        Called by the user data stream on each ORDER_TRADE_UPDATE event, forwards it to the strategies of the symbol.
+        :param order_status:
+        :return:
+        """
+
+        route = self._registry.snapshot.routes.get(order_status.symbol)
+
+        if route is not None:
+            for strat in route.strategies:
+                strat.on_order_update(order_status)
+
+    def reconcile_orders(self):
+
+        """
+        Called by the user data stream once (re)connected, the strategies check the orders whose events may be lost.
+        :return:
+        """
+
+        for strat in self._registry.snapshot.strategies.values():
+            strat.reconcile_orders()
+
+    def get_trade_size(self, contract: ContractData, price: float, balance_pct: float,
+                       side: typing.Optional[str] = None):
+
+        """
+        :param contract:
+        :param price: Reference price of the order, e.g: the last price
+        :param balance_pct: Percentage of the quote asset balance to use
+        :param side: buy or sell, when the local order book of the symbol is synced the size is computed with the
+        average price the order would get from the book instead of the reference price
+        :return:
+        """
+
+        logger.info("Getting Binance trade size...")
+
+        balance = None
+
+        if self.user_stream.connected:  # The cached balances are kept up to date by the ACCOUNT_UPDATE events
+            balance = self.account.balances
+            if contract.quote_asset not in balance:  # e.g: the get_balances() at startup failed
+                logger.warning("%s balance missing from the user data stream cache, requesting it",
+                               contract.quote_asset)
+                balance = None
+
+        if balance is None:
+            balance = self.get_balances()
+            if len(balance) > 0:  # Empty when the request failed, the cache is kept
+                self.account.set_balances(balance)
+
+        if contract.quote_asset in balance:
+            balance = balance[contract.quote_asset].wallet_balance
+        else:
+            logger.warning("Could not get the %s balance, no trade size for %s", contract.quote_asset,
+                           contract.symbol)
+            return None
+
+        trade_size = (balance * balance_pct / 100) / price
+
+        book = self.order_books.get(contract.symbol) if self.order_books is not None else None
+
+        if side is not None and book is not None:
+            vwap = book.vwap(side, trade_size)  # Includes the slippage of a market order of this size
+            if vwap is not None:
+                trade_size = (balance * balance_pct / 100) / vwap
+
+        trade_size = contract.lots_to_quantity(contract.quantity_to_lots(trade_size))  # Rounded down to the lot
+
+        # Checked here rather than rejected by the exchange (LOT_SIZE and MIN_NOTIONAL filters)
+        if trade_size < contract.min_quantity or trade_size * price < contract.min_notional:
+            logger.warning("%s trade size %s is below the minimum quantity or notional of the contract",
+                           contract.symbol, trade_size)
+            return None
+
+        logger.info("Binance current %s balance = %s, trade size = %s", contract.quote_asset, balance, trade_size)
+
+        return trade_size
@@ -0,0 +1,80 @@
+"""
+Microbenchmark of the market data message decoding, per JSON backend installed.
+
+    python Decoder_Benchmark.py [messages.txt]
+
+messages.txt holds one raw websocket message per line, e.g. recorded by logging the msg argument of
+BinanceClient._on_message(). Without a file, a few messages recorded on the testnet are used.
+"""
+
+import json
+import sys
+import timeit
+
+from Message_Decoder import BACKENDS, MessageDecoder
+
+
+RECORDED_MESSAGES = [
+    '{"e":"aggTrade","E":1700000000123,"a":1789234501,"s":"BTCUSDT","p":"36512.40","q":"0.015","f":3901234567,'
+    '"l":3901234569,"T":1700000000120,"m":true}',
+    '{"e":"bookTicker","u":3456789012345,"s":"BTCUSDT","b":"36512.30","B":"4.120","a":"36512.40","A":"1.305",'
+    '"T":1700000000119,"E":1700000000124}',
+    '{"e":"aggTrade","E":1700000000130,"a":98765432,"s":"XRPUSDT","p":"0.6125","q":"1520.5","f":245678901,'
+    '"l":245678903,"T":1700000000128,"m":false}',
+    '{"e":"bookTicker","u":3456789012399,"s":"XRPUSDT","b":"0.6124","B":"25012.1","a":"0.6125","A":"8410.0",'
+    '"T":1700000000131,"E":1700000000133}',
+    '{"e":"kline","E":1700000000200,"s":"BTCUSDT","k":{"t":1699999980000,"T":1700000039999,"s":"BTCUSDT",'
+    '"i":"1m","f":3901234000,"L":3901234569,"o":"36498.10","c":"36512.40","h":"36520.00","l":"36495.20",'
+    '"v":"152.304","n":569,"x":false,"q":"5560432.12","V":"80.120","Q":"2925312.45","B":"0"}}',
+    '{"e":"markPriceUpdate","E":1700000000000,"s":"BTCUSDT","p":"36510.12","P":"36508.55","i":"36509.01",'
+    '"r":"0.00010000","T":1700028800000}',
+]
+
+HANDLED = {"aggTrade", "bookTicker", "kline"}
+
+
+def legacy_decode(msg: str):
+
+    """
+    Decoding before the MessageDecoder: every message is parsed and the prices are converted by each consumer.
+    """
+
+    data = json.loads(msg)
+
+    if data['e'] == "bookTicker":
+        float(data['b'])
+        float(data['a'])
+        float(data['b'])
+        float(data['a'])
+    elif data['e'] == "aggTrade":
+        float(data['p'])
+        float(data['q'])
+
+    return data
+
+
+def run(messages, number: int):
+
+    results = [("legacy json.loads", lambda msg: legacy_decode(msg))]
+
+    for backend, loads in BACKENDS.items():
+        decoder = MessageDecoder(backend)
+        results.append((f"{backend} loads only", loads))
+        results.append((f"{backend} MessageDecoder", lambda msg, d=decoder: d.decode(msg, HANDLED)))
+
+    print(f"{len(messages)} messages x {number} runs")
+
+    for name, function in results:
+        duration = timeit.timeit(lambda: [function(msg) for msg in messages], number=number)
+        print(f"{name:<25} {duration / (number * len(messages)) * 1e9:>8.0f} ns/message")
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = RECORDED_MESSAGES
+
+    run(messages, max(1, 200000 // len(messages)))
@@ -3,24 +3,75 @@ import datetime
 
 
 class BalanceData:
-    def __init__(self, infos):
-        
-        self.initial_margin = float(infos['initialMargin'])
-        self.maintenance_margin = float(infos['maintMargin'])
-        self.margin_balance = float(infos['marginBalance'])
-        self.wallet_balance = float(infos['walletBalance'])
-        self.unrealized_pnl = float(infos['unrealizedProfit'])
+    def __init__(self, infos, source="rest"):
+
+        if source == "rest":
+            self.initial_margin = float(infos['initialMargin'])
+            self.maintenance_margin = float(infos['maintMargin'])
+            self.margin_balance = float(infos['marginBalance'])
+            self.wallet_balance = float(infos['walletBalance'])
+            self.unrealized_pnl = float(infos['unrealizedProfit'])
+
+        elif source == "user_stream":  # 'B' entries of the ACCOUNT_UPDATE event, only the wallet balance is sent
+            self.initial_margin = None
+            self.maintenance_margin = None
+            self.margin_balance = None
+            self.wallet_balance = float(infos['wb'])
+            self.unrealized_pnl = None
 
 
 class CandleData:
-    def __init__(self, candle_infos):
-        
-        self.timestamp = candle_infos[0]
-        self.open = float(candle_infos[1])
-        self.high = float(candle_infos[2])
-        self.low = float(candle_infos[3])
-        self.close = float(candle_infos[4])
-        self.volume = float(candle_infos[5])
+    def __init__(self, candle_infos, timeframe, source):
+
+        self.timeframe = timeframe
+
+        if source == "binance":  # Kline list of the REST API
+            self.timestamp = candle_infos[0]
+            self.open = float(candle_infos[1])
+            self.high = float(candle_infos[2])
+            self.low = float(candle_infos[3])
+            self.close = float(candle_infos[4])
+            self.volume = float(candle_infos[5])
+
+        elif source == "parse_trade":  # Candle built from the websocket trades
+            self.timestamp = candle_infos['ts']
+            self.open = candle_infos['open']
+            self.high = candle_infos['high']
+            self.low = candle_infos['low']
+            self.close = candle_infos['close']
+            self.volume = candle_infos['volume']
+
+
+def parse_step(step: str):
+
+    """
+    Exact representation of a step of the exchange filters, e.g: "0.10" -> (1, 1) for 1 * 10^-1
+    :param step: The step as sent by the exchange
+    :return: (step in units of 10^-decimals, decimals)
+    """
+
+    if "." in step:
+        step = step.rstrip("0").rstrip(".")
+
+    if "." in step:
+        integer, fraction = step.split(".")
+        return int(integer + fraction), len(fraction)
+
+    return int(step), 0
+
+
+def format_fixed(units: int, decimals: int) -> str:
+
+    """
+    Format an integer number of 10^-decimals units without going through a float, e.g: (12345, 2) -> "123.45"
+    """
+
+    if decimals == 0:
+        return str(units)
+
+    digits = str(abs(units)).rjust(decimals + 1, "0")
+
+    return ("-" if units < 0 else "") + digits[:-decimals] + "." + digits[-decimals:]
 
 
 class ContractData:
@@ -31,17 +82,76 @@ class ContractData:
         self.quote_asset = contract_infos['quoteAsset']
         self.price_decimals = contract_infos['pricePrecision']
         self.quantity_decimals = contract_infos['quantityPrecision']
-        self.tick_size = 1 / pow(10, contract_infos['pricePrecision'])
-        self.lot_size = 1 / pow(10, contract_infos['quantityPrecision'])
+
+        filters = {f['filterType']: f for f in contract_infos.get('filters', [])}
+
+        # Steps of the PRICE_FILTER and LOT_SIZE filters, the precisions are only used if the filters are missing.
+        # Prices and quantities are handled as integer numbers of ticks and lots in the order path.
+        if "PRICE_FILTER" in filters:
+            self._tick_units, self._tick_decimals = parse_step(filters['PRICE_FILTER']['tickSize'])
+        else:
+            self._tick_units, self._tick_decimals = 1, self.price_decimals
+
+        if "LOT_SIZE" in filters:
+            self._lot_units, self._lot_decimals = parse_step(filters['LOT_SIZE']['stepSize'])
+            self.min_quantity = float(filters['LOT_SIZE']['minQty'])
+        else:
+            self._lot_units, self._lot_decimals = 1, self.quantity_decimals
+            self.min_quantity = 0.0
+
+        self.min_notional = float(filters['MIN_NOTIONAL']['notional']) if "MIN_NOTIONAL" in filters else 0.0
+
+        self.tick_size = self._tick_units / pow(10, self._tick_decimals)
+        self.lot_size = self._lot_units / pow(10, self._lot_decimals)
+
+    def price_to_ticks(self, price: float) -> int:
+        return int(round(price / self.tick_size))
+
+    def quantity_to_lots(self, quantity: float) -> int:
+        return int(quantity / self.lot_size + 1e-9)  # Rounded down, the epsilon absorbs the float division error
+
+    def ticks_to_price(self, ticks: int) -> float:
+        return ticks * self._tick_units / pow(10, self._tick_decimals)
+
+    def lots_to_quantity(self, lots: int) -> float:
+        return lots * self._lot_units / pow(10, self._lot_decimals)
+
+    def format_price(self, ticks: int) -> str:
+        return format_fixed(ticks * self._tick_units, self._tick_decimals)
+
+    def format_quantity(self, lots: int) -> str:
+        return format_fixed(lots * self._lot_units, self._lot_decimals)
 
 
 class OrderStatusData:
-    def __init__(self, order_infos):
-        
-        self.order_id = order_infos['orderId']
-        self.status = order_infos['status'].lower()
-        self.avg_price = float(order_infos['avgPrice'])
-        self.executed_qty = float(order_infos['executedQty'])
+    def __init__(self, order_infos, source="rest"):
+
+        if source == "rest":
+            self.symbol = order_infos['symbol']
+            self.order_id = order_infos['orderId']
+            self.status = order_infos['status'].lower()
+            self.avg_price = float(order_infos['avgPrice'])
+            self.executed_qty = float(order_infos['executedQty'])
+
+        elif source == "user_stream":  # 'o' object of the ORDER_TRADE_UPDATE event
+            self.symbol = order_infos['s']
+            self.order_id = order_infos['i']
+            self.status = order_infos['X'].lower()
+            self.avg_price = float(order_infos['ap'])
+            self.executed_qty = float(order_infos['z'])
+
+
+class PositionData:
+    def __init__(self, position_infos):
+
+        """
+        'P' entries of the ACCOUNT_UPDATE event of the user data stream.
+        """
+
+        self.symbol = position_infos['s']
+        self.quantity = float(position_infos['pa'])  # Negative for short positions
+        self.entry_price = float(position_infos['ep'])
+        self.unrealized_pnl = float(position_infos['up'])
 
 
 class TradeData:
@@ -57,6 +167,15 @@ class TradeData:
         self.quantity = trade_infos['quantity']
         self.entry_id = trade_infos['entry_id']
 
+        # Exit prices computed once the entry price is known, None if there is no take profit / stop loss
+        self.take_profit_price: float = trade_infos.get('take_profit_price')
+        self.stop_loss_price: float = trade_infos.get('stop_loss_price')
+
+        # Reduce-only STOP_MARKET / TAKE_PROFIT_MARKET orders placed on the exchange right after the entry fill
+        self.exchange_exits: bool = trade_infos.get('exchange_exits', False)
+        self.sl_order_id = None
+        self.tp_order_id = None
+
 
 
 
@@ -71,8 +71,7 @@ class Root(tk.Tk):
 
         result = askquestion("Confirmation", "Do you really want to exit the application?")
         if result == "yes":
-            self.binance.reconnected = False  # Avoids the infinite reconnect loop in _start_ws()
-            self.binance.ws.close()
+            self.binance.close()
             
             self.destroy()  # Destroys the UI and terminates the program as no other thread is running
 
@@ -93,31 +92,28 @@ class Root(tk.Tk):
                 log['displayed'] = True
 
         # Trades and Logs
-            
-        try:  # try...except statement to handle the case when a dictionary is updated during the following loops
-        
-            for b_index, strat in self.binance.strategies.items():
-                for log in strat.logs:
-                    if not log['displayed']:
-                        self.logging_frame.add_log(log['log'])
-                        log['displayed'] = True
-        
-                # Update the Trades component (add a new trade, change status/PNL)
-        
-                for trade in strat.trades:
-                    if trade.time not in self._trades_frame.body_widgets['symbol']:
-                        self._trades_frame.add_trade(trade)
-        
-                    
-                    precision = trade.contract.price_decimals
-        
-                    pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=precision)
-                    self._trades_frame.body_widgets['pnl_var'][trade.time].set(pnl_str)
-                    self._trades_frame.body_widgets['status_var'][trade.time].set(trade.status.capitalize())
-                    self._trades_frame.body_widgets['quantity_var'][trade.time].set(trade.quantity)
 
-        except RuntimeError as e:
-            logger.error("Error while looping through strategies dictionary: %s", e)
+        # self.binance.strategies is an immutable snapshot, strategies started or stopped in the meantime
+        # will be picked up at the next call
+
+        for b_index, strat in self.binance.strategies.items():
+            for log in strat.logs:
+                if not log['displayed']:
+                    self.logging_frame.add_log(log['log'])
+                    log['displayed'] = True
+
+            # Update the Trades component (add a new trade, change status/PNL)
+
+            for trade in strat.trades:
+                if trade.time not in self._trades_frame.body_widgets['symbol']:
+                    self._trades_frame.add_trade(trade)
+
+                precision = trade.contract.price_decimals
+
+                pnl_str = "{0:.{prec}f}".format(trade.pnl, prec=precision)
+                self._trades_frame.body_widgets['pnl_var'][trade.time].set(pnl_str)
+                self._trades_frame.body_widgets['status_var'][trade.time].set(trade.status.capitalize())
+                self._trades_frame.body_widgets['quantity_var'][trade.time].set(trade.quantity)
 
         # Watchlist prices
 
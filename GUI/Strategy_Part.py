@@ -84,9 +84,15 @@ class StrategyManager(tk.Frame):
                 {"code_name": "ema_fast", "name": "MACD Fast Length", "widget": tk.Entry, "data_type": int},
                 {"code_name": "ema_slow", "name": "MACD Slow Length", "widget": tk.Entry, "data_type": int},
                 {"code_name": "ema_signal", "name": "MACD Signal Length", "widget": tk.Entry, "data_type": int},
+                {"code_name": "tick_tp_sl", "name": "Tick TP/SL (off = kline stream)", "widget": tk.Checkbutton,
+                 "data_type": bool, "default": True, "optional": True},
+                {"code_name": "exchange_exits", "name": "Exchange TP/SL orders", "widget": tk.Checkbutton,
+                 "data_type": bool, "default": False, "optional": True},
             ],
             "Breakout": [
                 {"code_name": "min_volume", "name": "Minimum Volume", "widget": tk.Entry, "data_type": float},
+                {"code_name": "exchange_exits", "name": "Exchange TP/SL orders", "widget": tk.Checkbutton,
+                 "data_type": bool, "default": False, "optional": True},
             ]
         }
 
@@ -220,6 +226,19 @@ class StrategyManager(tk.Frame):
 
                 if self.additional_parameters[b_index][code_name] is not None:
                     self._extra_input[code_name].insert(tk.END, str(self.additional_parameters[b_index][code_name]))
+
+            elif param['widget'] == tk.Checkbutton:
+                self._extra_input[code_name + "_var"] = tk.BooleanVar()
+                self._extra_input[code_name] = tk.Checkbutton(self._popup_window, bg=BACKGROUND, fg=FOREGROUND,
+                                                              activebackground=BACKGROUND, selectcolor=BACKGROUND_2,
+                                                              highlightthickness=False,
+                                                              variable=self._extra_input[code_name + "_var"])
+
+                # The workspaces saved before the checkboxes store 0 / 1
+                if self.additional_parameters[b_index][code_name] is not None:
+                    self._extra_input[code_name + "_var"].set(bool(self.additional_parameters[b_index][code_name]))
+                else:
+                    self._extra_input[code_name + "_var"].set(param['default'])
             else:
                 continue
 
@@ -246,7 +265,9 @@ class StrategyManager(tk.Frame):
         for param in self.extra_params[strat_selected]:
             code_name = param['code_name']
 
-            if self._extra_input[code_name].get() == "":
+            if param['widget'] == tk.Checkbutton:
+                self.additional_parameters[b_index][code_name] = self._extra_input[code_name + "_var"].get()
+            elif self._extra_input[code_name].get() == "":
                 self.additional_parameters[b_index][code_name] = None
             else:
                 self.additional_parameters[b_index][code_name] = param['data_type'](self._extra_input[code_name].get())
@@ -270,7 +291,7 @@ class StrategyManager(tk.Frame):
         strat_selected = self.body_widgets['strategy_type_var'][b_index].get()
 
         for param in self.extra_params[strat_selected]:
-            if self.additional_parameters[b_index][param['code_name']] is None:
+            if self.additional_parameters[b_index][param['code_name']] is None and not param.get("optional", False):
                 self.root.logging_frame.add_log(f"Missing {param['code_name']} parameter")
                 return
 
@@ -286,27 +307,33 @@ class StrategyManager(tk.Frame):
         if self.body_widgets['activation'][b_index].cget("text") == "OFF":
 
             if strat_selected == "Technical":
-                new_strategy = TechnicalStrategy(self.client, contract, timeframe, balance_pct,
+                new_strategy = TechnicalStrategy(self.binance, contract, timeframe, balance_pct,
                                                  take_profit, stop_loss, self.additional_parameters[b_index])
             elif strat_selected == "Breakout":
-                new_strategy = BreakoutStrategy(self.client, contract, timeframe, balance_pct,
+                new_strategy = BreakoutStrategy(self.binance, contract, timeframe, balance_pct,
                                                 take_profit, stop_loss, self.additional_parameters[b_index])
             else:
                 return
 
-            # Collects historical data. It is just one API call so that is ok, but be careful not to call methods
+            # Collects historical data, unless another strategy already runs on this symbol and timeframe.
+            # It is at most a few API calls so that is ok, but be careful not to call methods
             # that would lock the UI for too long.
             # For example don't make a query to a database containing billions of rows, your interface would freeze.
-            new_strategy.candles = self.binance.get_historical_candles(contract, timeframe)
+            series = self.binance.market_data.acquire(contract, timeframe, new_strategy.candle_stream)
 
-            if len(new_strategy.candles) == 0:
+            if len(series.candles) == 0:
+                self.binance.market_data.release(series)
                 self.root.logging_frame.add_log(f"No historical data retrieved for {contract.symbol}")
                 return
 
-            self.binance.subscribe_channel([contract], "aggTrade")
+            new_strategy.attach(series)
+
+            self.binance.subscribe_channel([contract], new_strategy.stream_channel)
             self.binance.subscribe_channel([contract], "bookTicker")
+            if self.binance.order_books is not None:  # Lets the trade size take the order book depth into account
+                self.binance.order_books.subscribe(contract)
 
-            self.binance.strategies[b_index] = new_strategy
+            self.binance.add_strategy(b_index, new_strategy)
 
             for param in self._base_params:
                 code_name = param['code_name']
@@ -318,7 +345,7 @@ class StrategyManager(tk.Frame):
             self.root.logging_frame.add_log(f"{strat_selected} strategy on {symbol} / {timeframe} started")
 
         else:
-            del self.binance.strategies[b_index]
+            self.binance.remove_strategy(b_index)
 
             for param in self._base_params:
                 code_name = param['code_name']
@@ -0,0 +1,101 @@
+import math
+import typing
+
+
+class EMA:
+    def __init__(self, span: typing.Optional[float] = None, com: typing.Optional[float] = None, min_periods: int = 0):
+
+        """
+        Exponential Moving Average updated in constant time for each new value.
+        Matches pandas .ewm(span=..., adjust=True).mean() (or com=...): the weighted sums of the values and of the
+        weights are kept instead of recomputing them over the whole history.
+        :param span: alpha = 2 / (span + 1)
+        :param com: Center of mass, alpha = 1 / (1 + com)
+        :param min_periods: Number of values needed before the average is defined (NaN before)
+        """
+
+        if span is not None:
+            alpha = 2 / (span + 1)
+        else:
+            alpha = 1 / (1 + com)
+
+        self._decay = 1 - alpha
+        self._min_periods = min_periods
+
+        self._weighted_sum = 0.0
+        self._weights = 0.0
+        self.count = 0
+        self.value = math.nan
+
+    def update(self, x: float) -> float:
+
+        self._weighted_sum = x + self._decay * self._weighted_sum
+        self._weights = 1 + self._decay * self._weights
+        self.count += 1
+
+        if self.count >= self._min_periods:
+            self.value = self._weighted_sum / self._weights
+
+        return self.value
+
+
+class MACD:
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+
+        """
+        MACD line (fast EMA - slow EMA of the closes) and its signal line (EMA of the MACD line).
+        :param ema_fast:
+        :param ema_slow:
+        :param ema_signal:
+        """
+
+        self._fast = EMA(span=ema_fast)
+        self._slow = EMA(span=ema_slow)
+        self._signal = EMA(span=ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> typing.Tuple[float, float]:
+
+        self.macd_line = self._fast.update(close) - self._slow.update(close)
+        self.macd_signal = self._signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+
+class RSI:
+    def __init__(self, length: int):
+
+        """
+        Relative Strength Index with Wilder smoothing (EWM with com = length - 1), rounded to 2 decimals.
+        :param length: Number of periods
+        """
+
+        self._avg_gain = EMA(com=length - 1, min_periods=length)
+        self._avg_loss = EMA(com=length - 1, min_periods=length)
+        self._last_close = None
+
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+
+        if self._last_close is None:  # The first close has no previous value to compute a difference
+            self._last_close = close
+            return self.value
+
+        delta = close - self._last_close
+        self._last_close = close
+
+        avg_gain = self._avg_gain.update(delta if delta > 0 else 0.0)
+        avg_loss = self._avg_loss.update(-delta if delta < 0 else 0.0)
+
+        if math.isnan(avg_gain) or (avg_gain == 0 and avg_loss == 0):
+            self.value = math.nan
+        elif avg_loss == 0:
+            self.value = 100.0
+        else:
+            rs = avg_gain / avg_loss  # Relative Strength
+            self.value = round((100 - 100 / (1 + rs)) * 100) / 100  # Same rounding as pandas .round(2)
+
+        return self.value
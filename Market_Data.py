@@ -0,0 +1,465 @@
+import logging
+import threading
+import time
+import typing
+
+import numpy as np
+
+from Exchange_Data import *
+from Candle_Series import CandleSeries
+from Strategies import TIMEFRAME_EQUIVALENT
+
+if typing.TYPE_CHECKING:
+    from Binance_Client import BinanceClient
+
+
+logger = logging.getLogger()
+
+
+class SharedSeries:
+    def __init__(self, contract: ContractData, timeframe: str, stream: str = "aggTrade"):
+
+        """
+        Candles of one (symbol, timeframe) and the indicators computed on them, shared by all the strategies running
+        on that symbol and timeframe. The candles are updated once per trade and each indicator once per candle close,
+        whatever the number of strategies.
+        :param contract:
+        :param timeframe: 1m, 5m...
+        :param stream: aggTrade (candles built from the trades) or kline (candles sent by the exchange)
+        """
+
+        self.contract = contract
+        self.tf = timeframe
+        self.stream = stream
+        self.tf_equiv = TIMEFRAME_EQUIVALENT[timeframe] * 1000
+
+        self.candles = CandleSeries(timeframe)
+        self.ref_count = 0
+
+        # Indicator key (e.g: ("rsi", 14)) -> [indicator, reference count]. Copy-on-write, iterated by the websocket
+        # thread on each candle close while the strategies are started and stopped from the Tkinter thread.
+        self._indicators: typing.Dict[typing.Tuple, typing.List] = dict()
+        self._lock = threading.Lock()  # Makes sure no close is missed or fed twice while an indicator is added
+        self._closes_fed = 0
+
+    def acquire_indicator(self, key: typing.Tuple, factory: typing.Callable):
+
+        """
+        Get the indicator with these parameters, created and seeded with the closed candles if no strategy uses it yet.
+        :param key: Indicator name and parameters, e.g: ("macd", 12, 26, 9)
+        :param factory: Creates the indicator, e.g: lambda: MACD(12, 26, 9)
+        :return: The shared indicator instance, it must not be updated by the caller
+        """
+
+        with self._lock:
+            indicators = dict(self._indicators)
+
+            if key not in indicators:
+                indicator = factory()
+
+                # Seeded with the candles already fed to the other indicators, by absolute index: a candle closed by
+                # the websocket thread but not fed yet is left to _update_indicators()
+                first = self.candles.count - len(self.candles)  # Absolute index of the oldest candle kept
+                seed = self._closes_fed - first
+                if seed > 0:
+                    for close in self.candles.closes(len(self.candles))[:seed]:
+                        indicator.update(float(close))
+
+                indicators[key] = [indicator, 0]
+
+            indicators[key][1] += 1
+            self._indicators = indicators
+
+            return indicators[key][0]
+
+    def release_indicator(self, key: typing.Tuple):
+
+        with self._lock:
+            indicators = dict(self._indicators)
+
+            if key in indicators:
+                indicators[key][1] -= 1
+                if indicators[key][1] <= 0:
+                    del indicators[key]
+
+            self._indicators = indicators
+
+    def _update_indicators(self):
+
+        """
+        Feed the indicators with the candles closed since the last call.
+        """
+
+        with self._lock:
+            closed_count = self.candles.count - 1  # The last candle is still open
+            new_closes = min(closed_count - self._closes_fed, len(self.candles) - 1)
+
+            if new_closes > 0:
+                for close in self.candles.closes(new_closes + 1)[:-1]:
+                    close = float(close)
+                    for indicator, ref_count in self._indicators.values():
+                        indicator.update(close)
+
+            self._closes_fed = closed_count
+
+    def load_history(self, candles: typing.List[CandleData]):
+        self.candles.extend(candles)
+        self._closes_fed = self.candles.count - 1
+
+    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+
+        """
+        Update the Candle list with a new trade based on its timestamp.
+        :param price: The trade price
+        :param size: The trade size
+        :param timestamp: Unix timestamp in milliseconds
+        :return: same_candle or new_candle
+        """
+
+        last_candle = self.candles[-1]
+
+        # Same Candle
+
+        if timestamp < last_candle.timestamp + self.tf_equiv:
+
+            self.candles.update_last(price, size)
+
+            return "same_candle"
+
+        # Missing Candle(s)
+
+        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
+
+            missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
+
+            logger.info("Missing %s candles for %s %s (%s %s)", missing_candles, self.contract.symbol,
+                        self.tf, timestamp, last_candle.timestamp)
+
+            last_ts = last_candle.timestamp
+            last_close = last_candle.close
+
+            for missing in range(missing_candles):
+                last_ts += self.tf_equiv
+                self.candles.append_values(last_ts, last_close, last_close, last_close, last_close, 0)
+
+            self.candles.append_values(last_ts + self.tf_equiv, price, price, price, price, size)
+
+            self._update_indicators()
+
+            return "new_candle"
+
+        # New Candle
+
+        else:
+            self.candles.append_values(last_candle.timestamp + self.tf_equiv, price, price, price, price, size)
+
+            logger.info("New candle for %s %s", self.contract.symbol, self.tf)
+
+            self._update_indicators()
+
+            return "new_candle"
+
+
+    def parse_kline(self, kline: typing.Dict) -> typing.Optional[str]:
+
+        """
+        Update the Candle list with a message of the kline stream, which carries the whole current candle.
+        :param kline: The 'k' object of the message (prices converted to float by the MessageDecoder), t is the candle
+        open time and x is True once it is closed
+        :return: same_candle, new_candle or None for an update of a candle older than the current one
+        """
+
+        last_candle = self.candles[-1]
+        timestamp = kline['t']
+
+        if timestamp == last_candle.timestamp:
+            self.candles.set_last(kline['h'], kline['l'], kline['c'], kline['v'])
+            return "same_candle"
+
+        elif timestamp < last_candle.timestamp:
+            return None
+
+        # The first update of a new candle may not be the first trade of the candle: the kline values are used
+        # instead of the trade ones
+
+        missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
+
+        if missing_candles > 0:
+            logger.info("Missing %s candles for %s %s (%s %s)", missing_candles, self.contract.symbol,
+                        self.tf, timestamp, last_candle.timestamp)
+
+            last_ts = last_candle.timestamp
+            last_close = last_candle.close
+
+            for missing in range(missing_candles):
+                last_ts += self.tf_equiv
+                self.candles.append_values(last_ts, last_close, last_close, last_close, last_close, 0)
+
+        self.candles.append_values(timestamp, kline['o'], kline['h'], kline['l'], kline['c'], kline['v'])
+
+        logger.info("New candle for %s %s", self.contract.symbol, self.tf)
+
+        self._update_indicators()
+
+        return "new_candle"
+
+
+class SymbolAggregator:
+    def __init__(self, contract: ContractData):
+
+        """
+        Builds the candles of every timeframe used on a symbol from its trades, once per trade whatever the number
+        of strategies. Only the smallest timeframe compares the trade timestamp to its candle boundaries, the bigger
+        timeframes are rolled up from it: their boundaries are also boundaries of the smallest timeframe, so they can
+        only open a new candle when the smallest one does, otherwise the trade just updates their current candle.
+        :param contract:
+        """
+
+        self.contract = contract
+
+        # Copy-on-write tuple sorted from the smallest timeframe, read by the websocket thread on each trade
+        self._series: typing.Tuple[SharedSeries, ...] = tuple()
+        self._lock = threading.Lock()  # Held while the trades are applied, so a series is caught up with all of them
+
+    def add_series(self, series: SharedSeries):
+
+        """
+        :param series: With its historical candles. The trades applied to the smallest timeframe since the history of
+        the series was downloaded are rolled into it before it is published, so the roll-up assumption holds.
+        """
+
+        with self._lock:
+            if len(self._series) > 0 and series.tf_equiv > self._series[0].tf_equiv:
+                self._catch_up(series, self._series[0])
+
+            self._series = tuple(sorted(self._series + (series,), key=lambda x: x.tf_equiv))
+
+    @staticmethod
+    def _catch_up(series: SharedSeries, base: SharedSeries):
+
+        """
+        Roll up into the series the candles of the base series that belong to its current candle or start after it.
+        The current candle is rebuilt from the base candles when they cover all of it, otherwise only its extremes and
+        its close are updated: the volume traded since the download can't be told apart.
+        """
+
+        timestamps = base.candles.timestamps()
+        current_ts = series.candles[-1].timestamp
+        first = int(np.searchsorted(timestamps, current_ts))
+        start = int(np.searchsorted(timestamps, current_ts + series.tf_equiv))
+
+        if start > first:
+            n = len(timestamps) - first
+            highs = base.candles.highs(n)[:start - first]
+            lows = base.candles.lows(n)[:start - first]
+            close = float(base.candles.closes(n)[start - first - 1])
+
+            if timestamps[first] == current_ts:
+                volume = float(base.candles.volumes(n)[:start - first].sum())
+                series.candles.set_last(float(highs.max()), float(lows.min()), close, volume)
+            else:
+                series.candles.update_last_batch(float(highs.max()), float(lows.min()), close, 0)
+
+        n = len(timestamps) - start
+
+        if n <= 0:
+            return
+
+        for timestamp, open_price, high, low, close, volume in zip(
+                timestamps[start:].tolist(), base.candles.opens(n).tolist(), base.candles.highs(n).tolist(),
+                base.candles.lows(n).tolist(), base.candles.closes(n).tolist(), base.candles.volumes(n).tolist()):
+            series.parse_trades(open_price, 0, timestamp)  # Opens the candle of the series containing this one
+            series.candles.update_last_batch(high, low, close, volume)
+
+    def remove_series(self, series: SharedSeries):
+        self._series = tuple(s for s in self._series if s is not series)
+
+    @property
+    def empty(self) -> bool:
+        return len(self._series) == 0
+
+    def parse_trades(self, price: float, size: float, timestamp: int) -> typing.Dict[str, str]:
+
+        """
+        Parse a new trade coming in from the websocket and update the candles of all the timeframes.
+        :param price: The trade price
+        :param size: The trade size
+        :param timestamp: Unix timestamp in milliseconds
+        :return: Timeframe -> same_candle or new_candle
+        """
+
+        self._check_lag(timestamp)
+
+        with self._lock:
+            return self._parse_trade(price, size, timestamp)
+
+    def _check_lag(self, timestamp: int):
+
+        timestamp_difference = int(time.time() * 1000) - timestamp
+        if timestamp_difference >= 2000:
+            logger.warning("%s: %s milliseconds of difference between the current time and the trade time",
+                           self.contract.symbol, timestamp_difference)
+
+    def _parse_trade(self, price: float, size: float, timestamp: int) -> typing.Dict[str, str]:
+
+        series_list = self._series
+
+        if len(series_list) == 0:
+            return dict()
+
+        base_tick = series_list[0].parse_trades(price, size, timestamp)
+        tick_types = {series_list[0].tf: base_tick}
+
+        for series in series_list[1:]:
+            if base_tick == "same_candle":
+                series.candles.update_last(price, size)
+                tick_types[series.tf] = "same_candle"
+            else:
+                tick_types[series.tf] = series.parse_trades(price, size, timestamp)
+
+        return tick_types
+
+    def parse_trade_batch(self, prices: np.ndarray, sizes: np.ndarray, timestamps: np.ndarray) \
+            -> typing.List[typing.Tuple[typing.Dict[str, str], float, float]]:
+
+        """
+        Update the candles of all the timeframes with a batch of trades, in the order of their timestamps.
+        The trades belonging to the current candle of the smallest timeframe are applied at once (highest and lowest
+        price, total size, last price), a trade opening a new candle is parsed on its own.
+        :param prices:
+        :param sizes:
+        :param timestamps: Unix timestamps in milliseconds, sorted
+        :return: One event per group of trades: (timeframe -> same_candle or new_candle, highest price, lowest price)
+        """
+
+        self._check_lag(int(timestamps[-1]))
+
+        with self._lock:
+            return self._parse_batch(prices, sizes, timestamps)
+
+    def _parse_batch(self, prices: np.ndarray, sizes: np.ndarray, timestamps: np.ndarray) \
+            -> typing.List[typing.Tuple[typing.Dict[str, str], float, float]]:
+
+        series_list = self._series
+
+        if len(series_list) == 0:
+            return []
+
+        base = series_list[0]
+        same_candle = {series.tf: "same_candle" for series in series_list}
+
+        events = []
+        start = 0
+
+        while start < len(prices):
+
+            # First trade of the batch after the end of the current candle
+            next_candle_ts = base.candles[-1].timestamp + base.tf_equiv
+            end = start + int(np.searchsorted(timestamps[start:], next_candle_ts))
+
+            if end > start:
+                high = float(prices[start:end].max())
+                low = float(prices[start:end].min())
+                close = float(prices[end - 1])
+                volume = float(sizes[start:end].sum())
+
+                for series in series_list:
+                    series.candles.update_last_batch(high, low, close, volume)
+
+                events.append((same_candle, high, low))
+
+            if end >= len(prices):
+                break
+
+            price = float(prices[end])
+            events.append((self._parse_trade(price, float(sizes[end]), int(timestamps[end])), price, price))
+
+            start = end + 1
+
+        return events
+
+
+class MarketData:
+    def __init__(self, client: "BinanceClient"):
+
+        """
+        Registry of the SharedSeries, one per (symbol, timeframe) used by at least one strategy, grouped by symbol
+        in a SymbolAggregator.
+        A series is created with its historical candles by the first strategy that needs it and removed when the last
+        one is stopped.
+        :param client: Used to download the historical candles
+        """
+
+        self._client = client
+        self._series: typing.Dict[typing.Tuple[str, str], SharedSeries] = dict()
+        # Copy-on-write, read by the websocket thread
+        self._aggregators: typing.Dict[str, SymbolAggregator] = dict()
+        self._kline_series: typing.Dict[typing.Tuple[str, str], SharedSeries] = dict()
+        self._lock = threading.Lock()
+
+    def get_aggregator(self, symbol: str) -> typing.Optional[SymbolAggregator]:
+        return self._aggregators.get(symbol)
+
+    def get_kline_series(self, symbol: str, timeframe: str) -> typing.Optional[SharedSeries]:
+        return self._kline_series.get((symbol, timeframe))
+
+    def acquire(self, contract: ContractData, timeframe: str, stream: str = "aggTrade") -> SharedSeries:
+
+        """
+        :param contract:
+        :param timeframe:
+        :param stream: aggTrade or kline, the strategies using the kline stream have their own series
+        :return: The shared series, with no candle if the historical data could not be downloaded
+        """
+
+        key = (contract.symbol, timeframe, stream)
+
+        with self._lock:
+            series = self._series.get(key)
+
+            if series is None:
+                series = SharedSeries(contract, timeframe, stream)
+                series.load_history(self._client.get_historical_candles(contract, timeframe))
+                self._series[key] = series
+
+                # Candles can't be updated without a previous candle, a series without history is never fed
+
+                if len(series.candles) > 0 and stream == "kline":
+                    kline_series = dict(self._kline_series)
+                    kline_series[(contract.symbol, timeframe)] = series
+                    self._kline_series = kline_series
+
+                elif len(series.candles) > 0:
+                    aggregators = dict(self._aggregators)
+                    if contract.symbol not in aggregators:
+                        aggregators[contract.symbol] = SymbolAggregator(contract)
+                    aggregators[contract.symbol].add_series(series)
+                    self._aggregators = aggregators
+
+            series.ref_count += 1
+
+            return series
+
+    def release(self, series: SharedSeries):
+
+        with self._lock:
+            series.ref_count -= 1
+
+            if series.ref_count <= 0:
+                self._series.pop((series.contract.symbol, series.tf, series.stream), None)
+
+                if series.stream == "kline":
+                    kline_series = dict(self._kline_series)
+                    kline_series.pop((series.contract.symbol, series.tf), None)
+                    self._kline_series = kline_series
+                    return
+
+                aggregator = self._aggregators.get(series.contract.symbol)
+
+                if aggregator is not None:
+                    aggregator.remove_series(series)
+
+                    if aggregator.empty:
+                        aggregators = dict(self._aggregators)
+                        del aggregators[series.contract.symbol]
+                        self._aggregators = aggregators
@@ -0,0 +1,105 @@
+import json
+import logging
+import typing
+
+
+logger = logging.getLogger()
+
+# Available JSON backends, from the fastest one. orjson and ujson are optional, the standard library is the fallback.
+BACKENDS: typing.Dict[str, typing.Callable] = dict()
+
+try:
+    import orjson
+    BACKENDS["orjson"] = orjson.loads
+except ImportError:
+    pass
+
+try:
+    import ujson
+    BACKENDS["ujson"] = ujson.loads
+except ImportError:
+    pass
+
+BACKENDS["json"] = json.loads
+
+# Fields sent as strings by Binance that are converted to float once, when the message is decoded
+FLOAT_FIELDS = {
+    "aggTrade": ("p", "q"),
+    "bookTicker": ("b", "B", "a", "A"),
+    "kline": ("o", "h", "l", "c", "v"),  # Fields of the nested 'k' object
+}
+
+_EVENT_PREFIX = '{"e":"'
+_EVENT_START = len(_EVENT_PREFIX)
+
+
+class MessageDecoder:
+    def __init__(self, backend: typing.Optional[str] = None):
+
+        """
+        Decodes the market data messages: the event type is read from the raw message first, so the messages that
+        nobody handles are never parsed, then the message is parsed with the fastest JSON backend installed and its
+        prices and quantities are converted to float once for all the consumers.
+        :param backend: orjson, ujson or json, the fastest one available if None
+        """
+
+        if backend is None:
+            backend = next(iter(BACKENDS))
+        elif backend not in BACKENDS:
+            logger.warning("JSON backend %s not installed, using the standard library", backend)
+            backend = "json"
+
+        self.backend = backend
+        self.loads = BACKENDS[backend]
+
+    @staticmethod
+    def event_type(msg: typing.Union[str, bytes]) -> typing.Optional[str]:
+
+        """
+        Binance market data messages start with their event type, e.g: {"e":"aggTrade","E":1700000000000,...
+        :param msg: The raw message
+        :return: The event type, None if the message doesn't start with it (e.g: a subscription response)
+        """
+
+        if msg.__class__ is bytes:
+            msg = msg[:40].decode()
+
+        if msg.startswith(_EVENT_PREFIX):
+            end = msg.find('"', _EVENT_START)
+            if end != -1:
+                return msg[_EVENT_START:end]
+
+        return None
+
+    def decode(self, msg: typing.Union[str, bytes], wanted: typing.Container[str]) \
+            -> typing.Optional[typing.Tuple[str, typing.Dict]]:
+
+        """
+        :param msg: The raw message
+        :param wanted: The event types handled by the caller
+        :return: (event type, message with its prices converted to float), None if the event type is not wanted
+        """
+
+        event = self.event_type(msg)
+        data = None
+
+        if event is None:  # Not in the usual format, only the full parsing can tell
+            data = self.loads(msg)
+            event = data.get('e') if isinstance(data, dict) else None
+
+        if event not in wanted:
+            return None
+
+        if data is None:
+            data = self.loads(msg)
+
+        fields = FLOAT_FIELDS.get(event)
+
+        if fields is not None:
+            values = data['k'] if event == "kline" else data
+            for field in fields:
+                value = values.get(field)
+                if value is not None:
+                    values[field] = float(value)
+
+        return event, data
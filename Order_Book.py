@@ -0,0 +1,286 @@
+import logging
+import threading
+import typing
+
+import numpy as np
+
+from Exchange_Data import *
+
+if typing.TYPE_CHECKING:
+    from Binance_Client import BinanceClient
+
+
+logger = logging.getLogger()
+
+SNAPSHOT_DEPTH = 1000  # Number of levels of the REST snapshot on each side
+
+
+class OrderBook:
+    def __init__(self, contract: ContractData, width: int = 20000):
+
+        """
+        Local order book of a symbol, built from a REST snapshot and kept up to date by the diff-depth stream.
+        The quantities are stored in two fixed NumPy ladders indexed by price tick around a reference price, so an
+        update is an array write at a computed index and nothing is allocated after the snapshot.
+        The levels further than width / 2 ticks from the reference price are ignored, the book is re-synced around
+        the current price when the best bid or ask gets close to the edge of the ladders.
+        :param contract:
+        :param width: Number of ticks of the ladders
+        """
+
+        self.contract = contract
+        self.tick_size = contract.tick_size
+        self.width = width
+
+        self.bids = np.zeros(width, dtype=np.float64)  # Quantity at each tick, index 0 is the lowest price
+        self.asks = np.zeros(width, dtype=np.float64)
+
+        self._base_tick = 0  # Price in ticks of index 0
+        self._best_bid = -1  # Indexes of the best levels, -1 / width when the side is empty
+        self._best_ask = width
+
+        self.synced = False
+        self.last_update_id = None
+        self._buffer = []  # Diff events received while the snapshot is being downloaded
+        self._lock = threading.Lock()
+
+    # Synchronization
+
+    def reset(self):
+
+        """
+        Forget the book content, the diff events are buffered until the next snapshot.
+        """
+
+        with self._lock:
+            self.synced = False
+            self.last_update_id = None
+            self._buffer = []
+
+    def load_snapshot(self, snapshot: typing.Dict) -> bool:
+
+        """
+        Initialize the book from the /fapi/v1/depth response, then apply the buffered diff events that follow it.
+        :param snapshot: {"lastUpdateId": ..., "bids": [["price", "qty"], ...], "asks": [...]}
+        :return: False if the buffered events don't follow the snapshot, a new one is needed
+        """
+
+        with self._lock:
+            self.bids.fill(0)
+            self.asks.fill(0)
+
+            if len(snapshot['bids']) > 0 and len(snapshot['asks']) > 0:
+                mid = (float(snapshot['bids'][0][0]) + float(snapshot['asks'][0][0])) / 2
+                self._base_tick = int(round(mid / self.tick_size)) - self.width // 2
+
+            self._best_bid = -1
+            self._best_ask = self.width
+
+            self._apply_levels(snapshot['bids'], self.bids, True)
+            self._apply_levels(snapshot['asks'], self.asks, False)
+
+            self.last_update_id = snapshot['lastUpdateId']
+            self.synced = True
+
+            buffer = self._buffer
+            self._buffer = []
+
+            for data in buffer:
+                if not self._apply_diff(data):
+                    break
+
+            return self.synced
+
+    def on_diff(self, data: typing.Dict) -> bool:
+
+        """
+        Apply a depthUpdate event of the <symbol>@depth stream.
+        :param data: The event, U / u are the first / last update ids of the event, pu the last one of the previous event
+        :return: False if the book lost its synchronization and needs a new snapshot
+        """
+
+        with self._lock:
+            if not self.synced:
+                self._buffer.append(data)
+                return True
+
+            return self._apply_diff(data)
+
+    def _apply_diff(self, data: typing.Dict) -> bool:
+
+        if data['u'] < self.last_update_id:  # Already included in the snapshot
+            return True
+
+        # Each event follows the previous one (pu), except the first one after the snapshot that must include it
+        if data['pu'] != self.last_update_id and not data['U'] <= self.last_update_id <= data['u']:
+            logger.warning("%s order book out of sync (update ids %s-%s after %s), downloading a new snapshot",
+                           self.contract.symbol, data['U'], data['u'], self.last_update_id)
+            self.synced = False
+            return False
+
+        self._apply_levels(data['b'], self.bids, True)
+        self._apply_levels(data['a'], self.asks, False)
+
+        self.last_update_id = data['u']
+
+        # The price moved too far from the reference price of the ladders
+        margin = self.width // 10
+        if 0 <= self._best_bid < margin or self.width - margin <= self._best_ask < self.width:
+            logger.info("%s order book re-centered", self.contract.symbol)
+            self.synced = False
+            return False
+
+        return True
+
+    def _apply_levels(self, levels: typing.List, ladder: np.ndarray, is_bid: bool):
+
+        for price, quantity in levels:
+            index = int(round(float(price) / self.tick_size)) - self._base_tick
+
+            if index < 0 or index >= self.width:
+                continue
+
+            quantity = float(quantity)
+            ladder[index] = quantity
+
+            if is_bid:
+                if quantity > 0 and index > self._best_bid:
+                    self._best_bid = index
+                elif quantity == 0 and index == self._best_bid:
+                    while self._best_bid >= 0 and ladder[self._best_bid] == 0:
+                        self._best_bid -= 1
+            else:
+                if quantity > 0 and index < self._best_ask:
+                    self._best_ask = index
+                elif quantity == 0 and index == self._best_ask:
+                    while self._best_ask < self.width and ladder[self._best_ask] == 0:
+                        self._best_ask += 1
+
+    # Queries
+
+    def _price(self, index: int) -> float:
+        return round((self._base_tick + index) * self.tick_size, 8)
+
+    @property
+    def best_bid(self) -> typing.Optional[float]:
+        return self._price(self._best_bid) if self.synced and self._best_bid >= 0 else None
+
+    @property
+    def best_ask(self) -> typing.Optional[float]:
+        return self._price(self._best_ask) if self.synced and self._best_ask < self.width else None
+
+    def depth(self, side: str, ticks: int) -> float:
+
+        """
+        Quantity available within a number of ticks of the best price.
+        :param side: bid or ask
+        :param ticks: 1 for the best level only
+        :return:
+        """
+
+        with self._lock:
+            if side == "bid":
+                return float(self.bids[max(0, self._best_bid - ticks + 1):self._best_bid + 1].sum())
+            else:
+                return float(self.asks[self._best_ask:self._best_ask + ticks].sum())
+
+    def vwap(self, side: str, quantity: float) -> typing.Optional[float]:
+
+        """
+        Average price of a market order of a given size, if it was filled by the current book.
+        :param side: buy (takes the asks) or sell (takes the bids)
+        :param quantity: Order size
+        :return: The volume-weighted average price, None if the book is not synced or not deep enough
+        """
+
+        with self._lock:
+            if not self.synced or quantity <= 0:
+                return None
+
+            if side.lower() == "buy":
+                levels = self.asks[self._best_ask:]
+                first_index = self._best_ask
+                step = 1
+            else:
+                levels = self.bids[self._best_bid::-1] if self._best_bid >= 0 else self.bids[:0]
+                first_index = self._best_bid
+                step = -1
+
+            cumulated = np.cumsum(levels)
+            last = int(np.searchsorted(cumulated, quantity))
+
+            if last >= len(levels):
+                return None
+
+            indexes = first_index + step * np.arange(last + 1)
+            prices = (self._base_tick + indexes) * self.tick_size
+
+            filled = levels[:last + 1].copy()
+            filled[last] = quantity - (cumulated[last - 1] if last > 0 else 0)  # Partially consumed last level
+
+            return float((prices * filled).sum() / quantity)
+
+
+class OrderBookManager:
+    def __init__(self, client: "BinanceClient"):
+
+        """
+        Local order books of the symbols that need one, fed by the depthUpdate events dispatched by the client.
+        :param client: Used to download the snapshots and to subscribe to the depth streams
+        """
+
+        self._client = client
+        self.books: typing.Dict[str, OrderBook] = dict()  # Copy-on-write, read by the websocket threads
+
+    def get(self, symbol: str) -> typing.Optional[OrderBook]:
+        return self.books.get(symbol)
+
+    def subscribe(self, contract: ContractData):
+
+        if contract.symbol in self.books:
+            return
+
+        book = OrderBook(contract)
+
+        books = dict(self.books)
+        books[contract.symbol] = book
+        self.books = books
+
+        # The events are buffered by the book until the snapshot is loaded
+        self._client.subscribe_channel([contract], "depth@100ms")
+        self._client.scheduler.submit(self._load_snapshot, book)
+
+    def unsubscribe(self, contract: ContractData):
+
+        if contract.symbol not in self.books:
+            return
+
+        books = dict(self.books)
+        del books[contract.symbol]
+        self.books = books
+
+        self._client.unsubscribe_channel([contract], "depth@100ms")
+
+    def on_depth_update(self, data: typing.Dict):
+
+        book = self.books.get(data['s'])
+
+        if book is not None and not book.on_diff(data):
+            book.reset()
+            self._client.scheduler.submit(self._load_snapshot, book)
+
+    def _load_snapshot(self, book: OrderBook):
+
+        snapshot = self._client.get_depth_snapshot(book.contract, SNAPSHOT_DEPTH)
+
+        if book.contract.symbol not in self.books:  # Unsubscribed in the meantime
+            return
+
+        if snapshot is None:
+            logger.error("Could not download the %s order book, retrying in 5 seconds", book.contract.symbol)
+            self._client.scheduler.schedule(5.0, self._load_snapshot, book)
+            return
+
+        if not book.load_snapshot(snapshot):
+            book.reset()
+            self._client.scheduler.schedule(1.0, self._load_snapshot, book)
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+import typing
+
+from concurrent.futures import ThreadPoolExecutor, Future
+
+from Exchange_Data import *
+
+if typing.TYPE_CHECKING:
+    from Binance_Client import BinanceClient
+
+
+logger = logging.getLogger()
+
+LIMIT_ORDER_TYPES = ["LIMIT", "STOP", "TAKE_PROFIT"]  # The order types that need a limit price and a time in force
+
+
+class OrderIntent:
+    def __init__(self, contract: ContractData, side: str, order_type: str = "MARKET",
+                 quantity: typing.Optional[float] = None, balance_pct: typing.Optional[float] = None,
+                 price: typing.Optional[float] = None, stop_price: typing.Optional[float] = None,
+                 reduce_only: bool = False, limit_price: typing.Optional[float] = None,
+                 tif: typing.Optional[str] = None):
+
+        """
+        Order a strategy wants to place, executed later by the OrderExecutor.
+        :param contract:
+        :param side: buy or sell
+        :param order_type: MARKET, LIMIT, STOP_MARKET, TAKE_PROFIT_MARKET...
+        :param quantity: Order size, or None to compute it from balance_pct
+        :param balance_pct: Percentage of the quote asset balance to use when quantity is None
+        :param price: Reference price used to compute the trade size (the last price for a market order), the limit
+        price if None
+        :param stop_price: Trigger price of the STOP_MARKET and TAKE_PROFIT_MARKET orders
+        :param reduce_only: The order can only reduce the position, e.g: for the exits
+        :param limit_price: Price of the LIMIT, STOP and TAKE_PROFIT orders
+        :param tif: Time in force of the limit orders: GTC (default), IOC, FOK or GTX
+        """
+
+        if order_type.upper() in LIMIT_ORDER_TYPES:
+            if limit_price is None:  # Would be rejected by the exchange
+                raise ValueError(f"A {order_type} order needs a limit price")
+            if tif is None:
+                tif = "GTC"
+
+        self.contract = contract
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.balance_pct = balance_pct
+        self.price = price if price is not None else limit_price
+        self.stop_price = stop_price
+        self.reduce_only = reduce_only
+        self.limit_price = limit_price
+        self.tif = tif
+
+
+class OrderExecutor:
+    def __init__(self, client: "BinanceClient", max_workers: int = 4, batch_delay: float = 0.002):
+
+        """
+        Pool of threads dedicated to order placement, so the websocket thread that detects the signals never waits
+        for a REST round trip.
+        The orders submitted at the same time (e.g: several strategies signaling on the same candle close) are grouped
+        into batch requests instead of one signed request each. The same goes for the cancellations, per symbol.
+        :param client:
+        :param max_workers: Maximum number of batches being sent at the same time
+        :param batch_delay: Seconds waited for other orders before sending a batch
+        """
+
+        self._client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="orders")
+        self._batch_delay = batch_delay
+
+        self._lock = threading.Lock()
+        self._pending_orders: typing.List[typing.Tuple[OrderIntent, Future]] = []
+        self._pending_cancels: typing.List[typing.Tuple[ContractData, int, Future]] = []
+
+    def submit(self, intent: OrderIntent,
+               callback: typing.Callable[[typing.Optional[OrderStatusData]], None]) -> Future:
+
+        """
+        Queue an order and return immediately.
+        :param intent:
+        :param callback: Called from a worker thread with the OrderStatusData, or None if the order failed
+        :return: Future of the OrderStatusData
+        """
+
+        future = Future()
+        future.add_done_callback(lambda f: self._run_callback(f, callback))
+
+        with self._lock:
+            self._pending_orders.append((intent, future))
+            start_batch = len(self._pending_orders) == 1  # Otherwise a batch is already waiting for its orders
+
+        if start_batch:
+            self._executor.submit(self._place_pending)
+
+        return future
+
+    def cancel(self, contract: ContractData, order_id: int,
+               callback: typing.Optional[typing.Callable[[typing.Optional[OrderStatusData]], None]] = None) -> Future:
+
+        """
+        Queue an order cancellation and return immediately.
+        :param contract:
+        :param order_id:
+        :param callback: Called from a worker thread with the OrderStatusData, or None if the cancellation failed
+        :return: Future of the OrderStatusData
+        """
+
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(lambda f: self._run_callback(f, callback))
+
+        with self._lock:
+            self._pending_cancels.append((contract, order_id, future))
+            start_batch = len(self._pending_cancels) == 1
+
+        if start_batch:
+            self._executor.submit(self._cancel_pending)
+
+        return future
+
+    def stop(self):
+        self._executor.shutdown(wait=False)
+
+    def _place_pending(self):
+
+        time.sleep(self._batch_delay)  # Lets the orders signaled by the same event join the batch
+
+        with self._lock:
+            pending = self._pending_orders
+            self._pending_orders = []
+
+        orders = []
+        futures = []
+
+        for intent, future in pending:
+            try:
+                quantity = intent.quantity
+
+                if quantity is None:
+                    quantity = self._client.get_trade_size(intent.contract, intent.price, intent.balance_pct,
+                                                           intent.side)
+                    if quantity is None:
+                        future.set_result(None)
+                        continue
+
+            except Exception as e:
+                future.set_exception(e)
+                continue
+
+            orders.append({"contract": intent.contract, "order_type": intent.order_type, "quantity": quantity,
+                           "side": intent.side, "price": intent.limit_price, "tif": intent.tif,
+                           "stop_price": intent.stop_price, "reduce_only": intent.reduce_only})
+            futures.append(future)
+
+        try:
+            if len(orders) == 1:
+                results = [self._client.place_order(**orders[0])]
+            else:
+                results = self._client.place_batch_orders(orders)
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+
+        for future, order_status in zip(futures, results):
+            future.set_result(order_status)
+
+    def _cancel_pending(self):
+
+        time.sleep(self._batch_delay)
+
+        with self._lock:
+            pending = self._pending_cancels
+            self._pending_cancels = []
+
+        by_symbol = dict()
+
+        for contract, order_id, future in pending:
+            if contract.symbol not in by_symbol:
+                by_symbol[contract.symbol] = (contract, [], [])
+            by_symbol[contract.symbol][1].append(order_id)
+            by_symbol[contract.symbol][2].append(future)
+
+        for contract, order_ids, futures in by_symbol.values():
+            try:
+                if len(order_ids) == 1:
+                    results = [self._client.cancel_order(contract, order_ids[0])]
+                else:
+                    results = self._client.cancel_batch_orders(contract, order_ids)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, order_status in zip(futures, results):
+                future.set_result(order_status)
+
+    @staticmethod
+    def _run_callback(future: Future, callback: typing.Callable[[typing.Optional[OrderStatusData]], None]):
+
+        try:
+            order_status = future.result()
+        except Exception as e:
+            logger.error("Error while executing order: %s", e)
+            order_status = None
+
+        try:
+            callback(order_status)
+        except Exception as e:
+            logger.error("Error in order callback: %s", e)
@@ -0,0 +1,317 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import typing
+
+
+logger = logging.getLogger()
+
+# Default futures limits, replaced by the 'rateLimits' of /fapi/v1/exchangeInfo when available
+DEFAULT_RATE_LIMITS = [
+    {"rateLimitType": "REQUEST_WEIGHT", "interval": "MINUTE", "intervalNum": 1, "limit": 2400},
+    {"rateLimitType": "ORDERS", "interval": "MINUTE", "intervalNum": 1, "limit": 1200},
+    {"rateLimitType": "ORDERS", "interval": "SECOND", "intervalNum": 10, "limit": 300},
+]
+
+INTERVAL_SECONDS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400}
+INTERVAL_LETTER = {"SECOND": "S", "MINUTE": "M", "HOUR": "H", "DAY": "D"}
+
+# Request weight of the endpoints used by the client (https://binance-docs.github.io/apidocs/futures/en)
+ENDPOINT_WEIGHTS = {"/fapi/v1/exchangeInfo": 1, "/fapi/v1/ticker/bookTicker": 2, "/fapi/v1/account": 5,
+                    "/fapi/v1/order": 1, "/fapi/v1/batchOrders": 5, "/fapi/v1/listenKey": 1}
+
+PRIORITY_ORDER = 0  # Orders and cancellations go first, they are time sensitive
+PRIORITY_INFO = 1
+
+ORDER_ENDPOINTS = ["/fapi/v1/order", "/fapi/v1/batchOrders"]
+
+
+def get_request_weight(endpoint: str, data: typing.Dict) -> int:
+
+    """
+    Weight of a request, as counted by the exchange.
+    :param endpoint: e.g: /fapi/v1/klines
+    :param data: The request parameters, some weights depend on them (klines limit)
+    :return:
+    """
+
+    if endpoint == "/fapi/v1/klines":
+        limit = data.get('limit', 500)
+        if limit < 100:
+            return 1
+        elif limit < 500:
+            return 2
+        elif limit <= 1000:
+            return 5
+        else:
+            return 10
+
+    if endpoint == "/fapi/v1/depth":
+        limit = data.get('limit', 500)
+        if limit <= 50:
+            return 2
+        elif limit <= 100:
+            return 5
+        elif limit <= 500:
+            return 10
+        else:
+            return 20
+
+    if endpoint == "/fapi/v1/batchOrders" and "orderIdList" in data:  # Batch cancellation
+        return 1
+
+    return ENDPOINT_WEIGHTS.get(endpoint, 1)
+
+
+def get_request_priority(method: str, endpoint: str) -> int:
+
+    """
+    Queue priority of a request: the order placements and cancellations are served before the informational GETs.
+    :param method: GET, POST, PUT or DELETE
+    :param endpoint: e.g: /fapi/v1/order
+    :return: PRIORITY_ORDER or PRIORITY_INFO
+    """
+
+    if endpoint in ORDER_ENDPOINTS and method in ["POST", "DELETE"]:
+        return PRIORITY_ORDER
+
+    return PRIORITY_INFO
+
+
+class TokenBucket:
+    def __init__(self, name: str, limit: int, window: float, safety_margin: float):
+
+        """
+        :param name: Name of the limit, matches the response header suffix, e.g: USED-WEIGHT-1M, ORDER-COUNT-10S
+        :param limit: Maximum count allowed by the exchange over the window
+        :param window: Window length in seconds
+        :param safety_margin: Fraction of the limit actually used, keeps some headroom for the other processes
+        """
+
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.capacity = max(1.0, limit * safety_margin)
+        self.tokens = self.capacity
+        self._refill_rate = self.capacity / window
+        self._last_refill = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._last_refill) * self._refill_rate)
+        self._last_refill = now
+
+    def wait_time(self, count: float) -> float:
+
+        """
+        Seconds to wait before 'count' tokens are available, 0 if they already are.
+        """
+
+        if self.tokens >= count:
+            return 0.0
+
+        return (min(count, self.capacity) - self.tokens) / self._refill_rate
+
+    def sync(self, used: int):
+
+        """
+        Align the bucket on the usage reported by the exchange, which also counts the other clients of the account.
+        """
+
+        self.tokens = min(self.tokens, self.capacity - used)
+
+    @property
+    def used(self) -> float:
+        return self.capacity - self.tokens
+
+
+class RateLimiter:
+    def __init__(self, safety_margin: float = 0.9):
+
+        """
+        Token bucket scheduler placed in front of every REST request.
+        Requests that would exceed a limit are queued (the calling thread waits) instead of being sent and rejected.
+        Waiting requests are served by priority (orders before informational GETs), then in arrival order.
+        :param safety_margin: Fraction of the exchange limits that can be used
+        """
+
+        self._safety_margin = safety_margin
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._blocked_until = 0.0
+
+        self._weight_buckets: typing.List[TokenBucket] = []
+        self._order_buckets: typing.List[TokenBucket] = []
+
+        self.update_limits(DEFAULT_RATE_LIMITS)
+
+    def update_limits(self, rate_limits: typing.List[typing.Dict]):
+
+        """
+        Build the buckets from the 'rateLimits' list of the exchangeInfo endpoint.
+        :param rate_limits:
+        :return:
+        """
+
+        weight_buckets = []
+        order_buckets = []
+
+        for rate_limit in rate_limits:
+            interval = rate_limit['interval']
+            suffix = f"{rate_limit['intervalNum']}{INTERVAL_LETTER[interval]}"
+            window = rate_limit['intervalNum'] * INTERVAL_SECONDS[interval]
+
+            if rate_limit['rateLimitType'] == "REQUEST_WEIGHT":
+                weight_buckets.append(TokenBucket("USED-WEIGHT-" + suffix, rate_limit['limit'], window,
+                                                  self._safety_margin))
+            elif rate_limit['rateLimitType'] == "ORDERS":
+                order_buckets.append(TokenBucket("ORDER-COUNT-" + suffix, rate_limit['limit'], window,
+                                                 self._safety_margin))
+
+        with self._condition:
+            self._weight_buckets = weight_buckets
+            self._order_buckets = order_buckets
+            self._condition.notify_all()
+
+    def _wait_time(self, weight: int, is_order: bool, now: float, order_count: int = 1) -> float:
+
+        wait = max(0.0, self._blocked_until - now)
+
+        for bucket in self._weight_buckets:
+            bucket.refill(now)
+            wait = max(wait, bucket.wait_time(weight))
+
+        if is_order:
+            for bucket in self._order_buckets:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(order_count))
+
+        return wait
+
+    def acquire(self, weight: int, is_order: bool = False, order_count: int = 1,
+                priority: typing.Optional[int] = None):
+
+        """
+        Block until the request can be sent without exceeding any limit, then consume its tokens.
+        :param weight: Request weight of the endpoint
+        :param is_order: True for order placement requests, they are also counted in the ORDERS limits
+        :param order_count: Number of orders of the request, more than 1 for the batch orders
+        :param priority: PRIORITY_ORDER or PRIORITY_INFO, by default PRIORITY_ORDER only for the order placements
+        :return:
+        """
+
+        if priority is None:
+            priority = PRIORITY_ORDER if is_order else PRIORITY_INFO
+
+        ticket = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._queue, ticket)
+
+            while True:
+                if self._queue[0] == ticket:
+                    wait = self._wait_time(weight, is_order, time.monotonic(), order_count)
+                    if wait == 0:
+                        break
+                    if wait > 1:
+                        logger.warning("Rate limit reached, request queued for %.1f seconds", wait)
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+
+            heapq.heappop(self._queue)
+
+            for bucket in self._weight_buckets:
+                bucket.tokens -= weight
+            if is_order:
+                for bucket in self._order_buckets:
+                    bucket.tokens -= order_count
+
+            self._condition.notify_all()  # Lets the next request in the queue check its own limits
+
+    def try_acquire(self, weight: int, is_order: bool = False, order_count: int = 1,
+                    priority: typing.Optional[int] = None) -> float:
+
+        """
+        Non-blocking version of acquire() for the asyncio client: consume the tokens if the request can be sent now.
+        :param weight: Request weight of the endpoint
+        :param is_order: True for order placement requests
+        :param order_count: Number of orders of the request, more than 1 for the batch orders
+        :param priority: PRIORITY_ORDER or PRIORITY_INFO, by default PRIORITY_ORDER only for the order placements
+        :return: 0 if the tokens were consumed, otherwise the number of seconds to wait before trying again
+        """
+
+        if priority is None:
+            priority = PRIORITY_ORDER if is_order else PRIORITY_INFO
+
+        with self._condition:
+            if len(self._queue) > 0 and self._queue[0][0] <= priority:  # Waiting threads of same priority go first
+                return 0.05
+
+            wait = self._wait_time(weight, is_order, time.monotonic(), order_count)
+            if wait > 0:
+                return wait
+
+            for bucket in self._weight_buckets:
+                bucket.tokens -= weight
+            if is_order:
+                for bucket in self._order_buckets:
+                    bucket.tokens -= order_count
+
+            self._condition.notify_all()  # A waiting thread may now have to wait for the tokens consumed here
+
+            return 0.0
+
+    def update_from_headers(self, headers: typing.Mapping[str, str]):
+
+        """
+        Read the X-MBX-USED-WEIGHT-* and X-MBX-ORDER-COUNT-* response headers.
+        :param headers: Case-insensitive headers of the response
+        :return:
+        """
+
+        with self._condition:
+            for bucket in self._weight_buckets + self._order_buckets:
+                used = headers.get("X-MBX-" + bucket.name)
+                if used is not None:
+                    bucket.refill(time.monotonic())
+                    bucket.sync(int(used))
+
+    def block(self, seconds: float):
+
+        """
+        Stop sending any request for a while, after a 429 (too many requests) or 418 (IP ban) response.
+        :param seconds: Value of the Retry-After header
+        :return:
+        """
+
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def usage(self) -> typing.Dict[str, typing.Dict[str, float]]:
+
+        """
+        Current usage of each limit, to monitor the headroom left under load.
+        :return: e.g: {"USED-WEIGHT-1M": {"used": 120, "limit": 2160}, ...}
+        """
+
+        with self._condition:
+            now = time.monotonic()
+            usage = dict()
+
+            for bucket in self._weight_buckets + self._order_buckets:
+                bucket.refill(now)
+                usage[bucket.name] = {"used": round(bucket.used, 1), "limit": bucket.capacity}
+
+            return usage
+
+    @property
+    def queued(self) -> int:
+
+        """
+        Number of requests currently waiting for capacity.
+        """
+
+        return len(self._queue)
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+import typing
+
+from concurrent.futures import ThreadPoolExecutor, Future
+
+
+logger = logging.getLogger()
+
+
+class ScheduledTask:
+    def __init__(self, callback: typing.Callable, args: typing.Tuple, interval: typing.Optional[float]):
+
+        """
+        Handle returned by Scheduler.schedule(), lets the caller cancel the task.
+        :param callback:
+        :param args: Positional arguments passed to the callback
+        :param interval: Period in seconds for recurring tasks, None for a one-shot task
+        """
+
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Scheduler:
+    def __init__(self, max_workers: int = 4):
+
+        """
+        Single timer thread (heap ordered by due time) shared by all the delayed and recurring work of the client,
+        instead of one threading.Timer thread per delay.
+        Due tasks are executed by a bounded pool of worker threads, so a slow callback (e.g. a REST request) never
+        delays the timer thread.
+        :param max_workers: Maximum number of callbacks running at the same time
+        """
+
+        self._heap = []
+        self._sequence = itertools.count()  # Breaks ties between tasks due at the same time
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scheduler")
+        self._running = True
+
+        self._thread = threading.Thread(target=self._run, name="scheduler-timer", daemon=True)
+        self._thread.start()
+
+    def schedule(self, delay: float, callback: typing.Callable, *args, interval: typing.Optional[float] = None) \
+            -> ScheduledTask:
+
+        """
+        Run a callback after a delay, then every 'interval' seconds if interval is set.
+        :param delay: Seconds before the first execution
+        :param callback:
+        :param args: Positional arguments passed to the callback
+        :param interval: Period in seconds, the next run is counted from the end of the previous one
+        :return: The task handle, call .cancel() on it to stop it
+        """
+
+        task = ScheduledTask(callback, args, interval)
+        self._push(time.monotonic() + delay, task)
+        return task
+
+    def submit(self, callback: typing.Callable, *args) -> Future:
+
+        """
+        Run a callback as soon as a worker is available.
+        """
+
+        return self._executor.submit(self._execute, callback, args)
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+
+        self._executor.shutdown(wait=False)
+
+    def _push(self, due: float, task: ScheduledTask):
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), task))
+            self._condition.notify()  # The new task may be due before the one the timer thread is waiting for
+
+    def _run(self):
+
+        while True:
+            with self._condition:
+                while self._running and (len(self._heap) == 0 or self._heap[0][0] > time.monotonic()):
+                    timeout = self._heap[0][0] - time.monotonic() if len(self._heap) > 0 else None
+                    self._condition.wait(timeout)
+
+                if not self._running:
+                    return
+
+                due, _, task = heapq.heappop(self._heap)
+
+            if not task.cancelled:
+                try:
+                    self._executor.submit(self._run_task, task)
+                except RuntimeError:  # The executor has been shut down
+                    return
+
+    def _run_task(self, task: ScheduledTask):
+
+        if task.cancelled:
+            return
+
+        self._execute(task.callback, task.args)
+
+        if task.interval is not None and not task.cancelled and self._running:
+            self._push(time.monotonic() + task.interval, task)
+
+    @staticmethod
+    def _execute(callback: typing.Callable, args: typing.Tuple):
+
+        try:
+            return callback(*args)
+        except Exception as e:
+            logger.error("Error while running scheduled task %s: %s", getattr(callback, "__name__", callback), e)
@@ -2,24 +2,27 @@ import logging
 from typing import *
 import time
 
-from threading import Timer
-
-import pandas as pd
+from threading import Lock
 
 from Exchange_Data import *
+from Order_Executor import OrderIntent
+from Candle_Series import CandleSeries
+from Indicators import MACD, RSI
 
 if TYPE_CHECKING:  # Import the connector class names only for typing purpose (the classes aren't actually imported)
     from Binance_Client import BinanceClient
+    from Market_Data import SharedSeries
 
 logger = logging.getLogger()
 
-# TF_EQUIV is used in parse_trades() to compare the last candle timestamp to the new trade timestamp
+# TF_EQUIV is used in SharedSeries.parse_trades() to compare the last candle timestamp to the new trade timestamp
 TIMEFRAME_EQUIVALENT = {"1m": 60, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400}
 
 
 class Strategy:
     def __init__(self, client: "BinanceClient", contract: ContractData,
-                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name):
+                 timeframe: str, balance_pct: float, take_profit: float, stop_loss: float, strat_name,
+                 exchange_exits: bool = False):
 
         self.client = client
         self.contract = contract
@@ -32,8 +35,17 @@ class Strategy:
         self.strat_name = strat_name
 
         self.ongoing_position = False
+        self._fill_lock = Lock()
+
+        # Place the take profit / stop loss as reduce-only orders on the exchange instead of watching the price
+        self.exchange_exits = exchange_exits
+        self._orders: Dict[int, TradeData] = dict()  # Order id (entry or exit) -> trade, for the fill events
 
-        self.candles: List[CandleData] = []
+        # aggTrade: the candles are built from every trade, TP/SL are checked on each trade
+        # kline: the candles come from the exchange kline stream, updated a few times per second
+        self.candle_stream = "aggTrade"
+
+        self.series: Optional["SharedSeries"] = None
         self.trades: List[TradeData] = []
         self.logs = []
 
@@ -41,91 +53,236 @@ class Strategy:
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
-    def parse_trades(self, price: float, size: float, timestamp: int) -> str:
+    @property
+    def candles(self) -> CandleSeries:
+        return self.series.candles
+
+    @property
+    def stream_channel(self) -> str:
+
+        """
+        :return: The websocket channel feeding the candles of the strategy, e.g: aggTrade or kline_5m
+        """
+
+        if self.candle_stream == "kline":
+            return "kline_" + self.tf
+        return "aggTrade"
+
+    def attach(self, series: "SharedSeries"):
+
+        """
+        Give the strategy the candles of its symbol and timeframe, shared with the other strategies using them.
+        :param series:
+        :return:
+        """
+
+        self.series = series
+
+    def detach(self):
+
+        """
+        Called when the strategy is stopped, releases what attach() acquired.
+        :return:
+        """
+
+        pass
+
+    def on_trade(self, tick_type: str):
+
+        """
+        Called for each new trade (or batch of trades) of the symbol, once the shared candles have been updated.
+        The take profit / stop loss are not checked here: the client finds the triggered ones in the TriggerIndex of
+        the symbol and calls on_exit_triggered().
+        :param tick_type: same_candle or new_candle, as returned by SharedSeries.parse_trades() or parse_kline()
+        :return:
+        """
+
+        self.check_trade(tick_type)
+
+    def _fill_trade(self, trade: TradeData, order_status: OrderStatusData):
+
+        """
+        Record the fill of the entry order of a trade. Can be reached both from the user data stream and from the
+        order placement response, the lock makes sure the trade is only filled once.
+        :param trade:
+        :param order_status: A filled order status
+        :return:
+        """
+
+        with self._fill_lock:
+            if trade.entry_price is not None:
+                return
+
+            trade.entry_price = order_status.avg_price
+            trade.quantity = order_status.executed_qty
+
+            # The exit prices are computed once here and indexed by the client, instead of on every trade
+            sign = 1 if trade.side == "long" else -1
+            if self.take_profit is not None:
+                trade.take_profit_price = trade.entry_price * (1 + sign * self.take_profit / 100)
+            if self.stop_loss is not None:
+                trade.stop_loss_price = trade.entry_price * (1 - sign * self.stop_loss / 100)
+
+        self.client.add_open_trade(trade, self)
+
+        if trade.exchange_exits:
+            self._place_exit_orders(trade)
+
+    def _place_exit_orders(self, trade: TradeData):
 
         """
-        Parse new trades coming in from the websocket and update the Candle list based on the timestamp.
-        :param price: The trade price
-        :param size: The trade size
-        :param timestamp: Unix timestamp in milliseconds
+        Protect a trade whose entry is filled with reduce-only STOP_MARKET / TAKE_PROFIT_MARKET orders, so the exit
+        is triggered by the exchange even if this program is late or stopped.
+        :param trade:
         :return:
         """
 
-        timestamp_difference = int(time.time() * 1000) - timestamp
-        if timestamp_difference >= 2000:
-            logger.warning("%s: %s milliseconds of difference between the current time and the trade time",
-            self.contract.symbol, timestamp_difference)
+        order_side = "SELL" if trade.side == "long" else "BUY"
+
+        for is_stop_loss, order_type, stop_price in ((True, "STOP_MARKET", trade.stop_loss_price),
+                                                     (False, "TAKE_PROFIT_MARKET", trade.take_profit_price)):
+            if stop_price is None:
+                continue
+
+            intent = OrderIntent(self.contract, order_side, order_type, quantity=trade.quantity,
+                                 stop_price=stop_price, reduce_only=True)
+            self.client.order_executor.submit(intent, lambda status, sl=is_stop_loss:
+                                              self._on_exit_order_placed(status, trade, sl))
+
+    def _on_exit_order_placed(self, order_status: OrderStatusData, trade: TradeData, is_stop_loss: bool):
+
+        """
+        Callback of the protective orders, runs on an OrderExecutor thread.
+        :param order_status: None if the order could not be placed
+        :param trade:
+        :param is_stop_loss: True for the STOP_MARKET order, False for the TAKE_PROFIT_MARKET one
+        :return:
+        """
+
+        if order_status is None or not trade.exchange_exits or trade.status != "open":
+
+            if order_status is not None:  # The trade is already closed or is watched locally, the order isn't needed
+                self.client.order_executor.cancel(self.contract, order_status.order_id)
+                return
+
+            if trade.status != "open":  # Closed by the other protective order in the meantime, nothing to watch
+                return
+
+            self._add_log(f"Could not place the {'stop loss' if is_stop_loss else 'take profit'} order on "
+                          f"{self.contract.symbol}, the exits are watched locally")
+
+            with self._fill_lock:
+                if not trade.exchange_exits or trade.status != "open":
+                    return
+                trade.exchange_exits = False
+                sibling_id = trade.tp_order_id if is_stop_loss else trade.sl_order_id
+
+            if sibling_id is not None:
+                self.client.order_executor.cancel(self.contract, sibling_id)
 
-        last_candle = self.candles[-1]
+            # Published again so the TriggerIndex of the symbol includes its exit prices
+            self.client.remove_open_trade(trade)
+            self.client.add_open_trade(trade, self)
+            return
 
-        # Same Candle
+        if is_stop_loss:
+            trade.sl_order_id = order_status.order_id
+        else:
+            trade.tp_order_id = order_status.order_id
 
-        if timestamp < last_candle.timestamp + self.tf_equiv:
+        self._orders[order_status.order_id] = trade
 
-            last_candle.close = price
-            last_candle.volume += size
+        if order_status.status == "filled":  # Triggered right away
+            self.on_order_update(order_status)
+        elif self.client.user_stream.connected:
+            self._check_order_status(order_status.order_id)  # The fill event may have arrived before the order id
+        else:
+            self.client.scheduler.schedule(2.0, self._check_order_status, order_status.order_id)
 
-            if price > last_candle.high:
-                last_candle.high = price
-            elif price < last_candle.low:
-                last_candle.low = price
+    def _on_exit_filled(self, trade: TradeData, order_status: OrderStatusData):
 
-            # Check Take profit / Stop loss
+        """
+        One of the protective orders of a trade is filled: the trade is closed and the other one is cancelled.
+        :param trade:
+        :param order_status:
+        :return:
+        """
 
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_and_sl(trade)
+        with self._fill_lock:
+            if trade.status == "closed":
+                return
+            trade.status = "closed"
 
-            return "same_candle"
+        is_stop_loss = order_status.order_id == trade.sl_order_id
+        sibling_id = trade.tp_order_id if is_stop_loss else trade.sl_order_id
 
-        # Missing Candle(s)
+        self._add_log(f"{'Stop loss' if is_stop_loss else 'Take profit'} order filled on {self.contract.symbol} "
+                      f"{self.tf} | Exit price = {order_status.avg_price} (Entry price was {trade.entry_price})")
 
-        elif timestamp >= last_candle.timestamp + 2 * self.tf_equiv:
+        if sibling_id is not None:
+            self.client.order_executor.cancel(self.contract, sibling_id)
 
-            missing_candles = int((timestamp - last_candle.timestamp) / self.tf_equiv) - 1
+        for order_id in (trade.entry_id, trade.sl_order_id, trade.tp_order_id):
+            self._orders.pop(order_id, None)
 
-            logger.info("Missing %s candles for %s %s (%s %s)",missing_candles, self.contract.symbol,
-                        self.tf, timestamp, last_candle.timestamp)
+        self.client.remove_open_trade(trade)
+        self.ongoing_position = False
 
-            for missing in range(missing_candles):
-                new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {'ts': new_ts, 'open': last_candle.close, 'high': last_candle.close,
-                               'low': last_candle.close, 'close': last_candle.close, 'volume': 0}
-                new_candle = CandleData(candle_info, self.tf, "parse_trade")
+    def on_order_update(self, order_status: OrderStatusData):
 
-                self.candles.append(new_candle)
+        """
+        Called by the client for each ORDER_TRADE_UPDATE event of the user data stream on the strategy symbol.
+        :param order_status:
+        :return:
+        """
 
-                last_candle = new_candle
+        if order_status.status != "filled":
+            return
 
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = CandleData(candle_info, self.tf, "parse_trade")
+        trade = self._orders.get(order_status.order_id)
 
-            self.candles.append(new_candle)
+        if trade is None:
+            return
 
-            return "new_candle"
+        if order_status.order_id == trade.entry_id:
+            self._fill_trade(trade, order_status)
+        else:
+            self._on_exit_filled(trade, order_status)
 
-        # New Candle
+    def reconcile_orders(self):
 
-        elif timestamp >= last_candle.timestamp + self.tf_equiv:
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {'ts': new_ts, 'open': price, 'high': price, 'low': price, 'close': price, 'volume': size}
-            new_candle = CandleData(candle_info, self.tf, "parse_trade")
+        """
+        Query the status of the orders followed by the strategy, after the user data stream has been disconnected.
+        :return:
+        """
 
-            self.candles.append(new_candle)
+        for order_id in list(self._orders.keys()):
+            order_status = self.client.get_order_status(self.contract, order_id)
 
-            logger.info("New candle for %s %s",self.contract.symbol, self.tf)
+            if order_status is None:
+                continue
 
-            return "new_candle"
+            if order_status.status == "filled":
+                self.on_order_update(order_status)
+            elif order_status.status in ["canceled", "expired", "rejected"]:
+                self._orders.pop(order_id, None)
 
     def _check_order_status(self, order_id):
 
         """
         Called regularly after an order has been placed, until it is filled.
+        Only used as a fallback when the user data stream is disconnected, otherwise the fill is detected by
+        on_order_update() without any REST request.
         :param order_id: The order id to check.
         :return:
         """
 
+        if self.client.user_stream.connected:
+            order_status = self.client.account.get_order(order_id)
+            if order_status is not None and order_status.status == "filled":  # Filled before the trade was recorded
+                self.on_order_update(order_status)
+            return
+
         order_status = self.client.get_order_status(self.contract, order_id)
 
         if order_status is not None:
@@ -133,101 +290,114 @@ class Strategy:
             logger.info("Order status: %s",order_status.status)
 
             if order_status.status == "filled":
-                for trade in self.trades:
-                    if trade.entry_id == order_id:
-                        trade.entry_price = order_status.avg_price
-                        trade.quantity = order_status.executed_qty
-                        break
+                self.on_order_update(order_status)
+                return
+
+            if order_status.status in ["canceled", "expired", "rejected"]:  # e.g: the other protective order filled
                 return
 
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
+        self.client.scheduler.schedule(2.0, self._check_order_status, order_id)
 
     def _open_position(self, signal_result: int):
 
         """
         Open Long or Short position based on the signal result.
+        The order is sent by the client OrderExecutor, this method returns without waiting for the REST requests so
+        the websocket thread keeps processing market data.
         :param signal_result: 1 (Long) or -1 (Short)
         :return:
         """
 
-        trade_size = self.client.get_trade_size(self.contract, self.candles[-1].close, self.balance_pct)
-        if trade_size is None:
-            return
-
         order_side = "buy" if signal_result == 1 else "sell"
         position_side = "long" if signal_result == 1 else "short"
 
         self._add_log(f"{position_side.capitalize()} signal on {self.contract.symbol} {self.tf}")
 
-        order_status = self.client.place_order(self.contract, "MARKET", trade_size, order_side)
+        self.ongoing_position = True  # Set right away so that the next ticks don't open another position
 
-        if order_status is not None:
-            self._add_log(f"{order_side.capitalize()} order placed | Status: {order_status.status}")
+        intent = OrderIntent(self.contract, order_side, "MARKET", balance_pct=self.balance_pct,
+                             price=self.candles[-1].close)
+        self.client.order_executor.submit(intent, lambda status: self._on_entry_placed(status, order_side,
+                                                                                      position_side))
+
+    def _on_entry_placed(self, order_status: OrderStatusData, order_side: str, position_side: str):
+
+        """
+        Callback of the entry order, runs on an OrderExecutor thread.
+        :param order_status: None if the order could not be placed
+        :param order_side: buy or sell
+        :param position_side: long or short
+        :return:
+        """
 
-            self.ongoing_position = True
+        if order_status is None:
+            self.ongoing_position = False
+            return
 
-            avg_fill_price = None
+        self._add_log(f"{order_side.capitalize()} order placed | Status: {order_status.status}")
 
-            if order_status.status == "filled":
-                avg_fill_price = order_status.avg_price
-            else:
-                t = Timer(2.0, lambda: self._check_order_status(order_status.order_id))
-                t.start()
+        new_trade = TradeData({"time": int(time.time() * 1000), "entry_price": None,
+                           "contract": self.contract, "strategy": self.strat_name, "side": position_side,
+                           "status": "open", "pnl": 0, "quantity": order_status.executed_qty, "entry_id": order_status.order_id,
+                           "exchange_exits": self.exchange_exits})
+        self.trades.append(new_trade)
+        self._orders[order_status.order_id] = new_trade
 
-            new_trade = TradeData({"time": int(time.time() * 1000), "entry_price": avg_fill_price,
-                               "contract": self.contract, "strategy": self.strat_name, "side": position_side,
-                               "status": "open", "pnl": 0, "quantity": order_status.executed_qty, "entry_id": order_status.order_id})
-            self.trades.append(new_trade)
+        if order_status.status == "filled":
+            self._fill_trade(new_trade, order_status)
+        elif self.client.user_stream.connected:
+            self._check_order_status(order_status.order_id)  # The fill event may have arrived before the trade
+        else:
+            self.client.scheduler.schedule(2.0, self._check_order_status, order_status.order_id)
 
-    def _check_tp_and_sl(self, trade: TradeData):
+    def on_exit_triggered(self, trade: TradeData, is_stop_loss: bool, price: float):
 
         """
-        Based on the average entry price, calculates whether the defined stop loss or take profit has been reached.
+        Called by the client when the price reaches the take profit or stop loss price of one of the open trades.
         :param trade:
+        :param is_stop_loss: True for the stop loss, False for the take profit
+        :param price: The price that reached the exit price
         :return:
         """
 
-        tp_triggered = False
-        sl_triggered = False
+        if trade.status != "open":  # Already being closed, the exit price may be reached again before that
+            return
 
-        price = self.candles[-1].close
+        self._add_log(f"{'Stop loss' if is_stop_loss else 'Take profit'} for {self.contract.symbol} {self.tf} "
+                      f"| Current Price = {price} (Entry price was {trade.entry_price})")
 
-        if trade.side == "long":
-            if self.stop_loss is not None:
-                if price <= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price >= trade.entry_price * (1 + self.take_profit / 100):
-                    tp_triggered = True
+        order_side = "SELL" if trade.side == "long" else "BUY"
 
-        elif trade.side == "short":
-            if self.stop_loss is not None:
-                if price >= trade.entry_price * (1 + self.stop_loss / 100):
-                    sl_triggered = True
-            if self.take_profit is not None:
-                if price <= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
+        trade.status = "closing"  # Not closed twice while the exit order is being sent
 
-        if tp_triggered or sl_triggered:
+        intent = OrderIntent(self.contract, order_side, "MARKET", quantity=trade.quantity)
+        self.client.order_executor.submit(intent, lambda status: self._on_exit_placed(status, trade))
 
-            self._add_log(f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol} {self.tf} "
-                          f"| Current Price = {price} (Entry price was {trade.entry_price})")
+    def _on_exit_placed(self, order_status: OrderStatusData, trade: TradeData):
 
-            order_side = "SELL" if trade.side == "long" else "BUY"
+        """
+        Callback of the exit order, runs on an OrderExecutor thread.
+        :param order_status: None if the order could not be placed
+        :param trade:
+        :return:
+        """
 
-            order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side)
+        if order_status is None:
+            trade.status = "open"  # The take profit / stop loss can be triggered again on the next trade
+            return
 
-            if order_status is not None:
-                self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
-                trade.status = "closed"
-                self.ongoing_position = False
+        self._add_log(f"Exit order on {self.contract.symbol} {self.tf} placed successfully")
+        trade.status = "closed"
+        self._orders.pop(trade.entry_id, None)
+        self.client.remove_open_trade(trade)
+        self.ongoing_position = False
 
 
 class TechnicalStrategy(Strategy):
     def __init__(self, client, contract: ContractData, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
-        super().__init__(client, contract, timeframe, balance_pct, take_profit, stop_loss, "Technical")
+        super().__init__(client, contract, timeframe, balance_pct, take_profit, stop_loss, "Technical",
+                         other_params.get('exchange_exits') == 1)
 
         self._ema_fast = other_params['ema_fast']
         self._ema_slow = other_params['ema_slow']
@@ -235,56 +405,47 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params['rsi_length']
 
-    def _rsi(self) -> float:
+        # The signal is only computed at candle close: unless TP/SL must be checked on every trade, the candles can
+        # come from the kline stream instead of the much busier aggTrade stream
+        if other_params.get('tick_tp_sl') == 0:
+            self.candle_stream = "kline"
 
-        """
-        Compute the Relative Strength Index.
-        :return: The RSI value of the previous candlestick
-        """
-
-        close_list = []
-        for candle in self.candles:
-            close_list.append(candle.close)
+        # Incremental indicators, updated once per closed candle instead of being recomputed over the whole history
+        self._macd_key = ("macd", self._ema_fast, self._ema_slow, self._ema_signal)
+        self._rsi_key = ("rsi", self._rsi_length)
+        self._macd_indicator: Optional[MACD] = None
+        self._rsi_indicator: Optional[RSI] = None
 
-        closes = pd.Series(close_list)
+    def attach(self, series: "SharedSeries"):
 
-        # Calculate the different between the value of one row and the value of the row before
-        delta = closes.diff().dropna()
+        super().attach(series)
 
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0  # Keep only the negative change, others are set to 0
+        # Strategies with the same parameters on the same symbol and timeframe share the same indicator instances
+        self._macd_indicator = series.acquire_indicator(self._macd_key,
+                                                        lambda: MACD(self._ema_fast, self._ema_slow, self._ema_signal))
+        self._rsi_indicator = series.acquire_indicator(self._rsi_key, lambda: RSI(self._rsi_length))
 
-        avg_gain = up.ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
+    def detach(self):
+        self.series.release_indicator(self._macd_key)
+        self.series.release_indicator(self._rsi_key)
 
-        rs = avg_gain / avg_loss  # Relative Strength
+    def _rsi(self) -> float:
 
-        rsi = 100 - 100 / (1 + rs)
-        rsi = rsi.round(2)
+        """
+        Relative Strength Index, updated by the shared series at each candle close.
+        :return: The RSI value of the previous candlestick
+        """
 
-        return rsi.iloc[-2]
+        return self._rsi_indicator.value
 
     def _macd(self) -> Tuple[float, float]:
 
         """
-        Compute the MACD and its Signal line.
+        MACD and its Signal line, updated by the shared series at each candle close.
         :return: The MACD and the MACD Signal value of the previous candlestick
         """
 
-        close_list = []
-        for candle in self.candles:
-            close_list.append(candle.close)  # Use only the close price of each candlestick for the calculations
-
-        closes = pd.Series(close_list)  # Converts the close prices list to a pandas Series.
-
-        ema_fast = closes.ewm(span=self._ema_fast).mean()  # Exponential Moving Average method
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
-
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
-
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self._macd_indicator.macd_line, self._macd_indicator.macd_signal
 
     def _check_signal(self):
 
@@ -323,7 +484,8 @@ class TechnicalStrategy(Strategy):
 class BreakoutStrategy(Strategy):
     def __init__(self, client, contract: ContractData, timeframe: str, balance_pct: float, take_profit: float,
                  stop_loss: float, other_params: Dict):
-        super().__init__(client, contract, timeframe, balance_pct, take_profit, stop_loss, "Breakout")
+        super().__init__(client, contract, timeframe, balance_pct, take_profit, stop_loss, "Breakout",
+                         other_params.get('exchange_exits') == 1)
 
         self._min_volume = other_params['min_volume']
 
@@ -0,0 +1,194 @@
+import bisect
+import math
+import threading
+import typing
+
+from types import MappingProxyType
+
+import numpy as np
+
+from Exchange_Data import *
+
+if typing.TYPE_CHECKING:  # Import the strategy class names only for typing purpose
+    from Strategies import TechnicalStrategy, BreakoutStrategy
+
+
+class TriggerIndex:
+    def __init__(self, open_trades: typing.Tuple, owners: typing.Tuple):
+
+        """
+        Take profit and stop loss prices of the open trades of a symbol, sorted so that the exits triggered by a price
+        move are found with a binary search instead of checking every trade.
+        Entries are (trigger price, sequence number, trade, strategy), the sequence number breaks the ties.
+        :param open_trades: Tuple of TradeData, with their take_profit_price and stop_loss_price set on fill
+        :param owners: The strategy of each trade
+        """
+
+        long_stops, long_targets, short_stops, short_targets = [], [], [], []
+
+        for seq, (trade, strategy) in enumerate(zip(open_trades, owners)):
+            if trade.exchange_exits:  # Closed by the exchange, the fill event is enough
+                continue
+
+            if trade.side == "long":
+                stops, targets = long_stops, long_targets
+            else:
+                stops, targets = short_stops, short_targets
+
+            if trade.stop_loss_price is not None:
+                stops.append((trade.stop_loss_price, seq, trade, strategy))
+            if trade.take_profit_price is not None:
+                targets.append((trade.take_profit_price, seq, trade, strategy))
+
+        self.long_stops = sorted(long_stops)  # Triggered when the price goes down to the level
+        self.long_targets = sorted(long_targets)  # Triggered when the price goes up to the level
+        self.short_stops = sorted(short_stops)  # Triggered when the price goes up to the level
+        self.short_targets = sorted(short_targets)  # Triggered when the price goes down to the level
+
+    def triggered(self, high: float, low: float) -> typing.List[typing.Tuple]:
+
+        """
+        :param high: Highest price since the last check
+        :param low: Lowest price since the last check
+        :return: (trade, strategy, is a stop loss, price that triggered it) of the triggered exits, stop losses first
+        """
+
+        result = []
+
+        # Levels >= low for the downward triggers, levels <= high for the upward ones
+        for price, is_stop, entries in ((low, True, self.long_stops[bisect.bisect_left(self.long_stops, (low,)):]),
+                                        (high, True, self.short_stops[:bisect.bisect_right(self.short_stops,
+                                                                                           (high, math.inf))]),
+                                        (high, False, self.long_targets[:bisect.bisect_right(self.long_targets,
+                                                                                             (high, math.inf))]),
+                                        (low, False, self.short_targets[bisect.bisect_left(self.short_targets,
+                                                                                           (low,)):])):
+            for level, seq, trade, strategy in entries:
+                result.append((trade, strategy, is_stop, price))
+
+        return result
+
+
+class SymbolRoute:
+    def __init__(self, strategies: typing.Tuple = (), open_trades: typing.Tuple = (), owners: typing.Tuple = ()):
+
+        """
+        Immutable routing entry of a symbol: the strategies running on it and their open trades.
+        The entry prices, quantities and sides of the open trades are also kept as arrays, so the PNL of all the open
+        trades of a symbol is computed at once on each bookTicker, and their exit prices are indexed by a TriggerIndex.
+        :param strategies: Tuple of strategies
+        :param open_trades: Tuple of TradeData whose entry order is filled
+        :param owners: The strategy of each open trade
+        """
+
+        self.strategies = strategies
+        self.open_trades = open_trades
+        self.owners = owners
+
+        self.triggers = TriggerIndex(open_trades, owners)
+
+        self.entry_prices = np.array([t.entry_price for t in open_trades], dtype=np.float64)
+        self.quantities = np.array([t.quantity for t in open_trades], dtype=np.float64)
+        self.is_long = np.array([t.side == "long" for t in open_trades], dtype=bool)
+
+
+class RegistrySnapshot:
+    def __init__(self, strategies: typing.Dict, routes: typing.Dict[str, SymbolRoute]):
+
+        """
+        Read-only view of the registry at a point in time. Never modified once published.
+        :param strategies: b_index -> strategy
+        :param routes: symbol -> SymbolRoute
+        """
+
+        self.strategies = MappingProxyType(strategies)
+        self.routes = MappingProxyType(routes)
+
+
+class StrategyRegistry:
+    def __init__(self):
+
+        """
+        Copy-on-write registry of the running strategies.
+        Readers (the websocket thread, the Tkinter loop) grab the current snapshot with a single attribute read and can
+        iterate it as long as they want. Writers build a new snapshot and swap the reference, so a reader never sees a
+        dictionary that changes size during iteration.
+        The lock only serializes the writers between themselves (Tkinter thread and order fills).
+        """
+
+        self._write_lock = threading.Lock()
+        self.snapshot = RegistrySnapshot(dict(), dict())
+
+    def _publish(self, strategies: typing.Dict, routes: typing.Dict[str, SymbolRoute]):
+        self.snapshot = RegistrySnapshot(strategies, routes)  # Attribute assignment is atomic
+
+    def add_strategy(self, b_index: int, strategy: typing.Union["TechnicalStrategy", "BreakoutStrategy"]):
+
+        with self._write_lock:
+            current = self.snapshot
+
+            strategies = dict(current.strategies)
+            strategies[b_index] = strategy
+
+            routes = dict(current.routes)
+            symbol = strategy.contract.symbol
+            route = routes.get(symbol, SymbolRoute())
+            routes[symbol] = SymbolRoute(route.strategies + (strategy,), route.open_trades, route.owners)
+
+            self._publish(strategies, routes)
+
+    def remove_strategy(self, b_index: int):
+
+        with self._write_lock:
+            current = self.snapshot
+
+            if b_index not in current.strategies:
+                return
+
+            strategies = dict(current.strategies)
+            strategy = strategies.pop(b_index)
+
+            routes = dict(current.routes)
+            symbol = strategy.contract.symbol
+            route = routes[symbol]
+
+            remaining = tuple(s for s in route.strategies if s is not strategy)
+
+            if len(remaining) == 0:
+                del routes[symbol]
+            else:
+                kept = [(t, owner) for t, owner in zip(route.open_trades, route.owners) if owner is not strategy]
+                routes[symbol] = SymbolRoute(remaining, tuple(t for t, owner in kept), tuple(o for t, o in kept))
+
+            self._publish(strategies, routes)
+
+    def add_open_trade(self, trade: TradeData, strategy: typing.Union["TechnicalStrategy", "BreakoutStrategy"]):
+
+        with self._write_lock:
+            current = self.snapshot
+            symbol = trade.contract.symbol
+
+            if symbol not in current.routes:  # The strategy has been stopped in the meantime
+                return
+
+            routes = dict(current.routes)
+            route = routes[symbol]
+            routes[symbol] = SymbolRoute(route.strategies, route.open_trades + (trade,), route.owners + (strategy,))
+
+            self._publish(dict(current.strategies), routes)
+
+    def remove_open_trade(self, trade: TradeData):
+
+        with self._write_lock:
+            current = self.snapshot
+            symbol = trade.contract.symbol
+
+            if symbol not in current.routes:
+                return
+
+            routes = dict(current.routes)
+            route = routes[symbol]
+            kept = [(t, owner) for t, owner in zip(route.open_trades, route.owners) if t is not trade]
+            routes[symbol] = SymbolRoute(route.strategies, tuple(t for t, owner in kept), tuple(o for t, o in kept))
+
+            self._publish(dict(current.strategies), routes)
@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+import typing
+
+from Trade_Batcher import IngestWorker
+
+
+logger = logging.getLogger()
+
+
+class TickerConflator(IngestWorker):
+    def __init__(self, on_ticker: typing.Callable, priority_backlog: typing.Callable[[], int],
+                 priority_lag: typing.Callable[[], float], max_lag: float = 1000, shed_interval: float = 0.5):
+
+        """
+        Latest-wins queue of the bookTicker messages: only the last message of each symbol is kept until a dedicated
+        thread processes it, the intermediate top of book changes are dropped.
+        The messages with a higher priority (e.g: aggTrade) are processed first: the thread waits while their backlog
+        is not empty. When the messages are processed too late (lag between the exchange event time and the local
+        time above max_lag), the thread sheds load by processing the tickers at most every shed_interval seconds.
+        :param on_ticker: Called with the decoded bookTicker message
+        :param priority_backlog: Returns the number of higher priority messages waiting to be processed
+        :param priority_lag: Returns the lag in milliseconds of the higher priority messages
+        :param max_lag: Lag in milliseconds above which the load shedding starts
+        :param shed_interval: Minimum time in seconds between two updates while shedding load
+        """
+
+        super().__init__()
+
+        self._on_ticker = on_ticker
+        self._priority_backlog = priority_backlog
+        self._priority_lag = priority_lag
+        self._max_lag = max_lag
+        self._shed_interval = shed_interval
+
+        self._slots: typing.Dict[str, typing.Dict] = dict()  # Symbol -> latest message
+        self._lock = threading.Lock()
+
+        self.shedding = False
+        self.received = 0
+        self.processed = 0
+
+        self._start("ticker-conflator")
+
+    def put(self, data: typing.Dict):
+
+        """
+        Called by the websocket threads for each bookTicker message, replaces the pending message of the symbol.
+        :param data: The decoded message
+        :return:
+        """
+
+        with self._lock:
+            self._slots[data['s']] = data
+            self.received += 1
+
+        self._event.set()
+
+    def update_shedding(self, lag: float):
+
+        """
+        Start or stop the load shedding based on the lag of the ingestion.
+        :param lag: Lag in milliseconds, the highest one of the different message types
+        :return:
+        """
+
+        if lag > self._max_lag and not self.shedding:
+            self.shedding = True
+            logger.warning("Market data processed %s ms late, bookTicker updates slowed down", int(lag))
+        elif lag <= self._max_lag / 2 and self.shedding:  # Hysteresis so the mode doesn't flip on every message
+            self.shedding = False
+            logger.info("Market data back on time, bookTicker updates resumed")
+
+    def _process(self):
+
+        # The trades go first, a bookTicker can wait since a more recent one will replace it anyway
+        wait_start = time.perf_counter()
+        while self._running and self._priority_backlog() > 0 and time.perf_counter() - wait_start < 0.05:
+            time.sleep(0.001)
+
+        with self._lock:
+            slots = self._slots
+            self._slots = dict()
+
+        for data in slots.values():
+            try:
+                self._on_ticker(data)
+            except Exception as e:
+                logger.error("Error while processing a bookTicker message of %s: %s", data.get('s'), e)
+
+            if 'E' in data:
+                self.lag = int(time.time() * 1000) - data['E']
+
+        self.processed += len(slots)
+
+        self.update_shedding(max(self.lag, self._priority_lag()))
+
+        if self.shedding:
+            time.sleep(self._shed_interval)
@@ -0,0 +1,145 @@
+import collections
+import logging
+import threading
+import time
+import typing
+
+import numpy as np
+
+
+logger = logging.getLogger()
+
+IDLE_LAG_RESET = 1.0  # Seconds without any message after which the lag is reset, nothing is waiting to be processed
+
+
+class IngestWorker:
+    def __init__(self):
+
+        """
+        Thread woken up by the websocket threads to process the queued market data messages. Also tracks the lag
+        between the exchange event time of the messages and their processing.
+        The subclasses queue the messages and set the event in put(), then process them in _process().
+        """
+
+        self._event = threading.Event()
+        self._running = True
+
+        self.lag = 0  # Milliseconds between the event time of the last processed message and its processing
+
+        self._thread: typing.Optional[threading.Thread] = None
+
+    def _start(self, name: str):
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._event.set()
+
+    def _run(self):
+
+        while self._running:
+            if not self._event.wait(IDLE_LAG_RESET):
+                self.lag = 0  # The last value would otherwise be kept until the next message
+                continue
+            self._event.clear()
+
+            self._process()
+
+    def _process(self):
+        raise NotImplementedError
+
+
+class TradeBatcher(IngestWorker):
+    def __init__(self, on_trades: typing.Callable, max_batch: int = 2000, time_budget: float = 0.005):
+
+        """
+        Decouples the websocket threads from the candle and strategy updates: the aggTrade messages are queued as
+        they arrive and a single thread drains the queue in micro-batches, grouped by symbol.
+        Under a burst of trades each batch gets bigger instead of the backlog growing, since the candles and the TP/SL
+        are updated once per batch rather than once per trade.
+        :param on_trades: Called with (symbol, prices, sizes, timestamps) NumPy arrays for each symbol of a batch
+        :param max_batch: Maximum number of messages drained at once
+        :param time_budget: Maximum time in seconds spent draining the queue before processing the batch
+        """
+
+        super().__init__()
+
+        self._on_trades = on_trades
+        self._max_batch = max_batch
+        self._time_budget = time_budget
+
+        self._queue = collections.deque()  # append() and popleft() are thread-safe
+        self._last_event_time = None
+
+        self.batches = 0
+        self.trades = 0
+
+        self._start("trade-batcher")
+
+    def put(self, data: typing.Dict):
+
+        """
+        Called by the websocket threads for each aggTrade message.
+        :param data: The decoded message
+        :return:
+        """
+
+        self._queue.append(data)
+        self._event.set()
+
+    @property
+    def backlog(self) -> int:
+        return len(self._queue)
+
+    def _drain(self) -> typing.Dict[str, typing.Tuple[typing.List, typing.List, typing.List]]:
+
+        """
+        Pop the queued messages, up to max_batch messages or time_budget seconds.
+        :return: Symbol -> (prices, sizes, timestamps), in the order the trades were received
+        """
+
+        grouped = dict()
+        data = None
+        deadline = time.perf_counter() + self._time_budget
+
+        for count in range(self._max_batch):
+            try:
+                data = self._queue.popleft()
+            except IndexError:
+                break
+
+            if data['s'] not in grouped:
+                grouped[data['s']] = ([], [], [])
+
+            prices, sizes, timestamps = grouped[data['s']]
+            prices.append(data['p'])
+            sizes.append(data['q'])
+            timestamps.append(data['T'])
+
+            if count % 100 == 99 and time.perf_counter() > deadline:
+                break
+
+        if data is not None and 'E' in data:
+            self._last_event_time = data['E']
+
+        return grouped
+
+    def _process(self):
+
+        while self._running and len(self._queue) > 0:
+            grouped = self._drain()
+
+            self.batches += 1
+
+            for symbol, (prices, sizes, timestamps) in grouped.items():
+                self.trades += len(prices)
+
+                try:
+                    self._on_trades(symbol, np.array(prices, dtype=np.float64), np.array(sizes, dtype=np.float64),
+                                    np.array(timestamps, dtype=np.int64))
+                except Exception as e:
+                    logger.error("Error while processing a batch of %s trades on %s: %s", len(prices), symbol, e)
+
+            if self._last_event_time is not None:
+                self.lag = int(time.time() * 1000) - self._last_event_time
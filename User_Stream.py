@@ -0,0 +1,194 @@
+import collections
+import copy
+import json
+import logging
+import threading
+import time
+import typing
+
+import websocket
+
+from Exchange_Data import *
+from Scheduler import ScheduledTask
+
+if typing.TYPE_CHECKING:
+    from Binance_Client import BinanceClient
+
+
+logger = logging.getLogger()
+
+LISTEN_KEY_KEEPALIVE = 30 * 60  # The listenKey expires after 60 minutes without a keepalive request
+MAX_CACHED_ORDERS = 1000
+
+
+class AccountState:
+    def __init__(self):
+
+        """
+        In-memory copy of the account, updated by the events of the user data stream.
+        The balances and positions dictionaries are never modified in place: a new dictionary is built and swapped on
+        each update, so they can be read from any thread without locking.
+        """
+
+        self._write_lock = threading.Lock()
+
+        self.balances: typing.Dict[str, BalanceData] = dict()
+        self.positions: typing.Dict[str, PositionData] = dict()
+        self._orders: typing.OrderedDict[int, OrderStatusData] = collections.OrderedDict()
+
+    def set_balances(self, balances: typing.Dict[str, BalanceData]):
+        self.balances = balances
+
+    def get_order(self, order_id: int) -> typing.Optional[OrderStatusData]:
+        return self._orders.get(order_id)
+
+    def on_account_update(self, update: typing.Dict):
+
+        """
+        ACCOUNT_UPDATE event: balance and position changes.
+        :param update: The 'a' object of the event
+        :return:
+        """
+
+        with self._write_lock:
+            balances = dict(self.balances)
+
+            for b in update['B']:
+                if b['a'] in balances:  # Keeps the margin values from the REST snapshot, only the wallet changes
+                    new_balance = copy.copy(balances[b['a']])
+                    new_balance.wallet_balance = float(b['wb'])
+                else:
+                    new_balance = BalanceData(b, "user_stream")
+                balances[b['a']] = new_balance
+
+            positions = dict(self.positions)
+
+            for p in update['P']:
+                position = PositionData(p)
+                if position.quantity == 0:
+                    positions.pop(position.symbol, None)
+                else:
+                    positions[position.symbol] = position
+
+            self.balances = balances
+            self.positions = positions
+
+    def on_order_update(self, order_status: OrderStatusData):
+
+        """
+        ORDER_TRADE_UPDATE event.
+        :param order_status:
+        :return:
+        """
+
+        with self._write_lock:
+            self._orders[order_status.order_id] = order_status
+            self._orders.move_to_end(order_status.order_id)
+
+            while len(self._orders) > MAX_CACHED_ORDERS:
+                self._orders.popitem(last=False)
+
+
+class UserDataStream:
+    def __init__(self, client: "BinanceClient", ws_base_url: str, account: AccountState):
+
+        """
+        Keeps the user data stream connected: creates the listenKey, sends a keepalive every 30 minutes and
+        reconnects with a new listenKey when the connection drops or the key expires.
+        https://binance-docs.github.io/apidocs/futures/en/#user-data-streams
+        :param client: Used to make the listenKey REST requests and to dispatch the order updates to the strategies
+        :param ws_base_url: e.g: wss://stream.binancefuture.com/ws
+        :param account: The AccountState updated by the events
+        """
+
+        self._client = client
+        self._ws_base_url = ws_base_url
+        self.account = account
+
+        self._listen_key = None
+        self._keepalive_task: typing.Optional[ScheduledTask] = None
+
+        self.ws: typing.Optional[websocket.WebSocketApp] = None
+        self.reconnected = True
+        self.connected = False
+
+    def start(self):
+        thr = threading.Thread(target=self._run, daemon=True)
+        thr.start()
+
+    def close(self):
+        self.reconnected = False
+
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+
+        if self.ws is not None:
+            self.ws.close()
+
+    def _run(self):
+
+        while self.reconnected:
+            listen_key = self._client.create_listen_key()
+
+            if listen_key is not None:
+                self._listen_key = listen_key
+                self._schedule_keepalive()
+
+                self.ws = websocket.WebSocketApp(self._ws_base_url + "/" + self._listen_key,
+                                                 on_open=self._on_open, on_close=self._on_close,
+                                                 on_error=self._on_error, on_message=self._on_message)
+                try:
+                    self.ws.run_forever()  # Blocking method that ends only if the websocket connection drops
+                except Exception as e:
+                    logger.error("Binance error in the user data stream run_forever() method: %s", e)
+
+                self.connected = False
+
+            time.sleep(2)
+
+    def _schedule_keepalive(self):
+
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+
+        self._keepalive_task = self._client.scheduler.schedule(LISTEN_KEY_KEEPALIVE, self._keepalive,
+                                                               interval=LISTEN_KEY_KEEPALIVE)
+
+    def _keepalive(self):
+
+        if not self._client.keepalive_listen_key():
+            logger.error("Binance listenKey keepalive failed, reconnecting the user data stream")
+            self._keepalive_task.cancel()
+            if self.ws is not None:
+                self.ws.close()  # _run() creates a new listenKey
+
+    def _on_open(self, ws):
+        logger.info("Binance user data stream opened")
+        self.connected = True
+
+        # The events sent while disconnected (e.g: the daily disconnection) are lost, a protective order may have
+        # been filled in the meantime
+        self._client.scheduler.submit(self._client.reconcile_orders)
+
+    def _on_close(self, ws, *args):
+        logger.warning("Binance user data stream closed")
+        self.connected = False
+
+    def _on_error(self, ws, msg):
+        logger.error("Binance user data stream error: %s", msg)
+
+    def _on_message(self, ws, msg: str):
+
+        data = json.loads(msg)
+
+        if data.get('e') == "ACCOUNT_UPDATE":
+            self.account.on_account_update(data['a'])
+
+        elif data.get('e') == "ORDER_TRADE_UPDATE":
+            order_status = OrderStatusData(data['o'], "user_stream")
+            self.account.on_order_update(order_status)
+            self._client.on_order_update(order_status)
+
+        elif data.get('e') == "listenKeyExpired":
+            logger.warning("Binance listenKey expired, reconnecting the user data stream")
+            ws.close()
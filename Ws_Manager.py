@@ -0,0 +1,314 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import typing
+
+import websocket
+
+
+logger = logging.getLogger()
+
+MAX_STREAMS_PER_CONNECTION = 200  # Binance Futures limit
+MERGE_THRESHOLD = 0.25  # Share of max_streams_per_connection below which a connection is merged into another one
+
+
+class WsConnection:
+    def __init__(self, manager: "WsManager", conn_id: int):
+
+        """
+        One websocket connection of the WsManager, with the streams it carries.
+        :param manager:
+        :param conn_id: Used in the logs only
+        """
+
+        self._manager = manager
+        self.conn_id = conn_id
+
+        self.streams: typing.Set[str] = set()  # Streams assigned to this connection, acknowledged or not
+        self.acked: typing.Set[str] = set()  # Streams confirmed by the exchange
+        self._pending: typing.Dict[int, typing.Tuple[str, typing.List[str]]] = dict()  # Request id -> method, params
+
+        self.ws: typing.Optional[websocket.WebSocketApp] = None
+        self.reconnected = True
+        self.connected = False
+
+        thr = threading.Thread(target=self._start_ws, name=f"binance-ws-{conn_id}", daemon=True)
+        thr.start()
+
+    def _start_ws(self):
+
+        while self.reconnected:  # Reconnect unless the connection is closed by the manager
+            self.ws = websocket.WebSocketApp(self._manager.url, on_open=self._on_open, on_close=self._on_close,
+                                             on_error=self._on_error, on_message=self._on_message)
+            try:
+                self.ws.run_forever()  # Blocking method that ends only if the websocket connection drops
+            except Exception as e:
+                logger.error("Binance error in run_forever() method (connection %s): %s", self.conn_id, e)
+
+            self.connected = False
+
+            if self.reconnected:
+                time.sleep(2)
+
+    def close(self):
+        self.reconnected = False
+        if self.ws is not None:
+            self.ws.close()
+
+    def _on_open(self, ws):
+
+        logger.info("Binance connection %s opened", self.conn_id)
+
+        self.connected = True
+        self.acked = set()
+        self._pending = dict()
+
+        with self._manager.lock:
+            streams = sorted(self.streams)
+
+        if len(streams) > 0:  # Subscribes again to the streams of this connection after a reconnection
+            self.send("SUBSCRIBE", streams)
+
+    def _on_close(self, ws, *args):
+        logger.warning("Binance Websocket connection %s closed", self.conn_id)
+        self.connected = False
+
+    def _on_error(self, ws, msg):
+        logger.error("Binance connection %s error: %s", self.conn_id, msg)
+
+    def _on_message(self, ws, msg: str):
+
+        if not self.reconnected:  # Closed by the manager, its streams may already be carried by another connection
+            return
+
+        # Market data messages start with {"e", the responses to the requests are the only messages with an id,
+        # whatever the order of their keys: {"result": null, "id": 3} or {"code": 2, "msg": "...", "id": 3}
+        if not msg.startswith('{"e"'):
+            data = json.loads(msg)
+            if isinstance(data, dict) and "id" in data:
+                self._on_response(data)
+                return
+
+        self._manager.on_message(ws, msg)
+
+    def _on_response(self, data: typing.Dict):
+
+        """
+        Response to a SUBSCRIBE / UNSUBSCRIBE request, e.g: {"result": null, "id": 3}
+        Errors are sent as {"code": 2, "msg": "Invalid request", "id": 3} (or {"error": {...}, "id": 3})
+        """
+
+        request = self._pending.pop(data.get('id'), None)
+        if request is None:
+            return
+
+        method, params = request
+
+        if "error" in data or "code" in data:
+            logger.error("Binance %s request failed on connection %s: %s", method, self.conn_id,
+                         data.get('error', data.get('msg', data['code'])))
+            return
+
+        if method == "SUBSCRIBE":
+            self.acked.update(params)
+            self._manager.on_subscribed(self)
+        elif method == "UNSUBSCRIBE":
+            self.acked.difference_update(params)
+
+    def send(self, method: str, params: typing.List[str]):
+
+        """
+        Send a SUBSCRIBE or UNSUBSCRIBE request. Nothing is sent while disconnected, _on_open() sends the
+        subscriptions of self.streams once connected.
+        """
+
+        if not self.connected:
+            return
+
+        request_id = self._manager.next_id()
+        self._pending[request_id] = (method, params)
+
+        try:
+            self.ws.send(json.dumps({"method": method, "params": params, "id": request_id}))
+            logger.info("Binance: %s %s on connection %s", method.lower(), ','.join(params), self.conn_id)
+        except Exception as e:
+            self._pending.pop(request_id, None)
+            logger.error("Websocket error while sending %s on connection %s: %s", method, self.conn_id, e)
+
+
+class WsManager:
+    def __init__(self, url: str, on_message: typing.Callable,
+                 max_streams_per_connection: int = MAX_STREAMS_PER_CONNECTION):
+
+        """
+        Spread the stream subscriptions over as many websocket connections as needed, each one carrying at most
+        max_streams_per_connection streams.
+        New streams go to the least loaded connection that has room. A connection is closed when it has no stream
+        left, and merged into another one when the unsubscriptions leave it with fewer than
+        MERGE_THRESHOLD * max_streams_per_connection streams: its streams are subscribed on the other connection
+        first, and it keeps delivering them until they are acknowledged there, so no trade is dropped.
+        :param url: e.g: wss://stream.binancefuture.com/ws
+        :param on_message: Called with (ws, msg) for every market data message of every connection
+        :param max_streams_per_connection:
+        """
+
+        self.url = url
+        self.on_message = on_message
+        self._max_streams = max_streams_per_connection
+
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._conn_ids = itertools.count(1)
+
+        self.connections: typing.List[WsConnection] = []
+        self._stream_connection: typing.Dict[str, WsConnection] = dict()
+
+        # Connections being merged: (merged connection, connection that took its streams, streams moved)
+        self._merging: typing.List[typing.Tuple[WsConnection, WsConnection, typing.Set[str]]] = []
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    @property
+    def connected(self) -> bool:
+        return len(self.connections) > 0 and all(c.connected for c in self.connections)
+
+    @property
+    def streams(self) -> typing.List[str]:
+        return list(self._stream_connection.keys())
+
+    def is_acked(self, stream: str) -> bool:
+        conn = self._stream_connection.get(stream)
+        return conn is not None and stream in conn.acked
+
+    def subscribe(self, streams: typing.List[str]):
+
+        """
+        :param streams: e.g: ["btcusdt@aggTrade", "ethusdt@bookTicker"]
+        :return:
+        """
+
+        requests = dict()
+
+        with self.lock:
+            for stream in streams:
+                if stream in self._stream_connection:
+                    continue
+
+                candidates = [c for c in self.connections if len(c.streams) < self._max_streams]
+
+                if len(candidates) == 0:
+                    conn = WsConnection(self, next(self._conn_ids))
+                    self.connections.append(conn)
+                else:
+                    conn = min(candidates, key=lambda c: len(c.streams))
+
+                conn.streams.add(stream)
+                self._stream_connection[stream] = conn
+                requests.setdefault(conn, []).append(stream)
+
+        for conn, params in requests.items():
+            conn.send("SUBSCRIBE", params)
+
+    def unsubscribe(self, streams: typing.List[str]):
+
+        requests = dict()
+        emptied = []
+        moves = dict()
+
+        with self.lock:
+            for stream in streams:
+                conn = self._stream_connection.pop(stream, None)
+                if conn is None:
+                    continue
+
+                conn.streams.discard(stream)
+                requests.setdefault(conn, []).append(stream)
+
+            for conn in requests:
+                if len(conn.streams) == 0:
+                    self.connections.remove(conn)
+                    emptied.append(conn)
+                elif len(conn.streams) < self._max_streams * MERGE_THRESHOLD:
+                    moved = sorted(conn.streams)
+                    target = self._merge(conn)
+                    if target is not None:
+                        moves.setdefault(target, []).extend(moved)
+
+        for conn, params in requests.items():
+            if conn in emptied:
+                conn.close()
+            else:
+                conn.send("UNSUBSCRIBE", params)
+
+        for target, params in moves.items():
+            target.send("SUBSCRIBE", params)
+
+    def _merge(self, conn: WsConnection) -> typing.Optional[WsConnection]:
+
+        """
+        Move the streams of an underloaded connection to the least loaded other connection that has room for them.
+        The merged connection is closed by on_subscribed() once they are acknowledged by the other connection.
+        Must be called with the lock held.
+        :param conn:
+        :return: The connection that took the streams, None if none has room
+        """
+
+        if any(target is conn for _, target, _ in self._merging):  # Wait until it carries the streams merged into it
+            return None
+
+        candidates = [c for c in self.connections
+                      if c is not conn and len(c.streams) + len(conn.streams) <= self._max_streams]
+
+        if len(candidates) == 0:
+            return None
+
+        target = min(candidates, key=lambda c: len(c.streams))
+        moved = set(conn.streams)
+
+        for stream in moved:
+            self._stream_connection[stream] = target
+
+        target.streams.update(moved)
+        conn.streams = set()
+        self.connections.remove(conn)
+        self._merging.append((conn, target, moved))
+
+        logger.info("Binance connection %s merged into connection %s (%s streams)", conn.conn_id, target.conn_id,
+                    len(moved))
+
+        return target
+
+    def on_subscribed(self, conn: WsConnection):
+
+        """
+        Called when a SUBSCRIBE request of a connection is acknowledged: close the connections merged into it whose
+        streams are all delivered by it now.
+        :param conn:
+        :return:
+        """
+
+        done = []
+
+        with self.lock:
+            for merging in list(self._merging):
+                merged, target, moved = merging
+                if target is conn and (moved & target.streams).issubset(target.acked):
+                    self._merging.remove(merging)
+                    done.append(merged)
+
+        for merged in done:
+            merged.close()
+
+    def close(self):
+
+        with self.lock:
+            connections = self.connections + [merged for merged, _, _ in self._merging]
+            self.connections = []
+            self._stream_connection = dict()
+            self._merging = []
+
+        for conn in connections:
+            conn.close()
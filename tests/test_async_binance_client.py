@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from Async_Binance_Client import AsyncBinanceClient
+from Order_Book import OrderBook
+
+
+PUBLIC_KEY = "public"
+SECRET_KEY = "secret"
+
+EXCHANGE_INFO = {
+    "rateLimits": [],
+    "symbols": [{"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2,
+                 "quantityPrecision": 3,
+                 "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.10"},
+                             {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+                             {"filterType": "MIN_NOTIONAL", "notional": "5"}]}],
+}
+
+
+class StandInServer:
+
+    """
+    Local stand-in for the REST API and the market data websocket of Binance Futures.
+    """
+
+    def __init__(self, delay: float = 0.2):
+
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.orders = []
+        self.batches = 0
+        self.subscriptions = []
+
+        self.app = web.Application()
+        self.app.router.add_get("/fapi/v1/exchangeInfo", self.exchange_info)
+        self.app.router.add_get("/fapi/v1/ticker/bookTicker", self.book_ticker)
+        self.app.router.add_get("/fapi/v1/depth", self.depth)
+        self.app.router.add_get("/fapi/v1/klines", self.klines)
+        self.app.router.add_post("/fapi/v1/order", self.new_order)
+        self.app.router.add_post("/fapi/v1/batchOrders", self.new_batch_orders)
+        self.app.router.add_post("/fapi/v1/listenKey", self.listen_key)
+        self.app.router.add_put("/fapi/v1/listenKey", self.listen_key)
+        self.app.router.add_get("/ws", self.websocket)
+
+        self.server = TestServer(self.app)
+
+    @property
+    def main_url(self) -> str:
+        return str(self.server.make_url("")).rstrip("/")
+
+    @property
+    def ws_url(self) -> str:
+        return self.main_url.replace("http://", "ws://") + "/ws"
+
+    async def exchange_info(self, request):
+        return web.json_response(EXCHANGE_INFO)
+
+    async def book_ticker(self, request):
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+
+        return web.json_response({"symbol": request.query['symbol'], "bidPrice": "36512.30",
+                                  "askPrice": "36512.40"})
+
+    async def klines(self, request):
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+
+        start, end = int(request.query['startTime']), int(request.query['endTime'])
+
+        return web.json_response([[ts, "36500", "36510", "36490", "36505", "12.5"]
+                                  for ts in range(start, end + 1, 60000)])
+
+    async def listen_key(self, request):
+
+        if request.headers.get("X-MBX-APIKEY") != PUBLIC_KEY:
+            return web.json_response({"code": -2015, "msg": "Invalid API-key."}, status=401)
+
+        return web.json_response({"listenKey": "pqia91ma19a5s61cv6a81va65sdf19v8a65a1a5s61cv6a81va65sdf19v8a65a1"}
+                                 if request.method == "POST" else {})
+
+    async def depth(self, request):
+        return web.json_response({"lastUpdateId": 1027024, "E": 1589436922972, "T": 1589436922959,
+                                  "bids": [["36512.30", "4.120"], ["36512.20", "0.500"]],
+                                  "asks": [["36512.40", "1.305"]]})
+
+    @staticmethod
+    def is_signed(request) -> bool:
+
+        query, signature = request.rel_url.raw_query_string.rsplit("&signature=", 1)
+        expected = hmac.new(SECRET_KEY.encode(), query.encode(), hashlib.sha256).hexdigest()
+
+        return request.headers.get("X-MBX-APIKEY") == PUBLIC_KEY and signature == expected
+
+    def record_order(self, order: dict) -> dict:
+
+        self.orders.append(order)
+
+        return {"orderId": len(self.orders), "status": "NEW", "avgPrice": "0", "executedQty": "0",
+                "symbol": order['symbol']}
+
+    async def new_order(self, request):
+
+        if not self.is_signed(request):
+            return web.json_response({"code": -1022, "msg": "Signature for this request is not valid."}, status=400)
+
+        return web.json_response(self.record_order(dict(request.query)))
+
+    async def new_batch_orders(self, request):
+
+        if not self.is_signed(request):
+            return web.json_response({"code": -1022, "msg": "Signature for this request is not valid."}, status=400)
+
+        self.batches += 1
+
+        return web.json_response([self.record_order(order) for order in json.loads(request.query['batchOrders'])])
+
+    async def websocket(self, request):
+
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async for msg in ws:
+            data = json.loads(msg.data)
+            self.subscriptions.extend(data['params'])
+            await ws.send_str(json.dumps({"result": None, "id": data['id']}))
+
+            now = int(time.time() * 1000)
+
+            for stream in data['params']:
+                if stream == "btcusdt@bookTicker":
+                    await ws.send_str(json.dumps({"e": "bookTicker", "u": 1, "s": "BTCUSDT", "b": "36512.30",
+                                                  "B": "4.120", "a": "36512.40", "A": "1.305", "T": now, "E": now}))
+                elif stream == "btcusdt@aggTrade":
+                    await ws.send_str(json.dumps({"e": "aggTrade", "E": now, "a": 1, "s": "BTCUSDT", "p": "36600.00",
+                                                  "q": "0.015", "f": 1, "l": 1, "T": now, "m": True}))
+
+        return ws
+
+
+async def wait_for(condition, timeout: float = 5):
+
+    deadline = time.monotonic() + timeout
+
+    while not condition():
+        assert time.monotonic() < deadline, "Timed out"
+        await asyncio.sleep(0.01)
+
+
+def run(test):
+
+    async def main():
+        stand_in = StandInServer()
+        await stand_in.server.start_server()
+
+        messages = []
+
+        client = AsyncBinanceClient(PUBLIC_KEY, SECRET_KEY, main_url=stand_in.main_url, ws_url=stand_in.ws_url,
+                                    on_message=lambda ws, msg: messages.append(json.loads(msg)))
+        await client.start()
+
+        try:
+            await test(client, stand_in, messages)
+        finally:
+            await client.close()
+            await stand_in.server.close()
+
+    asyncio.run(main())
+
+
+def test_contracts_are_loaded_with_their_filters():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+        assert contract.tick_size == 0.1
+        assert contract.min_notional == 5
+
+    run(test)
+
+
+def test_client_closes_before_the_websocket_is_connected():
+
+    async def test(client, stand_in, messages):
+        assert not client.ws_connected  # run() closes the client while the connection is still being opened
+
+    run(test)
+
+
+def test_rest_requests_run_concurrently():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        start = time.monotonic()
+        results = await asyncio.gather(*(client.get_bid_ask(contract) for _ in range(10)))
+        duration = time.monotonic() - start
+
+        assert all(r == {'bid': 36512.3, 'ask': 36512.4} for r in results)
+        assert stand_in.max_in_flight > 1
+        assert duration < 10 * stand_in.delay
+
+    run(test)
+
+
+def test_kline_pages_are_downloaded_concurrently():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        pages = [(i * 60000000, i * 60000000 + 999 * 60000) for i in range(8)]
+        results = await client.get_klines_pages(contract, "1m", pages)
+
+        assert [len(page) for page in results] == [1000] * 8
+        assert results[3][0][0] == pages[3][0]
+        assert 1 < stand_in.max_in_flight <= 5
+
+    run(test)
+
+
+def test_listen_key_requests():
+
+    async def test(client, stand_in, messages):
+        assert (await client.create_listen_key()).startswith("pqia91ma")
+        assert await client.keepalive_listen_key()
+
+    run(test)
+
+
+def test_depth_snapshot_loads_an_order_book():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        book = OrderBook(contract)
+        assert book.load_snapshot(await client.get_depth_snapshot(contract, 50))
+        assert book.best_bid == 36512.3
+
+    run(test)
+
+
+def test_orders_are_signed_and_formatted():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        statuses = await asyncio.gather(client.place_order(contract, "MARKET", 0.0159, "buy"),
+                                        client.place_order(contract, "LIMIT", 0.015, "sell", 36600.04, "GTC"),
+                                        client.place_order(contract, "STOP_MARKET", 0.015, "sell",
+                                                           stop_price=36000.04, reduce_only=True))
+
+        assert sorted(s.order_id for s in statuses) == [1, 2, 3]
+
+        orders = sorted(stand_in.orders, key=lambda o: o['type'])
+        assert orders[0]['type'] == "LIMIT" and orders[0]['price'] == "36600.0" and orders[0]['timeInForce'] == "GTC"
+        assert orders[1]['type'] == "MARKET" and orders[1]['quantity'] == "0.015"
+        assert orders[2]['stopPrice'] == "36000.0" and orders[2]['reduceOnly'] == "true"
+
+    run(test)
+
+
+def test_batch_orders_are_grouped():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        orders = [{"contract": contract, "order_type": "MARKET", "quantity": 0.001 * (i + 1), "side": "buy"}
+                  for i in range(7)]
+        orders.append({"contract": contract, "order_type": "STOP_MARKET", "quantity": 0.015, "side": "sell",
+                       "stop_price": 36000.04, "reduce_only": True})
+
+        statuses = await client.place_batch_orders(orders)
+
+        assert stand_in.batches == 2  # Groups of 5 orders
+        assert all(s is not None for s in statuses)
+        assert len(stand_in.orders) == 8
+        assert stand_in.orders[-1]['stopPrice'] == "36000.0" and stand_in.orders[-1]['reduceOnly'] == "true"
+
+    run(test)
+
+
+def test_websocket_subscriptions_and_messages():
+
+    async def test(client, stand_in, messages):
+        contract = client.contracts["BTCUSDT"]
+
+        await wait_for(lambda: client.ws_connected)
+
+        await client.subscribe_channel([contract], "bookTicker")
+        await client.subscribe_channel([contract], "aggTrade")
+        await client.subscribe_channel([contract], "kline_1m")  # Any channel can be subscribed to
+
+        # The messages are handed over as they are, the subscription responses included
+        await wait_for(lambda: len(messages) == 5)
+
+        assert [m.get('e') for m in messages if "id" not in m] == ["bookTicker", "aggTrade"]
+        assert stand_in.subscriptions == ["btcusdt@bookTicker", "btcusdt@aggTrade", "btcusdt@kline_1m"]
+        assert client.ws_subscriptions["kline_1m"] == ["BTCUSDT"]
+
+        await client.unsubscribe_channel([contract], "aggTrade")
+        assert client.ws_subscriptions["aggTrade"] == []
+
+    run(test)
@@ -0,0 +1,230 @@
+import json
+import time
+
+from Candle_Store import CandleStore
+from Client_Base import ClientBase
+from Exchange_Data import BalanceData, CandleData, ContractData, TradeData
+from Message_Decoder import MessageDecoder
+from Market_Data import MarketData
+from Strategy_Registry import StrategyRegistry
+from User_Stream import AccountState
+
+
+CONTRACT_DATA = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2,
+                 "quantityPrecision": 3,
+                 "filters": [{"filterType": "PRICE_FILTER", "tickSize": "0.10"},
+                             {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001"},
+                             {"filterType": "MIN_NOTIONAL", "notional": "5"}]}
+
+
+class DispatchStandIn(ClientBase):
+
+    """
+    Client without any transport, the messages are fed to _on_message() directly.
+    """
+
+    def __init__(self):
+
+        self._registry = StrategyRegistry()
+        self._decoder = MessageDecoder()
+        self._handlers = {"bookTicker": self._on_book_ticker, "aggTrade": self._on_agg_trade,
+                          "kline": self._on_kline}
+
+        self.prices = dict()
+        self.logs = []
+        self.market_data = MarketData(self)
+        self.order_books = None
+        self.trade_batcher = None
+
+    def get_historical_candles(self, contract, interval):
+        start = int(time.time() * 1000) // 60000 * 60000 - 9 * 60000
+        return [CandleData([start + i * 60000, "36500", "36510", "36490", "36505", "12.5"], interval, "binance")
+                for i in range(10)]
+
+
+class BackfillStandIn(ClientBase):
+
+    """
+    Client whose klines are generated locally, for the symbols listed since 'listing_time'.
+    """
+
+    def __init__(self, listing_time: int = 0):
+
+        self.candle_store = CandleStore(":memory:")
+        self.listing_time = listing_time
+        self.pages = []
+
+    def _get_klines_pages(self, contract, interval, pages):
+
+        self.pages.extend(pages)
+        now = int(time.time() * 1000)
+
+        return [[[ts, "36500", "36510", "36490", "36505", "12.5"]
+                 for ts in range(max(start, self.listing_time), min(end, now) + 1, 60000)] for start, end in pages]
+
+
+class SizingStandIn(ClientBase):
+
+    """
+    Client with a connected user data stream whose account cache may be empty.
+    """
+
+    class UserStream:
+        connected = True
+
+    def __init__(self, wallet_balance: float):
+
+        self.account = AccountState()
+        self.user_stream = self.UserStream()
+        self.order_books = None
+        self.wallet_balance = wallet_balance
+        self.balance_requests = 0
+
+    def get_balances(self):
+        self.balance_requests += 1
+        return {"USDT": BalanceData({"initialMargin": "0", "maintMargin": "0", "marginBalance": "0",
+                                     "walletBalance": str(self.wallet_balance), "unrealizedProfit": "0"})}
+
+
+class RecordingStrategy:
+
+    def __init__(self, contract):
+        self.contract = contract
+        self.tf = "1m"
+        self.candle_stream = "aggTrade"
+        self.ticks = []
+
+    def on_trade(self, tick_type):
+        self.ticks.append(tick_type)
+
+
+def make_trade(contract, side):
+    return TradeData({"time": 0, "contract": contract, "strategy": "Technical", "side": side, "entry_price": 36500.0,
+                      "status": "open", "pnl": 0, "quantity": 0.01, "entry_id": 1})
+
+
+def test_messages_are_dispatched_to_the_strategies_of_the_symbol():
+
+    client = DispatchStandIn()
+    contract = ContractData(CONTRACT_DATA)
+
+    series = client.market_data.acquire(contract, "1m")
+    strategy = RecordingStrategy(contract)
+    client.add_strategy(0, strategy)
+
+    now = int(time.time() * 1000)
+
+    client._on_message(None, json.dumps({"e": "aggTrade", "E": now, "a": 1, "s": "BTCUSDT", "p": "36600.00",
+                                         "q": "0.015", "f": 1, "l": 1, "T": now, "m": True}))
+    client._on_message(None, json.dumps({"e": "aggTrade", "E": now, "a": 2, "s": "ETHUSDT", "p": "2000.00",
+                                         "q": "1", "f": 2, "l": 2, "T": now, "m": True}))
+
+    assert series.candles[-1].close == 36600.0
+    assert len(strategy.ticks) == 1
+
+
+def test_klines_are_dispatched_to_the_kline_strategies():
+
+    client = DispatchStandIn()
+    contract = ContractData(CONTRACT_DATA)
+
+    series = client.market_data.acquire(contract, "1m", "kline")
+    strategy = RecordingStrategy(contract)
+    strategy.candle_stream = "kline"
+    client.add_strategy(0, strategy)
+
+    now = int(time.time() * 1000)
+    open_time = now - now % 60000
+
+    client._on_message(None, json.dumps({"e": "kline", "E": now, "s": "BTCUSDT",
+                                         "k": {"t": open_time, "T": open_time + 59999, "s": "BTCUSDT", "i": "1m",
+                                               "o": "36505.00", "c": "36550.00", "h": "36560.00", "l": "36500.00",
+                                               "v": "3.2", "x": False}}))
+
+    assert series.candles[-1].close == 36550.0
+    assert len(strategy.ticks) == 1
+
+
+def test_book_ticker_updates_the_prices_and_the_pnl():
+
+    client = DispatchStandIn()
+    contract = ContractData(CONTRACT_DATA)
+
+    client.market_data.acquire(contract, "1m")
+    strategy = RecordingStrategy(contract)
+    client.add_strategy(0, strategy)
+
+    long_trade, short_trade = make_trade(contract, "long"), make_trade(contract, "short")
+    client.add_open_trade(long_trade, strategy)
+    client.add_open_trade(short_trade, strategy)
+
+    client._on_message(None, json.dumps({"e": "bookTicker", "u": 1, "s": "BTCUSDT", "b": "36510.00", "B": "4.120",
+                                         "a": "36520.00", "A": "1.305", "T": 0, "E": 0}))
+
+    assert client.prices["BTCUSDT"] == {'bid': 36510.0, 'ask': 36520.0}
+    assert round(long_trade.pnl, 6) == 0.1
+    assert round(short_trade.pnl, 6) == -0.2
+
+
+def test_backfill_is_paged_then_served_from_the_cache():
+
+    client = BackfillStandIn()
+    contract = ContractData(CONTRACT_DATA)
+
+    candles = client.get_historical_candles(contract, "1m", count=2500)
+
+    now = int(time.time() * 1000)
+    assert len(client.pages) == 3
+    assert len(candles) == 2500 and candles[-1].timestamp == now - now % 60000
+    assert all(b.timestamp - a.timestamp == 60000 for a, b in zip(candles, candles[1:]))
+
+    client.pages.clear()
+    candles = client.get_historical_candles(contract, "1m", count=2500)
+
+    assert len(candles) == 2500
+    assert len(client.pages) == 1 and client.pages[0][1] - client.pages[0][0] <= 60000  # Only the current candle
+
+
+def test_ranges_without_candles_are_not_downloaded_again():
+
+    now = int(time.time() * 1000)
+    client = BackfillStandIn(listing_time=now - now % 60000 - 499 * 60000)  # Listed 500 candles ago
+    contract = ContractData(CONTRACT_DATA)
+
+    candles = client.get_historical_candles(contract, "1m", count=2500)
+
+    assert len(client.pages) == 3
+    assert len(candles) == 500 and candles[0].timestamp == client.listing_time
+
+    client.pages.clear()
+    candles = client.get_historical_candles(contract, "1m", count=2500)
+
+    assert len(candles) == 500
+    assert len(client.pages) == 1 and client.pages[0][1] - client.pages[0][0] <= 60000  # Only the current candle
+
+
+def test_coverage_ranges_are_merged():
+
+    store = CandleStore(":memory:")
+
+    store.save("BTCUSDT", "1m", [], [(0, 600000)])
+    store.save("BTCUSDT", "1m", [], [(1200000, 1800000)])
+
+    assert store.get_missing_ranges("BTCUSDT", "1m", 0, 2400000, 60000) == [(600000, 1140000), (1800000, 2400000)]
+
+    store.save("BTCUSDT", "1m", [], [(600000, 1200000)])
+
+    assert store.get_missing_ranges("BTCUSDT", "1m", 0, 2400000, 60000) == [(1800000, 2400000)]
+    assert store.get_missing_ranges("ETHUSDT", "1m", 0, 2400000, 60000) == [(0, 2400000)]
+
+
+def test_trade_size_requests_the_balance_missing_from_the_cache():
+
+    client = SizingStandIn(wallet_balance=1000)
+    contract = ContractData(CONTRACT_DATA)
+
+    assert client.get_trade_size(contract, 40000, 10) == 0.002
+    assert client.balance_requests == 1
+
+    assert client.get_trade_size(contract, 40000, 10) == 0.002  # Served by the cache now
+    assert client.balance_requests == 1
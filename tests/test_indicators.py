@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from Indicators import MACD, RSI
+
+
+def make_closes() -> np.ndarray:
+
+    """
+    Flat stretch (no gain nor loss) then steady rise (no loss), the edge cases of the RSI, followed by a random walk.
+    """
+
+    rng = np.random.default_rng(7)
+    rise = 36500 + np.arange(1, 31) * 5.0
+    walk = rise[-1] + np.cumsum(rng.normal(0, 25, 300))
+
+    return np.concatenate([np.full(20, 36500.0), rise, walk])
+
+
+def pandas_rsi(closes: pd.Series, length: int) -> pd.Series:
+
+    # Computation of TechnicalStrategy._rsi() before the incremental indicators
+
+    delta = closes.diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(length - 1), min_periods=length).mean()
+    avg_loss = down.abs().ewm(com=(length - 1), min_periods=length).mean()
+
+    rs = avg_gain / avg_loss
+
+    rsi = 100 - 100 / (1 + rs)
+    return rsi.round(2)
+
+
+def pandas_macd(closes: pd.Series, ema_fast: int, ema_slow: int, ema_signal: int):
+
+    # Computation of TechnicalStrategy._macd() before the incremental indicators
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    return macd_line, macd_signal
+
+
+def test_rsi_matches_the_pandas_computation():
+
+    closes = make_closes()
+    expected = pandas_rsi(pd.Series(closes), 14).tolist()
+
+    rsi = RSI(14)
+    values = [rsi.update(float(close)) for close in closes]
+
+    assert math.isnan(values[0])  # No difference yet, pandas drops this row
+
+    for value, reference in zip(values[1:], expected):
+        if math.isnan(reference):
+            assert math.isnan(value)
+        else:
+            assert abs(value - reference) < 1e-9
+
+
+def test_macd_matches_the_pandas_computation():
+
+    closes = make_closes()
+    expected_line, expected_signal = pandas_macd(pd.Series(closes), 12, 26, 9)
+
+    macd = MACD(12, 26, 9)
+    values = [macd.update(float(close)) for close in closes]
+
+    np.testing.assert_allclose([line for line, _ in values], expected_line.to_numpy(), rtol=0, atol=1e-9)
+    np.testing.assert_allclose([signal for _, signal in values], expected_signal.to_numpy(), rtol=0, atol=1e-9)
@@ -0,0 +1,37 @@
+from Exchange_Data import CandleData, ContractData
+from Market_Data import SharedSeries, SymbolAggregator
+
+from test_client_base import CONTRACT_DATA
+
+
+START = 1_700_000_100_000  # Boundary of a 5m candle
+
+
+def make_series(contract, timeframe, candles):
+    series = SharedSeries(contract, timeframe)
+    series.load_history([CandleData([ts, "100", "100", "100", "100", str(volume)], timeframe, "binance")
+                         for ts, volume in candles])
+    return series
+
+
+def test_series_added_late_is_caught_up_with_the_trades_applied_since_its_download():
+
+    contract = ContractData(CONTRACT_DATA)
+    aggregator = SymbolAggregator(contract)
+    aggregator.add_series(make_series(contract, "1m", [(START + i * 60000, 1) for i in range(10)]))
+
+    # Downloaded with the 5 trades of its current candle known at that time
+    series = make_series(contract, "5m", [(START, 5), (START + 300000, 5)])
+
+    aggregator.parse_trades(110, 2, START + 9 * 60000 + 1000)
+    aggregator.parse_trades(90, 1, START + 10 * 60000)
+
+    aggregator.add_series(series)
+
+    previous, current = series.candles[-2], series.candles[-1]
+    assert (previous.timestamp, previous.high, previous.close, previous.volume) == (START + 300000, 110, 110, 7)
+    assert (current.timestamp, current.open, current.close, current.volume) == (START + 600000, 90, 90, 1)
+
+    aggregator.parse_trades(95, 1, START + 10 * 60000 + 1000)
+
+    assert (series.candles[-1].close, series.candles[-1].volume) == (95, 2)
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from Exchange_Data import ContractData
+from Order_Executor import OrderExecutor, OrderIntent
+from test_client_base import CONTRACT_DATA
+
+
+class OrderRecorder:
+
+    """
+    Client stand-in that records the orders it is asked to place.
+    """
+
+    def __init__(self):
+        self.orders = []
+
+    def place_order(self, **order):
+        self.orders.append(order)
+        return None
+
+    def place_batch_orders(self, orders):
+        self.orders.extend(orders)
+        return [None] * len(orders)
+
+
+def test_limit_orders_keep_their_price_and_time_in_force():
+
+    client = OrderRecorder()
+    executor = OrderExecutor(client)
+    contract = ContractData(CONTRACT_DATA)
+
+    done = threading.Event()
+    executor.submit(OrderIntent(contract, "buy", "LIMIT", quantity=0.01, limit_price=36500.0),
+                    lambda order_status: done.set())
+
+    assert done.wait(5)
+    executor.stop()
+
+    assert client.orders[0]['order_type'] == "LIMIT"
+    assert client.orders[0]['price'] == 36500.0 and client.orders[0]['tif'] == "GTC"
+
+
+def test_limit_orders_without_price_are_rejected():
+
+    contract = ContractData(CONTRACT_DATA)
+
+    with pytest.raises(ValueError):
+        OrderIntent(contract, "buy", "LIMIT", quantity=0.01)
@@ -0,0 +1,29 @@
+from Rate_Limiter import PRIORITY_INFO, PRIORITY_ORDER, RateLimiter, get_request_priority
+
+
+def test_cancellations_have_the_order_priority():
+
+    assert get_request_priority("POST", "/fapi/v1/order") == PRIORITY_ORDER
+    assert get_request_priority("DELETE", "/fapi/v1/order") == PRIORITY_ORDER
+    assert get_request_priority("DELETE", "/fapi/v1/batchOrders") == PRIORITY_ORDER
+    assert get_request_priority("GET", "/fapi/v1/order") == PRIORITY_INFO
+    assert get_request_priority("GET", "/fapi/v1/klines") == PRIORITY_INFO
+
+
+def test_try_acquire_counts_every_order_of_a_batch():
+
+    limiter = RateLimiter()
+    limiter.update_limits([{"rateLimitType": "ORDERS", "interval": "SECOND", "intervalNum": 10, "limit": 10}])
+
+    assert limiter.try_acquire(5, True, order_count=5) == 0
+    assert limiter.usage()["ORDER-COUNT-10S"]["used"] == 5
+    assert limiter.try_acquire(5, True, order_count=5) > 0  # Only 9 orders allowed with the safety margin
+
+
+def test_try_acquire_only_yields_to_waiting_requests_of_same_priority():
+
+    limiter = RateLimiter()
+    limiter._queue.append((PRIORITY_INFO, 0))  # A thread waiting in acquire()
+
+    assert limiter.try_acquire(1, priority=PRIORITY_ORDER) == 0
+    assert limiter.try_acquire(1) > 0
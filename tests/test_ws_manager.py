@@ -0,0 +1,74 @@
+import json
+
+import Ws_Manager
+from Ws_Manager import WsManager
+
+
+class RecordingWs:
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, msg):
+        self.sent.append(json.loads(msg))
+
+    def close(self):
+        self.closed = True
+
+
+def make_manager(monkeypatch, max_streams):
+
+    """
+    Manager whose connections don't connect: they are marked as connected and record the requests sent.
+    """
+
+    def start_ws(conn):
+        conn.ws = RecordingWs()
+        conn.connected = True
+
+    monkeypatch.setattr(Ws_Manager.WsConnection, "_start_ws", start_ws)
+
+    received = []
+    return WsManager("wss://stand-in", lambda ws, msg: received.append(msg), max_streams), received
+
+
+def ack(conn):
+    for request_id in list(conn._pending):
+        conn._on_message(conn.ws, json.dumps({"result": None, "id": request_id}))
+
+
+def test_underloaded_connection_is_merged_after_the_acknowledgement(monkeypatch):
+
+    manager, received = make_manager(monkeypatch, max_streams=8)
+
+    manager.subscribe([f"s{i}@aggTrade" for i in range(12)])
+    first, second = manager.connections
+    ack(first)
+    ack(second)
+
+    manager.unsubscribe([f"s{i}@aggTrade" for i in range(7)])  # First connection left with 1 stream of 8
+
+    assert manager.connections == [second]
+    assert "s7@aggTrade" in second.streams and second.ws.sent[-1]["params"] == ["s7@aggTrade"]
+
+    # The merged connection keeps delivering the stream until the other one acknowledges it
+    first._on_message(first.ws, '{"e":"aggTrade","s":"S7"}')
+    assert not first.ws.closed and len(received) == 1
+
+    ack(second)
+
+    assert first.ws.closed
+    first._on_message(first.ws, '{"e":"aggTrade","s":"S7"}')
+    assert len(received) == 1
+    assert manager.is_acked("s7@aggTrade")
+
+
+def test_connection_is_not_merged_without_room(monkeypatch):
+
+    manager, _ = make_manager(monkeypatch, max_streams=8)
+
+    manager.subscribe([f"s{i}@aggTrade" for i in range(16)])
+    manager.unsubscribe([f"s{i}@aggTrade" for i in range(9, 16)])  # 8 + 1 streams don't fit in one connection
+
+    assert len(manager.connections) == 2